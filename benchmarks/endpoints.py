@@ -0,0 +1,317 @@
+"""Benchmark every API route against a synthetic database.
+
+Generates a database of the given scale (entities, rows per entity, features,
+categorical cardinality and model size), drives each route added by
+``routes.add_routes`` through the Flask test client and reports the p50/p95/p99
+latency and the throughput of each route, as JSON. Routes that rewrite the data being
+measured (the PUT routes) are not benchmarked.
+
+The database is dropped before and after the run. Use ``--host mongomock://localhost``
+to run without a MongoDB server (requires mongomock).
+
+Usage:
+    python benchmarks/endpoints.py --entities 1000 --rows 2 --features 20 --requests 100
+    python benchmarks/endpoints.py --host mongomock://localhost --routes multi_contributions
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from mongoengine import disconnect
+from pyreal import RealApp
+from pyreal.transformers import BoolToIntCaster, OneHotEncoder, fit_transformers
+from sklearn.ensemble import RandomForestClassifier
+
+from sibyl import g
+from sibyl.core import Sibyl
+from sibyl.db import schema
+from sibyl.utils import get_project_root, read_config
+
+API = "/api/v1/"
+
+
+def generate_features(n_features, cardinality):
+    """Get Feature documents: one boolean, a quarter categorical and the rest numeric."""
+    features = [{"name": "bool_0", "type": "boolean", "category": "cat_0"}]
+    n_categorical = n_features // 4
+    for i in range(n_categorical):
+        features.append({
+            "name": "cat_{}".format(i),
+            "type": "categorical",
+            "category": "cat_{}".format(i % 3),
+            "values": ["value_{}".format(j) for j in range(cardinality)],
+        })
+    for i in range(n_features - n_categorical - 1):
+        features.append({
+            "name": "num_{}".format(i),
+            "type": "numeric",
+            "category": "cat_{}".format(i % 3),
+        })
+    for feature in features:
+        feature["description"] = "Description of {}".format(feature["name"])
+    return features
+
+
+def generate_rows(features, n, cardinality, random_state):
+    columns = {}
+    for feature in features:
+        if feature["type"] == "boolean":
+            columns[feature["name"]] = random_state.rand(n) < 0.5
+        elif feature["type"] == "categorical":
+            codes = random_state.randint(0, cardinality, size=n)
+            columns[feature["name"]] = np.array(feature["values"])[codes]
+        else:
+            columns[feature["name"]] = random_state.normal(size=n).round(3)
+    return pd.DataFrame(columns)
+
+
+def generate_database(
+    n_entities=1000, n_rows=2, n_features=20, cardinality=5, model_size=10, n_train=500, seed=0
+):
+    """
+    Fill the connected database with synthetic categories, features, entities, groups,
+    a context and a model
+    Args:
+        n_entities (int): Number of entities
+        n_rows (int): Number of rows of each entity
+        n_features (int): Number of features
+        cardinality (int): Number of values of each categorical feature
+        model_size (int): Number of trees of the model
+        n_train (int): Number of entities in the training set of the model
+        seed (int): Seed of the generated values
+
+    Returns:
+        dict: Ids of the generated documents, used to build the requests
+    """
+    random_state = np.random.RandomState(seed)
+    features = generate_features(n_features, cardinality)
+    schema.Category.insert_many([{"name": "cat_{}".format(i)} for i in range(3)])
+    schema.Feature.insert_many(features)
+
+    row_ids = ["row_{}".format(i) for i in range(n_rows)]
+    rows = generate_rows(features, n_entities * n_rows, cardinality, random_state)
+    labels = (random_state.rand(n_entities * n_rows) < 0.5).astype(int)
+    records = rows.to_dict(orient="records")
+
+    eids = ["ent_{}".format(i) for i in range(n_entities)]
+    group_ids = ["group_{}".format(i) for i in range(10)]
+    entities = []
+    for i, eid in enumerate(eids):
+        start = i * n_rows
+        entities.append({
+            "eid": eid,
+            "row_ids": row_ids,
+            "features": dict(zip(row_ids, records[start : start + n_rows])),
+            "labels": dict(zip(row_ids, labels[start : start + n_rows].tolist())),
+            "property": {"group_ids": [group_ids[i % len(group_ids)]]},
+        })
+    schema.Entity.insert_many(entities)
+    schema.EntityGroup.insert_many([{"group_id": group_id} for group_id in group_ids])
+    schema.Context.insert(context_id="context", config={"terms": {"Entity": "Entity"}})
+
+    n_train = min(n_train, n_entities)
+    x_train = rows.iloc[: n_train * n_rows].reset_index(drop=True)
+    y_train = pd.Series(labels[: n_train * n_rows])
+    categorical = [feature["name"] for feature in features if feature["type"] == "categorical"]
+    transformers = [OneHotEncoder(columns=categorical), BoolToIntCaster()]
+    x_model = fit_transformers(transformers, x_train)
+    model = RandomForestClassifier(n_estimators=model_size, max_depth=8, random_state=seed)
+    model.fit(x_model, y_train)
+
+    realapp = RealApp(model, x_train, y_train, transformers=transformers, id_column="eid")
+    realapp.prepare_feature_contributions()
+    realapp.prepare_similar_examples()
+    importances = realapp.produce_feature_importance()
+    training_set = schema.TrainingSet.insert(entities=schema.Entity.find(eid__in=eids[:n_train]))
+    schema.Model.insert(
+        model_id="model",
+        description="Synthetic model",
+        importances=dict(zip(importances["Feature Name"], importances["Importance"])),
+        realapp=pickle.dumps(realapp),
+        training_set=training_set,
+    )
+
+    return {
+        "eids": eids,
+        "row_ids": row_ids,
+        "features": [feature["name"] for feature in features],
+        "numeric_feature": features[-1]["name"],
+        "group_id": group_ids[0],
+    }
+
+
+def get_requests(ids, n_eids):
+    """Get the request of each benchmarked route, as {name: (method, url, json)}."""
+    eid = ids["eids"][0]
+    row_id = ids["row_ids"][-1]
+    eids = ids["eids"][:n_eids]
+    single = {"eid": eid, "model_id": "model", "row_id": row_id}
+    changes = dict(single, changes={ids["numeric_feature"]: 1.5})
+    multi = {"eids": eids, "model_id": "model", "row_ids": [row_id]}
+    similar = {"eids": eids, "model_id": "model", "row_id": row_id}
+    event = {
+        "user_id": "user",
+        "eid": eid,
+        "timestamp": 1000,
+        "event": {"element": "e", "action": "click"},
+    }
+
+    return {
+        "entity": ("GET", API + "entities/{}/?row_id={}".format(eid, row_id), None),
+        "entities": ("GET", API + "entities/", None),
+        "group": ("GET", API + "groups/{}/".format(ids["group_id"]), None),
+        "groups": ("GET", API + "groups/", None),
+        "feature": ("GET", API + "features/{}/".format(ids["features"][0]), None),
+        "features": ("GET", API + "features/", None),
+        "categories": ("GET", API + "categories/", None),
+        "model": ("GET", API + "models/model/", None),
+        "models": ("GET", API + "models/", None),
+        "importance": ("GET", API + "importance/?model_id=model", None),
+        "prediction": (
+            "GET",
+            API + "prediction/?model_id=model&eid={}&row_id={}".format(eid, row_id),
+            None,
+        ),
+        "multi_prediction": ("POST", API + "multi_prediction/", multi),
+        "multi_model_prediction": (
+            "POST",
+            API + "multi_model_prediction/",
+            {"model_ids": ["model"], "eids": eids, "row_ids": [row_id]},
+        ),
+        "context": ("GET", API + "context/context/", None),
+        "contexts": ("GET", API + "contexts/", None),
+        "contributions": ("POST", API + "contributions/", single),
+        "multi_contributions": ("POST", API + "multi_contributions/", multi),
+        "single_change_predictions": ("POST", API + "single_change_predictions/", changes),
+        "modified_prediction": ("POST", API + "modified_prediction/", changes),
+        "modified_contribution": ("POST", API + "modified_contribution/", changes),
+        "similar_entities": ("POST", API + "similar_entities/", similar),
+        "logging": ("POST", API + "logging/", event),
+        "logging_batch": ("POST", API + "logging/batch/", {"events": [event] * 10}),
+        "logging_query": ("GET", API + "logging/?eid={}".format(eid), None),
+        "jobs": ("POST", API + "jobs/", {"type": "multi_prediction", "body": multi}),
+    }
+
+
+def _submit_job(client, body):
+    job_id = client.post(API + "jobs/", json=body).json["job_id"]
+    while client.get(API + "jobs/{}/".format(job_id)).json["status"] in ["pending", "running"]:
+        time.sleep(0.01)
+    return job_id
+
+
+def time_route(client, method, url, body, n_requests):
+    """
+    Send the same request n_requests times
+    Returns:
+        dict: Latency percentiles in milliseconds, throughput in requests per second and
+              number of responses with an error status
+    """
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        request_start = time.perf_counter()
+        response = client.open(url, method=method, json=body)
+        response.get_data()  # consume streamed responses
+        latencies.append(time.perf_counter() - request_start)
+        errors += response.status_code >= 400
+    elapsed = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        "method": method,
+        "url": url,
+        "requests": n_requests,
+        "errors": errors,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "throughput": n_requests / elapsed,
+    }
+
+
+def run(config, scale, n_requests=100, n_eids=100, routes=None):
+    sibyl = Sibyl(config, docker=False)
+    sibyl._db.drop_database(config["mongodb"]["db"])
+    try:
+        start = time.perf_counter()
+        # keep stdout for the results, the explainers print while they are fitted
+        with contextlib.redirect_stdout(sys.stderr):
+            ids = generate_database(**scale)
+        generate_time = time.perf_counter() - start
+
+        client = sibyl._init_flask_app("production").test_client()
+        requests = get_requests(ids, n_eids)
+        job_id = _submit_job(client, requests["jobs"][2])
+        requests["job"] = ("GET", API + "jobs/{}/".format(job_id), None)
+        requests["job_result"] = ("GET", API + "jobs/{}/result/".format(job_id), None)
+        # submitted jobs keep running in the background, so they are benchmarked last
+        requests["jobs"] = requests.pop("jobs")
+
+        results = {}
+        for name, (method, url, body) in requests.items():
+            if routes and name not in routes:
+                continue
+            results[name] = time_route(client, method, url, body, n_requests)
+        g["job_runner"].shutdown()
+    finally:
+        sibyl._db.drop_database(config["mongodb"]["db"])
+        disconnect()
+
+    return {
+        "scale": scale,
+        "eids_per_request": n_eids,
+        "generate_seconds": generate_time,
+        "routes": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entities", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=2, help="Rows per entity")
+    parser.add_argument("--features", type=int, default=20)
+    parser.add_argument("--cardinality", type=int, default=5, help="Values per categorical")
+    parser.add_argument("--model-size", type=int, default=10, help="Trees of the model")
+    parser.add_argument("--train", type=int, default=500, help="Entities in the training set")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per route")
+    parser.add_argument("--eids", type=int, default=100, help="Entities per multi-entity request")
+    parser.add_argument("--routes", nargs="*", help="Only benchmark these routes")
+    parser.add_argument("--db", default="sibyl_benchmark")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=27017)
+    args = parser.parse_args()
+
+    config = read_config(os.path.join(get_project_root(), "sibyl", "config.yml"))
+    config["mongodb"] = dict(config["mongodb"], db=args.db, host=args.host, port=args.port)
+    config["docs"] = {}
+    config["warmup"] = {}
+    scale = {
+        "n_entities": args.entities,
+        "n_rows": args.rows,
+        "n_features": args.features,
+        "cardinality": args.cardinality,
+        "model_size": args.model_size,
+        "n_train": args.train,
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        config["log_backend"] = "columnar"
+        config["log_directory"] = directory
+        results = run(config, scale, args.requests, args.eids, args.routes)
+
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark reading a single row of an entity.
+
+Inserts entities with an increasing number of rows and reports the time spent loading
+one of their rows, both by reading the whole entity document and by projecting only
+the requested row, as JSON.
+
+Usage:
+    python benchmarks/entity_row.py --rows 10 100 1000 10000 --features 50
+    python benchmarks/entity_row.py --host mongomock://localhost
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from mongoengine import connect, disconnect
+
+from sibyl import helpers
+from sibyl.db import schema
+
+
+def _entity(eid, n_rows, n_features):
+    row_ids = ["row_{}".format(i) for i in range(n_rows)]
+    features = {
+        row_id: {"feature_{}".format(j): float(i * j) for j in range(n_features)}
+        for i, row_id in enumerate(row_ids)
+    }
+    labels = {row_id: i % 2 for i, row_id in enumerate(row_ids)}
+    return schema.Entity(eid=eid, row_ids=row_ids, features=features, labels=labels)
+
+
+def _time(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _full_document(eid, row_id):
+    entity = schema.Entity.find_one(eid=eid)
+    return entity.features[row_id]
+
+
+def run(rows=(10, 100, 1000, 10000), n_features=50, repeat=20):
+    results = []
+    for n_rows in rows:
+        eid = "benchmark_{}".format(n_rows)
+        schema.Entity.objects(eid=eid).delete()
+        _entity(eid, n_rows, n_features).save()
+        row_id = "row_{}".format(n_rows // 2)
+
+        results.append({
+            "rows": n_rows,
+            "features": n_features,
+            "full_document_seconds": _time(lambda: _full_document(eid, row_id), repeat),
+            "projected_seconds": _time(lambda: helpers.load_entity_row(eid, row_id), repeat),
+        })
+        schema.Entity.objects(eid=eid).delete()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--features", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--db", default="sibyl_benchmark")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=27017)
+    args = parser.parse_args()
+
+    connect(args.db, host=args.host, port=args.port)
+    try:
+        results = run(args.rows, args.features, args.repeat)
+    finally:
+        disconnect()
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
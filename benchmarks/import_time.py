@@ -0,0 +1,71 @@
+"""Benchmark the import time of the Sibyl entry points.
+
+Imports each module in a fresh interpreter with ``python -X importtime`` and reports
+its cumulative import time and the slowest modules it pulled in, as JSON.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --modules sibyl.cli sibyl.core --top 20
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+MODULES = ["sibyl.cli", "sibyl.core", "sibyl.db.preprocessing"]
+
+
+def import_times(module):
+    """
+    Import a module in a new interpreter and parse the output of ``-X importtime``
+    Args:
+        module (string): Name of the module to import
+
+    Returns:
+        dict: {imported module: cumulative import time in microseconds}
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def run(modules=MODULES, top=10):
+    results = []
+    for module in modules:
+        times = import_times(module)
+        slowest = sorted(times.items(), key=lambda item: item[1], reverse=True)
+        results.append({
+            "module": module,
+            "seconds": times[module] / 1e6,
+            "imported_modules": len(times),
+            "slowest": [
+                {"module": name, "seconds": micros / 1e6} for name, micros in slowest[1 : top + 1]
+            ],
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports shown")
+    args = parser.parse_args()
+
+    json.dump(run(args.modules, args.top), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
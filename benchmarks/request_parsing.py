@@ -0,0 +1,75 @@
+"""Benchmark request parameter parsing on the computing endpoints.
+
+Parses a representative request body with the request schema of each computing
+resource and reports the time spent per request, as JSON. Parameter validation
+functions that read the database (such as the validation of changes) are skipped, and
+the body is decoded once per request by Flask, so only parameter handling is timed.
+
+Usage:
+    python benchmarks/request_parsing.py --eids 100 --repeat 10000
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from flask import Flask
+
+from sibyl.resources import computing, model
+from sibyl.resources.computing import RequestSchema
+
+
+def build_bodies(n_eids):
+    eids = ["eid_{}".format(i) for i in range(n_eids)]
+    single = {"eid": eids[0], "model_id": "model", "row_id": "row_0"}
+    changes = dict(single, changes={"feature_{}".format(i): i for i in range(10)})
+    multi = {"eids": eids, "model_id": "model", "format": "columnar"}
+    return {
+        computing.FeatureContributions: single,
+        computing.ModifiedPrediction: dict(changes, return_proba=True),
+        computing.ModifiedFeatureContribution: changes,
+        computing.SingleChangePredictions: changes,
+        computing.MultiFeatureContributions: multi,
+        computing.SimilarEntities: multi,
+        model.MultiPrediction: dict(multi, return_proba=True),
+    }
+
+
+def _without_validation(request_schema):
+    return RequestSchema([attr._replace(validation=None) for attr in request_schema.attrs])
+
+
+def run(n_eids=100, repeat=10000):
+    app = Flask(__name__)
+    results = []
+    for resource, body in build_bodies(n_eids).items():
+        request_schema = _without_validation(resource.request_schema)
+        with app.test_request_context(method="POST", json=body):
+            success, _ = request_schema.parse()
+            assert success
+            start = time.perf_counter()
+            for _ in range(repeat):
+                request_schema.parse()
+            elapsed = time.perf_counter() - start
+
+        results.append({
+            "resource": resource.__name__,
+            "parameters": len(request_schema.attrs),
+            "microseconds_per_request": elapsed / repeat * 1e6,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--eids", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=10000)
+    args = parser.parse_args()
+
+    json.dump(run(args.eids, args.repeat), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
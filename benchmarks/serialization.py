@@ -0,0 +1,109 @@
+"""Benchmark response serialization and compression.
+
+Builds payloads shaped like the responses of the largest computing endpoints and
+reports the time spent encoding and compressing each one with every available
+backend, as JSON.
+
+Usage:
+    python benchmarks/serialization.py --entities 1000 --features 300
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from sibyl import serialization
+from sibyl.compression import ENCODINGS, compress
+
+
+def _frame(n_rows, n_features, rng, prefix="row"):
+    return pd.DataFrame(
+        rng.normal(size=(n_rows, n_features)),
+        index=["{}_{}".format(prefix, i) for i in range(n_rows)],
+        columns=["feature_{}".format(i) for i in range(n_features)],
+    )
+
+
+def build_payloads(n_entities, n_features, n_neighbors, seed=0):
+    """
+    Build one representative response body per endpoint
+    Args:
+        n_entities (int): Number of entities in each response
+        n_features (int): Number of features per entity
+        n_neighbors (int): Number of similar entities returned per entity
+
+    Returns:
+        dict: {endpoint: response body}
+    """
+    rng = np.random.default_rng(seed)
+    contributions = _frame(n_entities, n_features, rng)
+    values = _frame(n_entities, n_features, rng)
+
+    similar_entities = {}
+    for eid in contributions.index[: max(1, n_entities // 10)]:
+        similar_entities[eid] = {
+            "X": _frame(n_neighbors, n_features, rng, prefix="neighbor").to_dict(orient="index"),
+            "y": pd.Series(rng.normal(size=n_neighbors)).to_dict(),
+            "Input": values.loc[eid].to_dict(),
+        }
+
+    return {
+        "multi_contributions": {
+            "contributions": contributions.to_dict(orient="index"),
+            "values": values.to_dict(orient="index"),
+        },
+        "multi_prediction": {
+            "predictions": dict(zip(contributions.index, rng.normal(size=n_entities)))
+        },
+        "similar_entities": {"similar_entities": similar_entities},
+    }
+
+
+def _time(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(n_entities=1000, n_features=300, n_neighbors=5, repeat=3, level=6):
+    results = []
+    payloads = build_payloads(n_entities, n_features, n_neighbors)
+    for endpoint, payload in payloads.items():
+        for backend, dumps in serialization.BACKENDS.items():
+            encode_time, body = _time(lambda: dumps(payload), repeat)
+            result = {
+                "endpoint": endpoint,
+                "backend": backend,
+                "bytes": len(body),
+                "encode_seconds": encode_time,
+            }
+            for encoding in ENCODINGS:
+                compress_time, compressed = _time(lambda: compress(body, encoding, level), repeat)
+                result[encoding] = {"bytes": len(compressed), "seconds": compress_time}
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entities", type=int, default=1000)
+    parser.add_argument("--features", type=int, default=300)
+    parser.add_argument("--neighbors", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--level", type=int, default=6, help="Compression level")
+    args = parser.parse_args()
+
+    results = run(args.entities, args.features, args.neighbors, args.repeat, args.level)
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
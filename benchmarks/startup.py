@@ -0,0 +1,86 @@
+"""Benchmark app startup and per-request overhead of the API documentation modes.
+
+Builds the Flask app with flasgger parsing the resource docstrings, and with a static
+spec compiled by ``sibyl build-spec``, and reports the time spent creating the app,
+answering the first request and answering each following request, as JSON.
+
+Usage:
+    python benchmarks/startup.py --requests 1000
+    python benchmarks/startup.py --host mongomock://localhost
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from mongoengine import disconnect
+
+from sibyl.core import Sibyl
+from sibyl.routes import build_spec
+from sibyl.utils import get_project_root, read_config
+
+ROUTE = "/api/v1/categories/"
+
+
+def _time_mode(config, spec_filename, n_requests):
+    sibyl = Sibyl(config, docker=False)
+    try:
+        start = time.perf_counter()
+        app = sibyl._init_flask_app("production", spec_filename=spec_filename)
+        client = app.test_client()
+        init_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        client.get(ROUTE)
+        first_request_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(n_requests):
+            client.get(ROUTE)
+        request_time = (time.perf_counter() - start) / n_requests
+    finally:
+        disconnect()
+
+    return {
+        "init_seconds": init_time,
+        "first_request_seconds": first_request_time,
+        "request_seconds": request_time,
+    }
+
+
+def run(config, n_requests=1000):
+    with tempfile.TemporaryDirectory() as directory:
+        spec_filename = os.path.join(directory, "apispec.json")
+        start = time.perf_counter()
+        build_spec(spec_filename)
+        build_time = time.perf_counter() - start
+
+        results = {
+            "build_spec_seconds": build_time,
+            "flasgger": _time_mode(config, None, n_requests),
+            "static_spec": _time_mode(config, spec_filename, n_requests),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--db", default="sibyl_benchmark")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=27017)
+    args = parser.parse_args()
+
+    config = read_config(os.path.join(get_project_root(), "sibyl", "config.yml"))
+    config["mongodb"] = dict(config["mongodb"], db=args.db, host=args.host, port=args.port)
+    config["docs"] = {}
+
+    json.dump(run(config, args.requests), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
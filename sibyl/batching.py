@@ -0,0 +1,111 @@
+"""Sibyl prediction micro-batching.
+
+This module contains the code used to coalesce single-entity prediction requests
+for the same model into one batched ``realapp.predict`` call.
+"""
+
+import logging
+import threading
+
+import pandas as pd
+
+from sibyl import helpers
+
+LOGGER = logging.getLogger(__name__)
+
+
+class _Batch:
+    def __init__(self, event_class):
+        self.rows = []
+        self.predictions = None
+        self.error = None
+        self.exception = None
+        self.filled = event_class()
+        self.done = event_class()
+
+    def add(self, row):
+        self.rows.append(row)
+        return len(self.rows) - 1
+
+    def run(self, model_id):
+        try:
+            success, payload = helpers.load_realapp(model_id)
+            if not success:
+                self.error = payload
+                return
+            realapp = payload[0]
+            self.predictions = realapp.predict(pd.DataFrame(self.rows), as_dict=False)
+        except Exception as e:
+            LOGGER.exception(e)
+            self.exception = e
+        finally:
+            self.done.set()
+
+    def result(self, index):
+        if self.exception is not None:
+            raise self.exception
+        if self.error is not None:
+            return False, self.error
+        prediction = self.predictions[index]
+        if hasattr(prediction, "tolist"):
+            prediction = prediction.tolist()
+        return True, prediction
+
+
+class PredictionBatcher:
+    """Coalesce single-row predictions for the same model.
+
+    The first request for a model opens a batch and waits up to ``window_ms`` for
+    other requests for the same model to join it. The batch is then predicted on with
+    one call to ``realapp.predict`` and the results are handed back to each request.
+
+    Args:
+        window_ms (float):
+            Time to wait for other requests before predicting, in milliseconds
+        max_batch_size (int):
+            Number of rows after which a batch is predicted on without waiting
+        event_class (type):
+            Event class used to wait on batches. Use ``gevent.event.Event`` when running
+            under the gevent server
+    """
+
+    def __init__(self, window_ms=5, max_batch_size=256, event_class=threading.Event):
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.event_class = event_class
+        self._lock = threading.Lock()
+        self._pending = {}  # {model_id: _Batch}
+
+    def predict(self, model_id, row):
+        """
+        Get the model prediction on one row of features
+        Args:
+            model_id (string): ID of model to predict with
+            row (dict): {feature_name: feature_value} for the row to predict on
+
+        Returns:
+            success (bool): True if the prediction was made successfully
+            payload (object): If success is True, payload is the prediction
+                              Else, payload is (error message, error code)
+        """
+        with self._lock:
+            batch = self._pending.get(model_id)
+            leader = batch is None
+            if leader:
+                batch = _Batch(self.event_class)
+                self._pending[model_id] = batch
+            index = batch.add(row)
+            if len(batch.rows) >= self.max_batch_size:
+                del self._pending[model_id]
+                batch.filled.set()
+
+        if leader:
+            batch.filled.wait(self.window)
+            with self._lock:
+                if self._pending.get(model_id) is batch:
+                    del self._pending[model_id]
+            batch.run(model_id)
+        else:
+            batch.done.wait()
+
+        return batch.result(index)
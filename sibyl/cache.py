@@ -0,0 +1,229 @@
+"""Sibyl result caching.
+
+This module contains the in-memory LRU cache used by the API, the shared
+prediction cache layered on top of it, and HTTP conditional GET support.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import Response, request
+from werkzeug.http import quote_etag
+
+from sibyl import g
+from sibyl.compression import ENCODINGS, encoded_etag
+from sibyl.db import schema
+from sibyl.invalidation import get_versions
+from sibyl.serialization import dumps
+
+LOGGER = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with optional time-to-live.
+
+    Args:
+        maxsize (int):
+            Maximum number of entries to keep. The least recently used entry is
+            evicted when the cache is full
+        ttl (float):
+            Number of seconds an entry stays valid. If None, entries do not expire
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # {key: (expires, value)}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def make_key(*parts, **params):
+    """
+    Build a canonical cache key from the given values
+    Args:
+        *parts: Values identifying the kind of result
+        **params: Request parameters. Dict values are hashed independently of their order
+
+    Returns:
+        key (string): Hex digest of the canonical JSON encoding of the values
+    """
+    payload = json.dumps([parts, params], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class PredictionCache:
+    """Cache of prediction responses.
+
+    Keys include the current versions of the model and entity collections, so results
+    are recomputed once a model or entity is written through the API.
+
+    Args:
+        maxsize (int):
+            Maximum number of responses kept in memory
+        ttl (float):
+            Number of seconds a response stays valid
+        mongo (bool):
+            If True, also store responses in the database so they are shared across
+            workers and survive restarts
+    """
+
+    def __init__(self, maxsize=4096, ttl=300, mongo=False):
+        self.ttl = ttl
+        self.mongo = mongo
+        self._memory = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def key(self, kind, model_id, **params):
+        versions = get_versions("model", "entity")
+        return make_key(kind, model_id, versions, **params)
+
+    def get(self, key):
+        value = self._memory.get(key)
+        if value is not None or not self.mongo:
+            return value
+
+        document = schema.CachedResult.objects(key=key).only("value", "expires_at").first()
+        if document is None or document.expires_at < datetime.utcnow():
+            return None
+        value = json.loads(document.value)
+        self._memory.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self._memory.set(key, value)
+        if self.mongo:
+            try:
+                schema.CachedResult.objects(key=key).update_one(
+                    set__value=dumps(value).decode("utf-8"),
+                    set__expires_at=datetime.utcnow() + timedelta(seconds=self.ttl),
+                    upsert=True,
+                )
+            except Exception as e:
+                LOGGER.exception(e)
+
+    def clear(self, collection=None):
+        """Evict all responses kept in memory."""
+        self._memory.clear()
+
+    def get_or_compute(self, kind, model_id, compute, **params):
+        """
+        Get a response from the cache, computing and storing it if it is not cached
+        Args:
+            kind (string): Name of the kind of response
+            model_id (string): ID of the model used to compute the response
+            compute (function): Function returning (response body, status code)
+            **params: Request parameters the response depends on
+
+        Returns:
+            body (dict): The response body
+            code (int): The response status code. Only 200 responses are cached
+        """
+        key = self.key(kind, model_id, **params)
+        value = self.get(key)
+        if value is not None:
+            return value, 200
+
+        value, code = compute()
+        if code == 200:
+            self.set(key, value)
+        return value, code
+
+
+def cached_response(kind, model_id, compute, **params):
+    """
+    Get a response through the shared prediction cache, if it is enabled
+    Args:
+        kind (string): Name of the kind of response
+        model_id (string): ID of the model used to compute the response
+        compute (function): Function returning (response body, status code)
+        **params: Request parameters the response depends on
+
+    Returns:
+        body (dict): The response body
+        code (int): The response status code
+    """
+    cache = g.get("prediction_cache")
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(kind, model_id, compute, **params)
+
+
+def conditional_get(*collections):
+    """
+    Add ETag and Cache-Control headers to a resource ``get`` method, and answer requests
+    whose If-None-Match header matches the current ETag with 304 Not Modified without
+    calling the method.
+
+    The ETag is derived from the request path and the versions of the given collections,
+    so it changes whenever one of them is written through the API.
+
+    Args:
+        *collections (string): Names of the collections the response is read from
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            http_cache = g["config"].get("http_cache") or {}
+            if not http_cache.get("etags", True):
+                return method(*args, **kwargs)
+
+            versions = get_versions(*collections)
+            etag = make_key(request.full_path, versions)
+            headers = {"ETag": quote_etag(etag)}
+            cache_control = http_cache.get("cache_control", "no-cache")
+            if cache_control:
+                headers["Cache-Control"] = cache_control
+
+            etags = [etag] + [encoded_etag(etag, encoding) for encoding in ENCODINGS]
+            if any(request.if_none_match.contains(tag) for tag in etags):
+                return Response(status=304, headers=headers)
+
+            result = method(*args, **kwargs)
+            if not isinstance(result, tuple):
+                result = (result, 200)
+            if result[1] != 200:
+                return result
+            return result[0], result[1], headers
+
+        return wrapper
+
+    return decorator
@@ -1,30 +1,108 @@
 import argparse
 import os
 
-from sibyl.core import Sibyl
-from sibyl.db.preprocessing import prepare_database_from_config
-from sibyl.sample_applications.housing import prepare_db as prepare_housing_db
 from sibyl.utils import get_project_root, read_config, setup_logging
 
+# Subcommands import what they need when they run, so that each one only pays for loading
+# its own dependencies (pyreal, pandas, flask...)
+
 
 def _run(args):
+    from sibyl.core import Sibyl
+
     config = read_config(os.path.join(get_project_root(), "sibyl", "config.yml"))
     sibyl = Sibyl(config, args.docker, args.dbhost, args.dbport, args.db)
 
     if args.generate_docs:
         sibyl.run_server(args.env, args.port, docs_filename=args.docs_filename)
     else:
-        sibyl.run_server(args.env, args.port)
+        sibyl.run_server(args.env, args.port, spec_filename=args.static_spec)
+
+
+def _build_spec(args):
+    from sibyl.routes import build_spec
+
+    build_spec(args.output)
 
 
 def _prepare_db(args):
-    prepare_database_from_config(args.config, args.directory)
+    import json
+
+    from sibyl.db.preprocessing import prepare_database_from_config
+
+    report = prepare_database_from_config(
+        args.config, args.directory, profile=args.profile is not None, resume=args.resume
+    )
+    if args.profile == "-":
+        print(json.dumps(report, indent=2))
+    elif args.profile is not None:
+        with open(args.profile, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def _sync_entities(args):
+    import json
+
+    from sibyl.db.preprocessing import connect_to_db, sync_entities_from_csv
+
+    connect_to_db(args.database_name)
+    counts = sync_entities_from_csv(
+        args.filename,
+        label_column=args.label_column,
+        update_feature_values=args.update_feature_values,
+    )
+    print(json.dumps(counts, indent=2))
 
 
 def _prepare_housing_db(args):
+    from sibyl.sample_applications.housing import prepare_db as prepare_housing_db
+
     prepare_housing_db.run()
 
 
+def _query_logs(args):
+    import csv
+    import sys
+
+    from sibyl.event_log import ColumnarLog, end_of_day, parse_time
+    from sibyl.resources.logger import log_headers
+
+    directory = args.directory
+    if directory is None:
+        config = read_config(os.path.join(get_project_root(), "sibyl", "config.yml"))
+        directory = config["log_directory"]
+
+    events = ColumnarLog(directory, log_headers).query(
+        user_id=args.user_id,
+        eid=args.eid,
+        start=parse_time(args.start),
+        end=end_of_day(args.end),
+    )
+    writer = csv.DictWriter(sys.stdout, fieldnames=log_headers, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(events)
+
+
+def _profiles(args):
+    from sibyl.profiling import list_profiles, summarize_profile
+
+    directory = args.directory
+    if directory is None:
+        config = read_config(os.path.join(get_project_root(), "sibyl", "config.yml"))
+        directory = config["profiling"]["directory"]
+
+    if args.name is not None:
+        print(summarize_profile(directory, args.name, sort=args.sort, limit=args.limit))
+        return
+
+    for meta in list_profiles(directory, endpoint=args.endpoint):
+        print(
+            "{name}  {method} {path}  {status}  {duration_ms:.1f} ms".format(
+                duration_ms=meta["duration"] * 1000, **meta
+            )
+        )
+
+
 def get_parser():
     # Common Parent - Shared options
     common = argparse.ArgumentParser(add_help=False)
@@ -87,6 +165,29 @@ def get_parser():
         help="API documentation filename, if --generate-docs is set",
         default=default_docs_file,
     )
+    run.add_argument(
+        "--static-spec",
+        action="store",
+        nargs="?",
+        const=default_docs_file,
+        help=(
+            "Serve an API spec compiled with build-spec instead of parsing the docstrings. "
+            "Overrides config"
+        ),
+    )
+
+    # sibyl build-spec
+    build_spec = action.add_parser(
+        "build-spec", help="Compile the API documentation into a static file", parents=[common]
+    )
+    build_spec.set_defaults(function=_build_spec)
+    build_spec.add_argument(
+        "-o",
+        "--output",
+        action="store",
+        help="Path of the file to write",
+        default=default_docs_file,
+    )
 
     # sibyl prepare-db
     prepare_db = action.add_parser(
@@ -98,6 +199,89 @@ def get_parser():
     prepare_db.add_argument(
         "directory", action="store", help="Path of directory containing files listed in config"
     )
+    prepare_db.add_argument(
+        "--resume",
+        action="store_true",
+        help=(
+            "Skip the stages completed by a previous run whose input files did not change. "
+            "Overrides drop_old"
+        ),
+    )
+    prepare_db.add_argument(
+        "--profile",
+        action="store",
+        nargs="?",
+        const="-",
+        help=(
+            "Report the wall time, peak memory and rows/sec of each stage as JSON, "
+            "to this file or to stdout"
+        ),
+    )
+
+    # sibyl sync-entities
+    sync_entities = action.add_parser(
+        "sync-entities",
+        help="Insert new entities and update changed rows from a csv file",
+        parents=[common],
+    )
+    sync_entities.set_defaults(function=_sync_entities)
+    sync_entities.add_argument("database_name", action="store", help="Name of the database")
+    sync_entities.add_argument("filename", action="store", help="Path of the entities csv file")
+    sync_entities.add_argument(
+        "--label-column",
+        action="store",
+        default="label",
+        help="Name of the column containing labels",
+    )
+    sync_entities.add_argument(
+        "--update-feature-values",
+        action="store_true",
+        help="Add the values of the categorical features to the feature documents",
+    )
+
+    # sibyl query-logs
+    query_logs = action.add_parser(
+        "query-logs", help="Print logged events from a columnar log as CSV", parents=[common]
+    )
+    query_logs.set_defaults(function=_query_logs)
+    query_logs.add_argument(
+        "-d", "--directory", action="store", help="Log directory. Defaults to config"
+    )
+    query_logs.add_argument("-u", "--user-id", action="store", help="Only events of this user")
+    query_logs.add_argument("-e", "--eid", action="store", help="Only events about this entity")
+    query_logs.add_argument(
+        "--start",
+        action="store",
+        help="Only events at or after this time (seconds since Epoch, or ISO date or datetime)",
+    )
+    query_logs.add_argument(
+        "--end",
+        action="store",
+        help="Only events at or before this time. An ISO date includes the whole day",
+    )
+
+    # sibyl profiles
+    profiles = action.add_parser(
+        "profiles",
+        help="List the stored request profiles, or summarize one of them",
+        parents=[common],
+    )
+    profiles.set_defaults(function=_profiles)
+    profiles.add_argument(
+        "name", action="store", nargs="?", help="Name of the profile to summarize"
+    )
+    profiles.add_argument(
+        "-d", "--directory", action="store", help="Profile directory. Defaults to config"
+    )
+    profiles.add_argument(
+        "-e", "--endpoint", action="store", help="Only list profiles of this endpoint"
+    )
+    profiles.add_argument(
+        "-s", "--sort", action="store", default="cumulative", help="pstats sort key"
+    )
+    profiles.add_argument(
+        "-n", "--limit", type=int, default=20, help="Number of functions to summarize"
+    )
 
     # sibyl prepare-sample-db
     prepare_sample_db = action.add_parser(
@@ -0,0 +1,89 @@
+"""Sibyl response compression.
+
+This module contains the ``after_request`` hook that compresses large responses with
+the best encoding the client accepts. Brotli is used when the ``brotli`` package is
+installed and the client accepts it, and gzip otherwise.
+"""
+
+import gzip
+import logging
+
+from flask import request
+
+from sibyl import g
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _compress_gzip(data, level):
+    return gzip.compress(data, compresslevel=level)
+
+
+def _compress_brotli(data, level):
+    # brotli quality ranges from 0 to 11, gzip levels from 1 to 9
+    return brotli.compress(data, quality=min(11, level))
+
+
+ENCODINGS = {"gzip": _compress_gzip}
+if brotli is not None:
+    ENCODINGS["br"] = _compress_brotli
+
+
+def choose_encoding(accept_encodings):
+    """
+    Choose the encoding to use for a response
+    Args:
+        accept_encodings (werkzeug Accept): Encodings accepted by the client
+
+    Returns:
+        string: Name of the encoding to use, or None if no supported encoding is accepted
+    """
+    for encoding in ("br", "gzip"):
+        if encoding in ENCODINGS and accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def encoded_etag(etag, encoding):
+    return "{}-{}".format(etag, encoding)
+
+
+def compress(data, encoding, level=6):
+    return ENCODINGS[encoding](data, level)
+
+
+def compress_response(response):
+    """Compress the response body if it is large enough and the client accepts it."""
+    config = g["config"].get("compression") or {}
+    if not config.get("enabled", True):
+        return response
+
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < config.get("min_size", 1024):
+        return response
+
+    response.set_data(compress(data, encoding, config.get("level", 6)))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag is not None:
+        # a strong ETag must differ between encodings of the same resource
+        response.set_etag(encoded_etag(etag, encoding), weak=weak)
+    return response
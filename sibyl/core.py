@@ -1,15 +1,26 @@
 import logging
 import os
 import sys
+import threading
 
 from flask import Flask
 from flask_cors import CORS
-from gevent.pywsgi import WSGIServer
 from mongoengine import connect
 from termcolor import colored
 
-from sibyl import g
+import sibyl.resources as ctrl
+from sibyl import g, helpers, metrics
+from sibyl.batching import PredictionBatcher
+from sibyl.cache import PredictionCache
+from sibyl.compression import compress_response
+from sibyl.event_log import ColumnarLog, CSVLog
+from sibyl.invalidation import create_bus
+from sibyl.jobs import JobRunner
+from sibyl.log_sink import LogSink
+from sibyl.profiling import RequestProfiler
 from sibyl.routes import add_routes
+from sibyl.serialization import set_backend
+from sibyl.warmup import warm_up
 
 LOGGER = logging.getLogger(__name__)
 
@@ -27,7 +38,7 @@ class Sibyl:
             Whether launch app in docker environment.
     """
 
-    def _init_flask_app(self, env, docs_filename=None):
+    def _init_flask_app(self, env, docs_filename=None, spec_filename=None):
         app = Flask(
             __name__,
             static_url_path="",
@@ -47,12 +58,108 @@ class Sibyl:
             app.config.from_mapping(DEBUG=False, TESTING=True)
 
         CORS(app)
-        add_routes(app, docs_filename)
+        if spec_filename is None:
+            spec_filename = (self._conf.get("docs") or {}).get("static_spec")
+        add_routes(app, docs_filename, spec_filename)
+        if (self._conf.get("metrics") or {}).get("enabled", False):
+            # registered before compression, so the timings include it
+            metrics.init_app(app)
+        profiling = self._conf.get("profiling") or {}
+        if profiling.get("enabled", False):
+            RequestProfiler(
+                profiling.get("directory", "profiles"),
+                sample_rate=profiling.get("sample_rate", 0.0),
+                slow_threshold=profiling.get("slow_threshold", 0.0),
+            ).init_app(app)
+        app.after_request(compress_response)
+        set_backend((self._conf.get("serialization") or {}).get("json_backend", "auto"))
 
         # set up global variables
         g["config"] = self._conf
         g["app"] = app
 
+        batching = self._conf.get("prediction_batching") or {}
+        if batching.get("window_ms", 0) > 0:
+            # production runs on the gevent server, where waiting requests must yield
+            if env == "production":
+                from gevent.event import Event as event_class
+            else:
+                event_class = threading.Event
+            g["prediction_batcher"] = PredictionBatcher(
+                window_ms=batching["window_ms"],
+                max_batch_size=batching.get("max_batch_size", 256),
+                event_class=event_class,
+            )
+        else:
+            g["prediction_batcher"] = None
+
+        prediction_cache = self._conf.get("prediction_cache") or {}
+        if prediction_cache.get("enabled", False):
+            g["prediction_cache"] = PredictionCache(
+                maxsize=prediction_cache.get("maxsize", 4096),
+                ttl=prediction_cache.get("ttl", 300),
+                mongo=prediction_cache.get("mongo", False),
+            )
+        else:
+            g["prediction_cache"] = None
+
+        if g.get("invalidation_bus") is not None:
+            g["invalidation_bus"].stop()
+        invalidation = self._conf.get("invalidation") or {}
+        if invalidation.get("enabled", False):
+            bus = create_bus(
+                mode=invalidation.get("mode", "auto"), interval=invalidation.get("interval", 1.0)
+            )
+            bus.subscribe(helpers.clear_model_caches, "model")
+            if g["prediction_cache"] is not None:
+                bus.subscribe(g["prediction_cache"].clear, "model", "entity")
+            g["invalidation_bus"] = bus
+        else:
+            g["invalidation_bus"] = None
+
+        log_sink = self._conf.get("log_sink") or {}
+        buffered = log_sink.get("buffered", False)
+        columnar = self._conf.get("log_backend", "csv") == "columnar"
+        if columnar and not buffered:
+            # unbuffered, every event would be written as its own segment
+            LOGGER.warning("The columnar log backend requires log_sink.buffered, enabling it")
+            buffered = True
+        if columnar:
+            columnar_log = self._conf.get("columnar_log") or {}
+            g["event_log"] = ColumnarLog(
+                self._conf["log_directory"],
+                ctrl.logger.log_headers,
+                max_segments=columnar_log.get("max_segments", 64),
+                segment_rows=columnar_log.get("segment_rows", 100000),
+            )
+        else:
+            g["event_log"] = CSVLog(
+                self._conf["log_filename"],
+                ctrl.logger.log_headers,
+                per_worker=buffered and log_sink.get("per_worker", True),
+                max_bytes=log_sink.get("max_bytes", 0),
+            )
+        if buffered:
+            g["log_sink"] = LogSink(
+                g["event_log"],
+                max_events=log_sink.get("max_events", 100),
+                interval=log_sink.get("interval", 1),
+            )
+        else:
+            g["log_sink"] = None
+
+        jobs = self._conf.get("jobs") or {}
+        g["job_runner"] = JobRunner(
+            app,
+            {
+                "multi_contributions": ctrl.computing.MultiFeatureContributions,
+                "multi_prediction": ctrl.model.MultiPrediction,
+                "similar_entities": ctrl.computing.SimilarEntities,
+            },
+            workers=jobs.get("workers", 2),
+            chunk_size=jobs.get("chunk_size", 100),
+        )
+
         return app
 
     def __init__(self, conf: dict, docker: bool, dbhost=None, dbport=None, db=None):
@@ -79,7 +186,7 @@ class Sibyl:
         self._db = connect(**kargs)
         # TODO - using testing datasets in test env
 
-    def run_server(self, env=None, port=None, docs_filename=None):
+    def run_server(self, env=None, port=None, docs_filename=None, spec_filename=None):
         env = self._conf["flask"]["ENV"] if env is None else env
         port = self._conf["flask"]["PORT"] if port is None else port
 
@@ -91,7 +198,14 @@ class Sibyl:
         # in case running app with the absolute path
         sys.path.append(os.path.dirname(__file__))
 
-        app = self._init_flask_app(env, docs_filename=docs_filename)
+        app = self._init_flask_app(env, docs_filename=docs_filename, spec_filename=spec_filename)
+
+        warmup = self._conf.get("warmup") or {}
+        # the development reloader runs the server in a child process, warm up only there
+        reloader_parent = env == "development" and os.environ.get("WERKZEUG_RUN_MAIN") != "true"
+        if warmup.get("enabled", False) and not reloader_parent:
+            LOGGER.info(colored("Warming up", "yellow"))
+            warm_up(model_ids=warmup.get("models"), predict=warmup.get("predict", True))
 
         LOGGER.info(colored("Starting up FLASK APP in {} mode".format(env), "yellow"))
 
@@ -107,6 +221,8 @@ class Sibyl:
             # app.run(debug=True, port=port, ssl_context="adhoc")
 
         elif env == "production":
+            from gevent.pywsgi import WSGIServer
+
             server = WSGIServer(("0.0.0.0", port), app, log=None)
             # server = WSGIServer(('0.0.0.0', port), app, ssl_context="adhoc", log=None)
             server.serve_forever()
@@ -4,29 +4,41 @@ This subpackage contains all the code related to the
 Sibyl Database usage.
 """
 
+import importlib
+
 from sibyl.db import schema, utils
-from sibyl.db.explorer import DBExplorer
-from sibyl.db.preprocessing import (
-    connect_to_db,
-    disconnect_from_db,
-    get_entities_df,
-    get_features_df,
-    get_context_dict,
-    insert_features_from_csv,
-    insert_features_from_dataframe,
-    insert_categories_from_csv,
-    insert_categories_from_dataframe,
-    insert_context_from_yaml,
-    insert_context_from_dict,
-    insert_entities_from_csv,
-    insert_entities_from_dataframe,
-    insert_training_set,
-    insert_model_from_file,
-    insert_model_from_object,
-    insert_models_from_directory,
-    prepare_database_from_config,
-    prepare_database,
-)
+
+# The explorer and the preprocessing functions are only needed to prepare a database, so
+# they are imported on first use and the server does not load their dependencies
+_LAZY_ATTRIBUTES = {"DBExplorer": "sibyl.db.explorer"}
+_LAZY_ATTRIBUTES.update({
+    "connect_to_db": "sibyl.db.preprocessing",
+    "disconnect_from_db": "sibyl.db.preprocessing",
+    "get_entities_df": "sibyl.db.preprocessing",
+    "get_features_df": "sibyl.db.preprocessing",
+    "get_context_dict": "sibyl.db.preprocessing",
+    "insert_features_from_csv": "sibyl.db.preprocessing",
+    "insert_features_from_dataframe": "sibyl.db.preprocessing",
+    "insert_categories_from_csv": "sibyl.db.preprocessing",
+    "insert_categories_from_dataframe": "sibyl.db.preprocessing",
+    "insert_context_from_yaml": "sibyl.db.preprocessing",
+    "insert_context_from_dict": "sibyl.db.preprocessing",
+    "insert_entities_from_csv": "sibyl.db.preprocessing",
+    "insert_entities_from_dataframe": "sibyl.db.preprocessing",
+    "insert_training_set": "sibyl.db.preprocessing",
+    "insert_model_from_file": "sibyl.db.preprocessing",
+    "insert_model_from_object": "sibyl.db.preprocessing",
+    "insert_models_from_directory": "sibyl.db.preprocessing",
+    "prepare_database_from_config": "sibyl.db.preprocessing",
+    "prepare_database": "sibyl.db.preprocessing",
+})
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
 
 __all__ = [
     "DBExplorer",
@@ -94,6 +94,51 @@ class SibylMeta(TopLevelDocumentMetaclass):
         return super().__new__(mcs, name, bases, attrs)
 
 
+class DocumentVersion(Document):
+    """Write counter of one collection.
+
+    Every write made through a ``SibylDocument`` increments the version of its
+    collection, so readers can tell whether a collection changed with one small query.
+    Writes made to the database directly, outside of Sibyl, are not counted.
+
+    Functions added with ``add_listener`` are called with the collection name and its
+    new version after every write made by this process.
+    """
+
+    collection = fields.StringField(required=True, unique=True)
+    version = fields.IntField(default=0)
+
+    meta = {"collection": "document_version"}
+
+    _listeners = []
+
+    @classmethod
+    def add_listener(cls, listener):
+        cls._listeners.append(listener)
+
+    @classmethod
+    def remove_listener(cls, listener):
+        if listener in cls._listeners:
+            cls._listeners.remove(listener)
+
+    @classmethod
+    def bump(cls, collection):
+        if not cls._listeners:
+            cls.objects(collection=collection).update_one(inc__version=1, upsert=True)
+            return
+
+        document = cls.objects(collection=collection).modify(upsert=True, new=True, inc__version=1)
+        for listener in list(cls._listeners):
+            listener(collection, document.version)
+
+    @classmethod
+    def get_versions(cls, *collections):
+        """Get the current version of each of the given collections, in order."""
+        documents = cls.objects(collection__in=collections).as_pymongo()
+        versions = {document["collection"]: document["version"] for document in documents}
+        return tuple(versions.get(collection, 0) for collection in collections)
+
+
 class SibylDocument(Document, metaclass=SibylMeta):
     """Parent class for all the Document classes in Orion.
 
@@ -113,6 +158,24 @@ class SibylDocument(Document, metaclass=SibylMeta):
         "auto_create_index": True,
     }
 
+    @classmethod
+    def get_version(cls):
+        return DocumentVersion.get_versions(cls._get_collection_name())[0]
+
+    def save(self, *args, **kwargs):
+        document = super().save(*args, **kwargs)
+        DocumentVersion.bump(self._get_collection_name())
+        return document
+
+    def modify(self, query=None, **update):
+        modified = super().modify(query, **update)
+        DocumentVersion.bump(self._get_collection_name())
+        return modified
+
+    def delete(self, *args, **kwargs):
+        super().delete(*args, **kwargs)
+        DocumentVersion.bump(self._get_collection_name())
+
     @staticmethod
     def _get_id(obj):
         if isinstance(obj, ObjectId):
@@ -185,6 +248,12 @@ class SibylDocument(Document, metaclass=SibylMeta):
         for doc in wrapped_docs:
             doc.validate()
         cls.objects.insert(wrapped_docs)
+        DocumentVersion.bump(cls._get_collection_name())
+
+    @classmethod
+    def delete_many(cls, **kwargs):
+        cls.objects(**kwargs).delete()
+        DocumentVersion.bump(cls._get_collection_name())
 
     @classmethod
     def find_or_insert(cls, **kwargs):
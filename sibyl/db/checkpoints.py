@@ -0,0 +1,81 @@
+"""Sibyl database preparation checkpoints.
+
+This module contains the checkpoints of ``prepare_database``. Every completed stage is
+recorded in the ``preparation_checkpoint`` collection with a hash of its inputs, so a
+resumed preparation skips the stages whose inputs did not change since they completed.
+"""
+
+import hashlib
+import json
+import pickle
+
+import pandas as pd
+
+from sibyl.db import schema
+
+
+def hash_file(filepath):
+    """Get the SHA-256 hex digest of the content of a file."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_value(value):
+    """Get the SHA-256 hex digest of a dataframe, a JSON-serializable value or an object."""
+    if isinstance(value, pd.DataFrame):
+        data = pd.util.hash_pandas_object(value).values.tobytes()
+        data += json.dumps([str(column) for column in value.columns]).encode("utf-8")
+    else:
+        try:
+            data = json.dumps(value, sort_keys=True).encode("utf-8")
+        except TypeError:
+            data = pickle.dumps(value)
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_inputs(*hashes):
+    """Combine the hashes of the inputs of a stage into one hash."""
+    return hashlib.sha256("\n".join(hashes).encode("utf-8")).hexdigest()
+
+
+class Checkpoints:
+    """Checkpoints of the stages of one database preparation.
+
+    Args:
+        resume (bool): If True, stages with a checkpoint matching their inputs are skipped,
+            and stages that run first delete what an incomplete previous run wrote
+    """
+
+    def __init__(self, resume=False):
+        self.resume = resume
+
+    def is_done(self, stage, input_hash):
+        """Whether the stage can be skipped."""
+        if not self.resume:
+            return False
+        checkpoint = schema.PreparationCheckpoint.find_one(stage=stage)
+        return checkpoint is not None and checkpoint.input_hash == input_hash
+
+    def get_result(self, stage):
+        """Get the values recorded by a completed stage."""
+        return schema.PreparationCheckpoint.find_one(stage=stage).result
+
+    def start(self, stage, documents=()):
+        """
+        Forget the checkpoint of a stage about to run
+        Args:
+            stage (string): Name of the stage
+            documents (list): (document class, query) of the documents written by the stage,
+                deleted first when resuming
+        """
+        schema.PreparationCheckpoint.delete_many(stage=stage)
+        if self.resume:
+            for document_class, query in documents:
+                document_class.delete_many(**query)
+
+    def complete(self, stage, input_hash, **result):
+        """Record that a stage completed, with the values later stages need."""
+        schema.PreparationCheckpoint.insert(stage=stage, input_hash=input_hash, result=result)
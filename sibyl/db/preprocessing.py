@@ -1,3 +1,5 @@
+import hashlib
+import json
 import os
 import pickle
 import sys
@@ -6,10 +8,13 @@ import numpy as np
 import pandas as pd
 import yaml
 from mongoengine import connect, disconnect
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from tqdm import tqdm
 
 from sibyl.db import schema
+from sibyl.db.base import DocumentVersion
+from sibyl.db.checkpoints import Checkpoints, hash_file, hash_inputs, hash_value
+from sibyl.db.stages import StageProfiler, profile_stage
 from sibyl.utils import get_project_root
 
 
@@ -320,26 +325,49 @@ def insert_entities_from_dataframe(
 
     eids = entity_df["eid"]
 
+    entities = _entities_from_dataframe(entity_df, label_column)
+    if update_feature_values:
+        _update_feature_values(entity_df)
+    schema.Entity.insert_many(entities)
+    return eids.tolist()
+
+
+def _row_hash(features, label=None):
+    """Hash the features and label of one entity row, to detect changed rows."""
+    data = json.dumps([features, label], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _update_feature_values(entity_df):
+    """Add the values of the categorical features in entity_df to the feature documents."""
+    feature_df = schema.Feature.find(as_df_=True, only_=["name", "type"])
+    if not feature_df.empty:
+        cat_features = feature_df["name"][feature_df["type"] == "categorical"]
+        cat_feature_values = entity_df[cat_features]
+        cat_feature_values = cat_feature_values.apply(
+            lambda col: col.dropna().unique().astype(str)
+        )
+        for feature in cat_features:
+            doc = schema.Feature.find(name=feature).first()
+            existing_values = doc.values if doc.values is not None else []
+            doc.values = existing_values + [
+                value
+                for value in cat_feature_values[feature].tolist()
+                if value not in existing_values
+            ]
+            doc.save()
+
+
+def _entities_from_dataframe(entity_df, label_column):
+    """
+    Convert an entity dataframe to entity documents, with the hash of each row.
+    Adds a row_id column to entity_df if it has none.
+    """
     if "row_id" not in entity_df:
         entity_df["row_id"] = pd.Series(np.arange(0, entity_df.shape[0])).astype(str)
-        use_rows = False
     else:
         entity_df["row_id"] = entity_df["row_id"].astype(str)
-        use_rows = True
 
-    if update_feature_values:
-        feature_df = schema.Feature.find(as_df_=True, only_=["name", "type"])
-        if not feature_df.empty:
-            cat_features = feature_df["name"][feature_df["type"] == "categorical"]
-            cat_feature_values = entity_df[cat_features]
-            cat_feature_values = cat_feature_values.apply(
-                lambda col: col.dropna().unique().astype(str)
-            )
-            for feature in cat_features:
-                doc = schema.Feature.find(name=feature).first()
-                existing_values = doc.values if doc.values is not None else []
-                doc.values = existing_values + cat_feature_values[feature].tolist()
-                doc.save()
     entity_df = entity_df.set_index(["eid", "row_id"])
     raw_entities = {
         level: entity_df.xs(level).to_dict("index") for level in entity_df.index.levels[0]
@@ -354,9 +382,157 @@ def insert_entities_from_dataframe(
                 targets[row_id] = raw_entities[eid][row_id].pop(label_column)
         entity["features"] = raw_entities[eid]
         entity["labels"] = targets
+        entity["row_hashes"] = {
+            row_id: _row_hash(features, targets.get(row_id))
+            for row_id, features in raw_entities[eid].items()
+        }
         entities.append(entity)
-    schema.Entity.insert_many(entities)
-    return eids.tolist()
+    return entities
+
+
+def sync_entities_from_csv(filename, label_column=None, update_feature_values=False):
+    """
+    Insert the new entities and update the changed rows of existing entities from a csv file.
+    See sync_entities_from_dataframe.
+
+    Args:
+        filename (string): Filepath of csv file
+        label_column (string): Name of the column containing labels (y-values)
+        update_feature_values (bool):
+            Whether to update feature documents with the values in these entities
+
+    Returns:
+        dict: Number of entities and of rows inserted, updated and unchanged
+    """
+    try:
+        entity_df = pd.read_csv(filename)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Entities file {filename} not found. Must provide valid file.")
+
+    return sync_entities_from_dataframe(entity_df, label_column, update_feature_values)
+
+
+def sync_entities_from_dataframe(
+    entity_df, label_column="label", update_feature_values=False, batch_size=1000
+):
+    """
+    Insert the new entities and update the changed rows of existing entities from a pandas
+    Dataframe, in the format of insert_entities_from_dataframe.
+    Rows are compared through the hash of their features and label, and only new or
+    changed rows are written. Rows and entities missing from the dataframe are kept.
+    Args:
+        entity_df (Dataframe): Dataframe of entity information
+        label_column (string): Name of the column containing labels (y-values)
+        update_feature_values (bool):
+            Whether to update feature documents with the values in these entities
+        batch_size (int): Number of entities compared and written at a time
+
+    Returns:
+        dict: Number of entities and of rows inserted, updated and unchanged, as
+              {"entities": {"inserted": n, "updated": n, "unchanged": n}, "rows": {...}}
+    """
+    counts = {
+        "entities": {"inserted": 0, "updated": 0, "unchanged": 0},
+        "rows": {"inserted": 0, "updated": 0, "unchanged": 0},
+    }
+    if entity_df.empty:
+        return counts
+
+    if "eid" not in entity_df:
+        raise ValueError("Entity dataframe must contain column 'eid' at a minimum.")
+
+    if entity_df.shape[1] < 2:
+        raise ValueError("Entity dataframe must contain at least one feature column.")
+
+    entities = _entities_from_dataframe(entity_df, label_column)
+    if update_feature_values:
+        _update_feature_values(entity_df)
+
+    collection = schema.Entity._get_collection()
+    for start in range(0, len(entities), batch_size):
+        batch = entities[start : start + batch_size]
+        stored = {
+            document["eid"]: document
+            for document in collection.find(
+                {"eid": {"$in": [entity["eid"] for entity in batch]}},
+                {"eid": 1, "row_ids": 1, "row_hashes": 1},
+            )
+        }
+
+        new_entities = []
+        updates = []
+        for entity in batch:
+            document = stored.get(entity["eid"])
+            if document is None:
+                new_entities.append(entity)
+                counts["entities"]["inserted"] += 1
+                counts["rows"]["inserted"] += len(entity["row_ids"])
+                continue
+
+            stored_hashes = document.get("row_hashes") or {}
+            backfill = set(stored_hashes) != set(document.get("row_ids", []))
+            if backfill:
+                # entities inserted before row hashes were stored
+                stored_hashes = _stored_row_hashes(collection, entity["eid"])
+
+            update = {"$set": {}, "$unset": {}}
+            new_row_ids = []
+            for row_id in entity["row_ids"]:
+                row_hash = entity["row_hashes"][row_id]
+                if row_id not in stored_hashes:
+                    new_row_ids.append(row_id)
+                    counts["rows"]["inserted"] += 1
+                elif stored_hashes[row_id] != row_hash:
+                    counts["rows"]["updated"] += 1
+                else:
+                    counts["rows"]["unchanged"] += 1
+                    continue
+
+                update["$set"]["features." + row_id] = entity["features"][row_id]
+                update["$set"]["row_hashes." + row_id] = row_hash
+                if row_id in entity["labels"]:
+                    update["$set"]["labels." + row_id] = entity["labels"][row_id]
+                else:
+                    update["$unset"]["labels." + row_id] = ""
+
+            if backfill:
+                # store the hashes of all rows, so the next sync does not recompute them
+                row_hashes = dict(stored_hashes)
+                for key in list(update["$set"]):
+                    if key.startswith("row_hashes."):
+                        row_hashes[key[len("row_hashes.") :]] = update["$set"].pop(key)
+                update["$set"]["row_hashes"] = row_hashes
+
+            if not update["$set"]:
+                counts["entities"]["unchanged"] += 1
+                continue
+
+            if any(key.startswith("features.") for key in update["$set"]):
+                counts["entities"]["updated"] += 1
+            else:
+                counts["entities"]["unchanged"] += 1
+            if new_row_ids:
+                update["$push"] = {"row_ids": {"$each": new_row_ids}}
+            if not update["$unset"]:
+                del update["$unset"]
+            updates.append(UpdateOne({"eid": entity["eid"]}, update))
+
+        if new_entities:
+            schema.Entity.insert_many(new_entities)
+        if updates:
+            collection.bulk_write(updates, ordered=False)
+            DocumentVersion.bump(schema.Entity._get_collection_name())
+
+    return counts
+
+
+def _stored_row_hashes(collection, eid):
+    document = collection.find_one({"eid": eid}, {"features": 1, "labels": 1})
+    labels = document.get("labels") or {}
+    return {
+        row_id: _row_hash(features, labels.get(row_id))
+        for row_id, features in document.get("features", {}).items()
+    }
 
 
 def insert_training_set(eids):
@@ -390,6 +566,7 @@ def insert_model_from_file(
     training_size=None,
     fit_se=True,
     validate=True,
+    profiler=None,
 ):
     """
     Insert a model (RealApp) into the database from a pickle file.
@@ -411,6 +588,8 @@ def insert_model_from_file(
             explainer is very large when fit and may not fit in the database; if this is the case,
             set fit_se to False.
         validate (bool): Whether to validate the model and realapp by running predict and explain
+        profiler (StageProfiler): If given, profile the explainer fit, validation,
+            serialization and database write stages with it
 
     Returns:
         RealApp: the RealApp object inserted, possibly fit
@@ -434,6 +613,7 @@ def insert_model_from_file(
         training_size=training_size,
         fit_se=fit_se,
         validate=validate,
+        profiler=profiler,
     )
 
 
@@ -449,6 +629,7 @@ def insert_model_from_object(
     training_size=None,
     fit_se=True,
     validate=True,
+    profiler=None,
 ):
     """
     Insert a model (RealApp) into the database from a pickle file.
@@ -470,6 +651,8 @@ def insert_model_from_object(
             explainer is very large when fit and may not fit in the database; if this is the case,
             set fit_se to False.
         validate (bool): Whether to validate the model and explainer by running predict and explain
+        profiler (StageProfiler): If given, profile the explainer fit, validation,
+            serialization and database write stages with it
 
     Returns:
         RealApp: the RealApp object inserted, possibly fit
@@ -498,32 +681,38 @@ def insert_model_from_object(
             raise ValueError(error_message)
 
         if fit_explainers:
-            realapp.prepare_feature_contributions(
-                x_train_orig=x_train_orig,
-                y_train=y_train,
-                training_size=training_size,
-            )
-            realapp.prepare_feature_importance(
-                model_id=0,
-                x_train_orig=x_train_orig,
-                y_train=y_train,
-                training_size=training_size,
-            )
-            if fit_se:
-                realapp.prepare_similar_examples(
+            with profile_stage(profiler, "explainer fit") as stage:
+                stage["rows"] = len(x_train_orig)
+                realapp.prepare_feature_contributions(
+                    x_train_orig=x_train_orig,
+                    y_train=y_train,
+                    training_size=training_size,
+                )
+                realapp.prepare_feature_importance(
                     model_id=0,
                     x_train_orig=x_train_orig,
                     y_train=y_train,
                     training_size=training_size,
-                    standardize=True,
                 )
+                if fit_se:
+                    realapp.prepare_similar_examples(
+                        model_id=0,
+                        x_train_orig=x_train_orig,
+                        y_train=y_train,
+                        training_size=training_size,
+                        standardize=True,
+                    )
         if validate:
             # Check that everything is working correctly
-            _validate_model_and_realapp(realapp, x_train_orig)
+            with profile_stage(profiler, "validation"):
+                _validate_model_and_realapp(realapp, x_train_orig)
 
-    realapp_serial = pickle.dumps(realapp)
+    with profile_stage(profiler, "serialization") as stage:
+        realapp_serial = pickle.dumps(realapp)
+        stage["bytes"] = len(realapp_serial)
 
-    importance_dict = realapp.produce_feature_importance()
+    with profile_stage(profiler, "importance"):
+        importance_dict = realapp.produce_feature_importance()
     importance_df = pd.DataFrame.from_dict(importance_dict)
     importance_df = importance_df.rename(
         columns={"Feature Name": "name", "Importance": "importance"}
@@ -540,7 +729,9 @@ def insert_model_from_object(
         "realapp": realapp_serial,
         "training_set": training_set,
     }
-    schema.Model.insert(**items)
+    with profile_stage(profiler, "mongo write") as stage:
+        schema.Model.insert(**items)
+        stage["bytes"] = len(realapp_serial)
     return realapp
 
 
@@ -553,6 +744,7 @@ def insert_models_from_directory(
     training_size=None,
     fit_se=True,
     validate=True,
+    profiler=None,
 ):
     """
     Insert multiple models (RealApp) into the database from a directory of pickle files.
@@ -572,6 +764,8 @@ def insert_models_from_directory(
             explainer is very large when fit and may not fit in the database; if this is the case,
             set fit_se to False.
         validate (bool): Whether to validate the model and explainer by running predict and explain
+        profiler (StageProfiler): If given, profile the explainer fit, validation,
+            serialization and database write stages with it
 
     Returns:
         RealApp: the RealApp object inserted, possibly fit
@@ -588,10 +782,11 @@ def insert_models_from_directory(
                 training_size=training_size,
                 fit_se=fit_se,
                 validate=validate,
+                profiler=profiler,
             )
 
 
-def prepare_database_from_config(config_file, directory=None):
+def prepare_database_from_config(config_file, directory=None, profile=False, resume=False):
     with open(config_file, "r") as f:
         cfg = yaml.safe_load(f)
 
@@ -604,10 +799,10 @@ def prepare_database_from_config(config_file, directory=None):
         else:
             directory = cfg["directory"]
 
-    prepare_database(
+    return prepare_database(
         cfg["database_name"],
         directory=directory,
-        drop_old=cfg.get("drop_old", False),
+        drop_old=cfg.get("drop_old", False) and not resume,
         category_filepath=cfg.get("category_fn"),
         features_filepath=cfg.get("feature_fn", "features.csv"),
         entities_filepath=cfg.get("entity_fn", "entities.csv"),
@@ -620,6 +815,8 @@ def prepare_database_from_config(config_file, directory=None):
         fit_explainers=cfg.get("fit_explainers", True),
         training_size=cfg.get("training_size"),
         fit_se=cfg.get("fit_se", True),
+        profile=profile,
+        resume=resume,
     )
 
 
@@ -646,6 +843,8 @@ def prepare_database(
     category_df=None,
     category_filepath=None,
     streamlit_progress_bar_func=None,
+    profile=False,
+    resume=False,
 ):
     """
     Fully prepare a database from files or objects
@@ -678,6 +877,15 @@ def prepare_database(
         category_filepath (string): Filepath of csv file containing category information
         streamlit_progress_bar_func (function): Streamlit progress bar function to pass in for GUI
             applications. Should generally be kept as None
+        profile (bool): If True, record the wall time, peak memory and throughput of each
+            stage
+        resume (bool): If True, skip the stages completed by a previous preparation of the
+            same database whose inputs did not change, and replace what stages that did not
+            complete wrote. Completed stages are always recorded, so a failed preparation
+            can be resumed
+
+    Returns:
+        dict: If profile is True, the report of StageProfiler. Else, None
     """
 
     def _process_fp(fn):
@@ -703,38 +911,69 @@ def prepare_database(
         "Model": 20,
     }
     pbar = tqdm(total=sum(times.values()))
+    profiler = StageProfiler() if profile else None
 
     # Begin database loading ---------------------------
+    if resume and drop_old:
+        raise ValueError("Cannot resume a preparation with drop_old=True")
     connect_to_db(database_name, drop_old=drop_old)
+    checkpoints = Checkpoints(resume)
+
+    def _hash_input(value, filepath):
+        if value is not None:
+            return hash_value(value)
+        if filepath is not None:
+            return hash_file(_process_fp(filepath))
+        return "none"
 
     # INSERT CATEGORIES, IF PROVIDED
     pbar.set_description("Inserting categories...")
     if streamlit_progress_bar_func is not None:
         streamlit_progress_bar_func(0, "Inserting categories...")
-    if category_df is not None:
-        insert_categories_from_dataframe(category_df)
-    elif category_filepath is not None:
-        insert_categories_from_csv(_process_fp(category_filepath))
+    categories_hash = hash_inputs(_hash_input(category_df, category_filepath))
+    if not checkpoints.is_done("categories", categories_hash):
+        checkpoints.start("categories", [(schema.Category, {})])
+        with profile_stage(profiler, "categories") as stage:
+            categories = None
+            if category_df is not None:
+                categories = insert_categories_from_dataframe(category_df)
+            elif category_filepath is not None:
+                categories = insert_categories_from_csv(_process_fp(category_filepath))
+            stage["rows"] = len(categories or [])
+        checkpoints.complete("categories", categories_hash)
     pbar.update(times["Categories"])
 
     # INSERT FEATURES
     pbar.set_description("Inserting features...")
     if streamlit_progress_bar_func is not None:
         streamlit_progress_bar_func(5, "Inserting features...")
-    if features_df is not None:
-        insert_features_from_dataframe(features_df)
-    elif features_filepath is not None:
-        insert_features_from_csv(_process_fp(features_filepath))
+    # features insert the categories they use that are missing
+    features_hash = hash_inputs(categories_hash, _hash_input(features_df, features_filepath))
+    if not checkpoints.is_done("features", features_hash):
+        checkpoints.start("features", [(schema.Feature, {})])
+        with profile_stage(profiler, "features") as stage:
+            features = None
+            if features_df is not None:
+                features = insert_features_from_dataframe(features_df)
+            elif features_filepath is not None:
+                features = insert_features_from_csv(_process_fp(features_filepath))
+            stage["rows"] = len(features or [])
+        checkpoints.complete("features", features_hash)
     pbar.update(times["Features"])
 
     # INSERT CONTEXT
     pbar.set_description("Inserting context...")
     if streamlit_progress_bar_func is not None:
         streamlit_progress_bar_func(15, "Inserting context...")
-    if context_dict is not None:
-        insert_context_from_dict(context_dict)
-    elif context_filepath is not None:
-        insert_context_from_yaml(_process_fp(context_filepath))
+    context_hash = hash_inputs(_hash_input(context_dict, context_filepath))
+    if not checkpoints.is_done("context", context_hash):
+        checkpoints.start("context", [(schema.Context, {"context_id": "context"})])
+        with profile_stage(profiler, "context"):
+            if context_dict is not None:
+                insert_context_from_dict(context_dict)
+            elif context_filepath is not None:
+                insert_context_from_yaml(_process_fp(context_filepath))
+        checkpoints.complete("context", context_hash)
     pbar.update(times["Context"])
 
     # INSERT ENTITIES
@@ -742,14 +981,28 @@ def prepare_database(
     if streamlit_progress_bar_func is not None:
         streamlit_progress_bar_func(20, "Inserting entities...")
     eids = None
-    if entities_df is not None:
-        eids = insert_entities_from_dataframe(
-            entities_df, label_column=label_column, update_feature_values=True
-        )
-    elif entities_filepath is not None:
-        eids = insert_entities_from_csv(
-            _process_fp(entities_filepath), label_column=label_column, update_feature_values=True
-        )
+    # entities add their categorical values to the features
+    entities_hash = hash_inputs(
+        features_hash, _hash_input(entities_df, entities_filepath), label_column
+    )
+    if not checkpoints.is_done("entities", entities_hash):
+        checkpoints.start("entities", [(schema.Entity, {})])
+        with profile_stage(profiler, "entities") as stage:
+            if entities_df is not None:
+                eids = insert_entities_from_dataframe(
+                    entities_df, label_column=label_column, update_feature_values=True
+                )
+            elif entities_filepath is not None:
+                eids = insert_entities_from_csv(
+                    _process_fp(entities_filepath),
+                    label_column=label_column,
+                    update_feature_values=True,
+                )
+            # one eid per row
+            stage["rows"] = len(eids or [])
+        checkpoints.complete("entities", entities_hash)
+    elif entities_df is not None or entities_filepath is not None:
+        eids = [entity.eid for entity in schema.Entity.find(only_=["eid"])]
     pbar.update(times["Entities"])
 
     # INSERT FULL DATASET
@@ -757,49 +1010,89 @@ def prepare_database(
     if streamlit_progress_bar_func is not None:
         streamlit_progress_bar_func(50, "Inserting training set...")
     training_set = None
-    if training_eids is not None:
-        training_set = insert_training_set(training_eids)
-    elif use_entities_as_training_set:
-        if eids is None:
-            raise ValueError("Must provide entities or set use_entities_as_training_set=False")
-        training_set = insert_training_set(eids)
+    training_set_hash = hash_inputs(
+        entities_hash, hash_value(training_eids), str(use_entities_as_training_set)
+    )
+    if checkpoints.is_done("training set", training_set_hash):
+        training_set_id = checkpoints.get_result("training set").get("training_set_id")
+        if training_set_id is not None:
+            training_set = schema.TrainingSet.find_one(trainingset=training_set_id)
+    else:
+        # models are fit on the training set, so they are inserted again too
+        checkpoints.start("training set", [(schema.Model, {}), (schema.TrainingSet, {})])
+        with profile_stage(profiler, "training set") as stage:
+            if training_eids is not None:
+                training_set = insert_training_set(training_eids)
+                stage["rows"] = len(training_eids)
+            elif use_entities_as_training_set:
+                if eids is None:
+                    raise ValueError(
+                        "Must provide entities or set use_entities_as_training_set=False"
+                    )
+                training_set = insert_training_set(eids)
+                stage["rows"] = len(eids)
+        checkpoints.complete(
+            "training set",
+            training_set_hash,
+            training_set_id=str(training_set.id) if training_set is not None else None,
+        )
     pbar.update(times["Training Set"])
 
     # INSERT MODEL
     pbar.set_description("Inserting model...")
     if streamlit_progress_bar_func is not None:
         streamlit_progress_bar_func(80, "Inserting model...")
+    models = []  # (model_id, realapp filepath or None for the realapp object)
     if realapp_directory is not None:
         realapp_directory = _process_fp(realapp_directory)
         if not os.path.isdir(realapp_directory):
             raise FileNotFoundError(
                 f"RealApp directory {realapp_directory} is not a valid directory."
             )
-        insert_models_from_directory(
-            realapp_directory,
-            fit_explainers=fit_explainers,
-            training_set=training_set,
-            training_size=training_size,
-            fit_se=fit_se,
-        )
+        for file in sorted(os.listdir(realapp_directory)):
+            if file.endswith(".pkl"):  # Ignore other files in the directory
+                models.append((file[:-4], os.path.join(realapp_directory, file)))
     elif realapp is not None:
-        insert_model_from_object(
-            realapp,
-            model_id=model_id,
-            fit_explainers=fit_explainers,
-            training_set=training_set,
-            training_size=training_size,
-            fit_se=fit_se,
-        )
+        models.append((model_id or "model", None))
     elif realapp_filepath is not None:
-        insert_model_from_file(
-            _process_fp(realapp_filepath),
-            model_id=model_id,
-            fit_explainers=fit_explainers,
-            training_set=training_set,
-            training_size=training_size,
-            fit_se=fit_se,
+        models.append((model_id or "model", _process_fp(realapp_filepath)))
+
+    options = [fit_explainers, training_size, fit_se]
+    for model_id, filepath in models:
+        stage_name = "model:{}".format(model_id)
+        model_hash = hash_inputs(
+            training_set_hash,
+            hash_file(filepath) if filepath is not None else hash_value(realapp),
+            hash_value(options),
         )
+        if checkpoints.is_done(stage_name, model_hash):
+            continue
+
+        checkpoints.start(stage_name, [(schema.Model, {"model_id": model_id})])
+        if filepath is None:
+            insert_model_from_object(
+                realapp,
+                model_id=model_id,
+                fit_explainers=fit_explainers,
+                training_set=training_set,
+                training_size=training_size,
+                fit_se=fit_se,
+                profiler=profiler,
+            )
+        else:
+            insert_model_from_file(
+                filepath,
+                model_id=model_id,
+                fit_explainers=fit_explainers,
+                training_set=training_set,
+                training_size=training_size,
+                fit_se=fit_se,
+                profiler=profiler,
+            )
+        checkpoints.complete(stage_name, model_hash)
     pbar.update(times["Model"])
     if streamlit_progress_bar_func is not None:
         streamlit_progress_bar_func(100, "Finalizing...")
+
+    if profiler is not None:
+        return profiler.report()
@@ -8,7 +8,7 @@ import logging
 import pandas as pd
 from mongoengine import DENY, NULLIFY, PULL, Document, ValidationError, fields
 
-from sibyl.db.base import SibylDocument
+from sibyl.db.base import DocumentVersion, SibylDocument  # noqa: F401
 
 LOGGER = logging.getLogger(__name__)
 
@@ -84,6 +84,8 @@ class Entity(SibylDocument):
     property : dict {property : value}
         Domain-specific properties
     labels : dict {row_id : label}
+    row_hashes : dict {row_id : hash}
+        Hash of the features and label of each row, to find changed rows when syncing
     events : list [Event object]
         List of events this entity was involved in
     """
@@ -94,6 +96,7 @@ class Entity(SibylDocument):
     features = fields.DictField(required=True)  # {row_id: {feature:value}}
     property = fields.DictField()  # {property:value}
     labels = fields.DictField()  # {row_id: ground_truth_label}, as provided
+    row_hashes = fields.DictField()  # {row_id: hash of features and label}
 
     events = fields.ListField(fields.ReferenceField(Event, reverse_delete_rule=PULL))
 
@@ -241,3 +244,87 @@ class Context(SibylDocument):
 
     context_id = fields.StringField(required=True, validation=_valid_id)
     config = fields.DictField()
+
+
+class Job(SibylDocument):
+    """
+    A **Job** holds the state of a long-running request computed in the background
+
+    Attributes
+    ----------
+    job_id : str
+        Unique ID of the job
+    type : str
+        Name of the endpoint computing the job
+    request : dict
+        Request body the job was submitted with
+    status : str
+        One of pending, running, done and failed
+    progress : float
+        Fraction of the job completed, from 0 to 1
+    result : GridFS file
+        JSON-encoded response body, once the job is done. Stored in GridFS, as results
+        can be larger than the document size limit
+    error : str
+        Error message, if the job failed
+    start_time : DateTime
+        Time the job started running
+    end_time : DateTime
+        Time the job finished
+    """
+
+    job_id = fields.StringField(required=True, unique=True)
+    type = fields.StringField(required=True)
+    request = fields.DictField()
+    status = fields.StringField(
+        choices=["pending", "running", "done", "failed"], default="pending"
+    )
+    progress = fields.FloatField(default=0)
+    result = fields.FileField(collection_name="job_result")
+    error = fields.StringField()
+    start_time = fields.DateTimeField()
+    end_time = fields.DateTimeField()
+
+
+class PreparationCheckpoint(SibylDocument):
+    """
+    A **PreparationCheckpoint** records a completed stage of ``prepare_database``, so that
+    a resumed preparation can skip it while its inputs are unchanged
+
+    Attributes
+    ----------
+    stage : str
+        Name of the stage
+    input_hash : str
+        Hash of the inputs of the stage, and of the stages it depends on
+    result : dict
+        Values produced by the stage that later stages need
+    """
+
+    stage = fields.StringField(required=True, unique=True)
+    input_hash = fields.StringField(required=True)
+    result = fields.DictField()
+
+
+class CachedResult(Document):
+    """
+    A **CachedResult** holds a computed API response so it can be shared across workers
+    and survive restarts. Expired results are removed by MongoDB's TTL monitor.
+
+    Attributes
+    ----------
+    key : str
+        Canonical hash of the request that produced the result
+    value : str
+        The cached response body, JSON-encoded
+    expires_at : DateTime
+        Time after which the result should no longer be used
+    """
+
+    key = fields.StringField(required=True, unique=True)
+    value = fields.StringField()
+    expires_at = fields.DateTimeField()
+
+    meta = {
+        "indexes": [{"fields": ["expires_at"], "expireAfterSeconds": 0}],
+    }
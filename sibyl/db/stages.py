@@ -0,0 +1,131 @@
+"""Sibyl database preparation profiling.
+
+This module contains the profiler of ``prepare_database``, which records the wall
+time, the peak resident memory and the throughput of each stage of a database load.
+"""
+
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+def _current_rss():
+    """Get the current resident memory of the process in bytes, or None if unknown."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def _max_rss():
+    """Get the peak resident memory of the process since it started, in bytes."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class _RSSSampler:
+    """Track the peak resident memory while a stage runs, from a background thread."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.peak = _current_rss()
+        self._stopped = threading.Event()
+        self._thread = None
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.peak = max(self.peak, _current_rss())
+
+    def stop(self):
+        """Get the peak resident memory in bytes."""
+        if self._thread is None:
+            # the lifetime peak is the best available bound without /proc
+            return _max_rss()
+        self._stopped.set()
+        self._thread.join()
+        return max(self.peak, _current_rss())
+
+
+class StageProfiler:
+    """Record the wall time, peak memory and throughput of the stages of a database load.
+
+    Stages that run several times (such as one explainer fit per model) are accumulated.
+
+    Args:
+        interval (float): Seconds between two samples of the resident memory
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.stages = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Profile the block as one run of a stage
+        Args:
+            name (string): Name of the stage
+
+        Yields:
+            dict: Counters of the stage. Set "rows" to the number of rows processed to
+                  report the throughput, or "bytes" to the size of the output
+        """
+        counters = {}
+        sampler = _RSSSampler(self.interval)
+        start = time.perf_counter()
+        try:
+            yield counters
+        finally:
+            seconds = time.perf_counter() - start
+            peak_rss = sampler.stop()
+
+            stage = self.stages.setdefault(name, {"runs": 0, "seconds": 0.0, "peak_rss": 0})
+            stage["runs"] += 1
+            stage["seconds"] += seconds
+            stage["peak_rss"] = max(stage["peak_rss"], peak_rss)
+            for key, value in counters.items():
+                stage[key] = stage.get(key, 0) + value
+
+    def report(self):
+        """
+        Get the profile of all stages
+        Returns:
+            dict: Total wall time and peak memory, and for each stage, in the order they
+                  first ran: runs, wall time, peak resident memory, and rows per second
+                  when rows were counted
+        """
+        stages = []
+        for name, stage in self.stages.items():
+            stage = dict({"stage": name}, **stage)
+            stage["peak_rss_mb"] = stage.pop("peak_rss") / 2**20
+            if "rows" in stage:
+                stage["rows_per_second"] = (
+                    stage["rows"] / stage["seconds"] if stage["seconds"] > 0 else None
+                )
+            stages.append(stage)
+
+        peak_rss = max([_max_rss()] + [stage["peak_rss"] for stage in self.stages.values()])
+        return {
+            "seconds": time.perf_counter() - self._start,
+            "peak_rss_mb": peak_rss / 2**20,
+            "stages": stages,
+        }
+
+
+@contextmanager
+def profile_stage(profiler, name):
+    """Profile the block with ``profiler.stage`` if a profiler is given."""
+    if profiler is None:
+        yield {}
+    else:
+        with profiler.stage(name) as counters:
+            yield counters
@@ -0,0 +1,330 @@
+"""Sibyl interaction event log storage.
+
+This module contains the backends that store the events received by the ``/logging/``
+endpoints:
+
+- ``CSVLog`` appends one CSV line per event to a single file.
+- ``ColumnarLog`` writes append-only, gzip-compressed columnar segments partitioned by
+  day. Every segment has a small metadata file with its time range, user_ids and eids,
+  so queries only decompress the segments that can match. The small segments of a day
+  are merged once it holds many of them.
+"""
+
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+LOGGER = logging.getLogger(__name__)
+
+SEGMENT_EXTENSION = ".json.gz"
+META_EXTENSION = ".meta.json"
+COMPACTION_LOCK = "compaction.lock"
+COMPACTION_LOCK_TIMEOUT = 600  # seconds after which a compaction lock is considered stale
+
+
+def format_row(row, headers):
+    """
+    Format a row as a CSV line, quoting values that contain commas, quotes or newlines
+    Args:
+        row (dict): {header: value}
+        headers (list): Columns to write, in order
+
+    Returns:
+        string: The line, with a trailing comma and a newline
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow([row[header] for header in headers] + [""])
+    return buffer.getvalue()
+
+
+def worker_filename(filename, pid=None):
+    """Get the log file of one worker process, ``log.csv`` becoming ``log.<pid>.csv``."""
+    root, ext = os.path.splitext(filename)
+    return "{}.{}{}".format(root, os.getpid() if pid is None else pid, ext)
+
+
+class CSVLog:
+    """Append events to a CSV file.
+
+    Args:
+        filename (string): Path of the log file
+        headers (list): Columns of the log
+        per_worker (bool): If True, write to a separate file per process (see
+            ``worker_filename``)
+        max_bytes (int): Rotate the file once it is larger than this. 0 to never rotate
+    """
+
+    def __init__(self, filename, headers, per_worker=False, max_bytes=0):
+        self.filename = filename
+        self.headers = headers
+        self.per_worker = per_worker
+        self.max_bytes = max_bytes
+
+    @property
+    def path(self):
+        # computed on every write, as forked workers get a new pid after the log is created
+        return worker_filename(self.filename) if self.per_worker else self.filename
+
+    def _rotate(self, path):
+        if not self.max_bytes or not os.path.exists(path):
+            return
+        if os.path.getsize(path) < self.max_bytes:
+            return
+
+        root, ext = os.path.splitext(path)
+        index = 1
+        while os.path.exists("{}.{}{}".format(root, index, ext)):
+            index += 1
+        os.rename(path, "{}.{}{}".format(root, index, ext))
+
+    def append(self, rows):
+        """Append rows ({header: value}) to the log, with a single write."""
+        path = self.path
+        self._rotate(path)
+        with open(path, "a+") as f:
+            if f.tell() == 0:
+                f.write(",".join(self.headers))
+                f.write("\n")
+            f.writelines(format_row(row, self.headers) for row in rows)
+
+
+def _day(timestamp):
+    try:
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
+    except (ValueError, OverflowError, OSError, TypeError):
+        raise ValueError("Invalid timestamp {}".format(timestamp)) from None
+
+
+def _write_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class ColumnarLog:
+    """Store events in compressed columnar segments, partitioned by day.
+
+    Each call to ``append`` writes one new segment per day covered by the rows, as
+    ``<directory>/<YYYY-MM-DD>/<segment>.json.gz``, next to its ``.meta.json``.
+    Segments are never modified, so several processes can write to the same directory.
+
+    Once a day holds more than ``max_segments`` segments, its segments smaller than
+    ``segment_rows`` rows are merged into one (see ``compact``), so the number of files
+    a query opens stays bounded however often events are flushed.
+
+    Args:
+        directory (string): Root directory of the log
+        headers (list): Columns of the log. Must include timestamp, user_id and eid
+        max_segments (int): Number of segments of a day that triggers a compaction.
+            0 to never compact automatically
+        segment_rows (int): Segments with at least this many rows are not merged further
+    """
+
+    def __init__(self, directory, headers, max_segments=64, segment_rows=100000):
+        self.directory = directory
+        self.headers = headers
+        self.max_segments = max_segments
+        self.segment_rows = segment_rows
+
+    def _write_segment(self, day_directory, columns, meta):
+        name = "{}-{}".format(os.getpid(), uuid.uuid4().hex)
+        segment_path = os.path.join(day_directory, name + SEGMENT_EXTENSION)
+        _write_atomic(segment_path, gzip.compress(json.dumps(columns).encode("utf-8")))
+        # the metadata is written last, so readers never see an incomplete segment
+        _write_atomic(
+            os.path.join(day_directory, name + META_EXTENSION), json.dumps(meta).encode("utf-8")
+        )
+        return name
+
+    def _meta(self, columns):
+        return {
+            "rows": len(columns["timestamp"]),
+            "start": min(columns["timestamp"]),
+            "end": max(columns["timestamp"]),
+            "user_ids": sorted(set(columns["user_id"])),
+            "eids": sorted(set(columns["eid"])),
+        }
+
+    def append(self, rows):
+        """Append rows ({header: value}) to the log.
+
+        Raises ValueError before writing anything if a row has an invalid timestamp.
+        """
+        days = {}
+        for row in rows:
+            days.setdefault(_day(row["timestamp"]), []).append(row)
+
+        for day, day_rows in days.items():
+            day_directory = os.path.join(self.directory, day)
+            os.makedirs(day_directory, exist_ok=True)
+
+            columns = {header: [row[header] for row in day_rows] for header in self.headers}
+            self._write_segment(day_directory, columns, self._meta(columns))
+
+            if self.max_segments and len(self._segments(day_directory)) > self.max_segments:
+                self.compact(day)
+
+    def _segments(self, day_directory):
+        """Get the segments of a day, as {name: meta}, without those already merged."""
+        segments = {}
+        for filename in sorted(os.listdir(day_directory)):
+            if not filename.endswith(META_EXTENSION):
+                continue
+            try:
+                with open(os.path.join(day_directory, filename)) as f:
+                    segments[filename[: -len(META_EXTENSION)]] = json.load(f)
+            except FileNotFoundError:
+                # removed by a compaction since it was listed
+                continue
+
+        # the inputs of a compaction are removed after its output is written
+        for meta in list(segments.values()):
+            for name in meta.get("replaces", []):
+                segments.pop(name, None)
+        return segments
+
+    def compact(self, day):
+        """
+        Merge the segments of one day smaller than ``segment_rows`` rows into one segment
+        Only one process compacts a day at a time, others return immediately.
+        Args:
+            day (string): Day to compact, as YYYY-MM-DD
+
+        Returns:
+            int: Number of segments merged
+        """
+        day_directory = os.path.join(self.directory, day)
+        lock_path = os.path.join(day_directory, COMPACTION_LOCK)
+        try:
+            if time.time() - os.path.getmtime(lock_path) > COMPACTION_LOCK_TIMEOUT:
+                # left behind by a process that stopped while compacting
+                os.remove(lock_path)
+        except OSError:
+            pass
+        try:
+            lock = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return 0
+
+        try:
+            names = [
+                name
+                for name, meta in self._segments(day_directory).items()
+                if meta["rows"] < self.segment_rows
+            ]
+            if len(names) < 2:
+                return 0
+
+            columns = {header: [] for header in self.headers}
+            for name in names:
+                with gzip.open(os.path.join(day_directory, name + SEGMENT_EXTENSION)) as f:
+                    segment = json.load(f)
+                for header in self.headers:
+                    columns[header].extend(segment[header])
+
+            meta = self._meta(columns)
+            merged = self._write_segment(day_directory, columns, dict(meta, replaces=names))
+            for name in names:
+                os.remove(os.path.join(day_directory, name + META_EXTENSION))
+                os.remove(os.path.join(day_directory, name + SEGMENT_EXTENSION))
+            _write_atomic(
+                os.path.join(day_directory, merged + META_EXTENSION),
+                json.dumps(meta).encode("utf-8"),
+            )
+            return len(names)
+        finally:
+            os.close(lock)
+            os.remove(lock_path)
+
+    def _days(self, start, end):
+        if not os.path.isdir(self.directory):
+            return []
+        days = sorted(os.listdir(self.directory))
+        if start is not None:
+            days = [day for day in days if day >= _day(start)]
+        if end is not None:
+            days = [day for day in days if day <= _day(end)]
+        return days
+
+    def query(self, user_id=None, eid=None, start=None, end=None):
+        """
+        Get the events matching all the given filters
+        Args:
+            user_id (string): Only return events of this user
+            eid (string): Only return events about this entity
+            start (int): Only return events at or after this timestamp
+            end (int): Only return events at or before this timestamp
+
+        Returns:
+            list: Matching rows ({header: value}), sorted by timestamp
+        """
+        results = []
+        for day in self._days(start, end):
+            day_directory = os.path.join(self.directory, day)
+            for name, meta in self._segments(day_directory).items():
+                if start is not None and meta["end"] < start:
+                    continue
+                if end is not None and meta["start"] > end:
+                    continue
+                if user_id is not None and user_id not in meta["user_ids"]:
+                    continue
+                if eid is not None and eid not in meta["eids"]:
+                    continue
+
+                try:
+                    with gzip.open(os.path.join(day_directory, name + SEGMENT_EXTENSION)) as f:
+                        columns = json.load(f)
+                except FileNotFoundError:
+                    # merged by a compaction since it was listed, the merged segment is
+                    # read instead
+                    return self.query(user_id, eid, start, end)
+                for i in range(meta["rows"]):
+                    row = {header: columns[header][i] for header in self.headers}
+                    if user_id is not None and row["user_id"] != user_id:
+                        continue
+                    if eid is not None and row["eid"] != eid:
+                        continue
+                    if start is not None and row["timestamp"] < start:
+                        continue
+                    if end is not None and row["timestamp"] > end:
+                        continue
+                    results.append(row)
+
+        results.sort(key=lambda row: row["timestamp"])
+        return results
+
+
+def parse_time(value):
+    """
+    Convert a time filter to a timestamp
+    Args:
+        value (string): Seconds since Epoch, or an ISO date or datetime (UTC if no timezone)
+
+    Returns:
+        int: Seconds since Epoch, or None if value is None
+    """
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        pass
+
+    time = datetime.fromisoformat(value)
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=timezone.utc)
+    return int(time.timestamp())
+
+
+def end_of_day(value):
+    """Get the last timestamp of the day of an ISO date, or the timestamp of other values."""
+    if value is not None and len(value) == 10 and value.count("-") == 2:
+        return parse_time(value) + int(timedelta(days=1).total_seconds()) - 1
+    return parse_time(value)
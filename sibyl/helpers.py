@@ -1,14 +1,107 @@
 import logging
 import pickle
 
+from sibyl.cache import LRUCache
 from sibyl.db import schema
+from sibyl.invalidation import get_versions
+from sibyl.metrics import timed
 
 LOGGER = logging.getLogger(__name__)
 
+# Fields of a model document other than the realapp and training set
+MODEL_METADATA_FIELDS = ("model_id", "description", "performance", "importances")
 
+# Per-process caches of model metadata and deserialized realapps, cleared together when
+# the model collection is written to
+_model_metadata = LRUCache(maxsize=1024)
+_realapps = LRUCache(maxsize=32)
+_model_version = None
+
+
+def clear_model_caches(collection=None):
+    """Evict all cached model metadata and realapps."""
+    _model_metadata.clear()
+    _realapps.clear()
+
+
+def _check_model_version():
+    global _model_version
+    version = get_versions("model")[0]
+    if version != _model_version:
+        clear_model_caches()
+        _model_version = version
+
+
+@timed("entities")
+def load_entity_row(eid, row_id=None):
+    """
+    Load one row of an entity, without reading its other rows from the database
+    Args:
+        eid (string): ID of the entity
+        row_id (string): ID of the row to load. Defaults to the first row of the entity
+
+    Returns:
+        success (bool): True if the row was loaded successfully
+        payload (object): If success is True, payload is the entity as a dict, where features
+                          and labels only contain the given row
+                          Else, payload is (error message, error code)
+    """
+    entities = schema.Entity.objects(eid=eid)
+    if row_id is None:
+        entity = entities.only("row_ids").as_pymongo().first()
+        if entity is not None and entity.get("row_ids"):
+            row_id = entity["row_ids"][0]
+
+    entity = None
+    if row_id is not None:
+        fields = ("eid", "property", "features." + row_id, "labels." + row_id)
+        entity = entities.only(*fields).as_pymongo().first()
+    if entity is None:
+        LOGGER.exception("Error getting entity. Entity %s does not exist.", eid)
+        return False, ({"message": "Entity {} does not exist".format(eid)}, 400)
+    if row_id not in entity.get("features", {}):
+        LOGGER.exception("row_id %s does not exist for entity %s", row_id, eid)
+        return False, (
+            {"message": "row_id {} does not exist for entity {}".format(row_id, eid)},
+            400,
+        )
+
+    entity.pop("_id", None)
+    return True, entity
+
+
+def load_model_metadata(model_id):
+    """
+    Load the metadata of a model, without reading its realapp from the database
+    Metadata is cached per process until the model collection is written to.
+    Args:
+        model_id (string): ID of the model
+
+    Returns:
+        dict: {field: value} for each of MODEL_METADATA_FIELDS, or None if the model
+              does not exist
+    """
+    _check_model_version()
+    metadata = _model_metadata.get(model_id)
+    if metadata is None:
+        model = (
+            schema.Model.objects(model_id=model_id)
+            .only(*MODEL_METADATA_FIELDS)
+            .as_pymongo()
+            .first()
+        )
+        if model is None:
+            return None
+        metadata = {field: model.get(field) for field in MODEL_METADATA_FIELDS}
+        _model_metadata.set(model_id, metadata)
+    return metadata
+
+
+@timed("load_realapp")
 def load_realapp(model_id, include_dataset=False):
     """
     Load a realapp from a model doc
+    Deserialized realapps are cached per process until the model collection is written to.
     Args:
         model_id (string): ID of model to get realapp from
         include_dataset (bool): If true, return the realapp training dataset as well
@@ -18,23 +111,32 @@ def load_realapp(model_id, include_dataset=False):
         payload (object): If success is True, payload is (realapp, [dataset])
                           Else, payload is (error message, error code)
     """
-    model_doc = schema.Model.find_one(model_id=model_id)
+    _check_model_version()
+    realapp = _realapps.get(model_id)
+    if realapp is not None and not include_dataset:
+        return True, (realapp,)
+
+    model_doc = schema.Model.find(
+        model_id=model_id, exclude_=["realapp"] if realapp is not None else None
+    ).first()
     if model_doc is None:
         LOGGER.exception("Error getting model. Model %s does not exist.", model_id)
         return False, ({"message": "Model {} does not exist".format(model_id)}, 400)
 
-    realapp_bytes = model_doc.realapp
-    if realapp_bytes is None:
-        LOGGER.exception("Model {} does not have trained RealApp".format(model_id))
-        return False, (
-            {"message": "Model {} does not have trained RealApp".format(model_id)},
-            400,
-        )
-    try:
-        realapp = pickle.loads(realapp_bytes)
-    except Exception as e:
-        LOGGER.exception(e)
-        return False, ({"message": str(e)}, 500)
+    if realapp is None:
+        realapp_bytes = model_doc.realapp
+        if realapp_bytes is None:
+            LOGGER.exception("Model {} does not have trained RealApp".format(model_id))
+            return False, (
+                {"message": "Model {} does not have trained RealApp".format(model_id)},
+                400,
+            )
+        try:
+            realapp = pickle.loads(realapp_bytes)
+        except Exception as e:
+            LOGGER.exception(e)
+            return False, ({"message": str(e)}, 500)
+        _realapps.set(model_id, realapp)
     payload = (realapp,)
 
     if include_dataset:
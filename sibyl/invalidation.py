@@ -0,0 +1,232 @@
+"""Sibyl cache invalidation across workers.
+
+This module contains the invalidation bus, which keeps each worker process informed
+of the writes made by every worker. Each write made through a ``SibylDocument`` bumps
+the version of its collection in the ``document_version`` collection; the bus follows
+those versions, either with a MongoDB change stream (replica sets only) or by polling
+them, and notifies its subscribers so they evict the affected cache entries.
+
+While a bus runs, ``get_versions`` answers from the versions it holds instead of
+querying the database on every request.
+"""
+
+import logging
+import threading
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from sibyl import g
+from sibyl.db.base import DocumentVersion
+
+LOGGER = logging.getLogger(__name__)
+
+WATCHED_COLLECTIONS = ("model", "feature", "category", "context", "entity", "training_set")
+
+
+class InvalidationBus:
+    """Follow the versions of the watched collections and notify subscribers of changes.
+
+    Writes made by this process are seen as soon as they are made. This base class
+    only sees those, which makes it the in-process stand-in of the other buses in tests
+    and single-worker deployments.
+
+    Args:
+        collections (tuple): Names of the watched collections
+    """
+
+    def __init__(self, collections=WATCHED_COLLECTIONS):
+        self.collections = tuple(collections)
+        self.versions = {}
+        self.running = False
+        self._subscribers = []  # [(collections, callback)]
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback, *collections):
+        """
+        Call ``callback(collection)`` whenever one of the given collections changes
+        Args:
+            callback (function): Function evicting the cache entries of the collection
+            *collections (string): Names of the collections. Defaults to all watched ones
+        """
+        self._subscribers.append((set(collections or self.collections), callback))
+
+    def notify(self, collection, version):
+        """Record the version of a collection, calling the subscribers if it changed."""
+        if collection not in self.collections:
+            return
+        with self._lock:
+            if version <= self.versions.get(collection, 0):
+                return
+            self.versions[collection] = version
+
+        for collections, callback in self._subscribers:
+            if collection in collections:
+                try:
+                    callback(collection)
+                except Exception as e:
+                    LOGGER.exception(e)
+
+    def poll(self):
+        """Read the versions of all watched collections from the database."""
+        versions = DocumentVersion.get_versions(*self.collections)
+        for collection, version in zip(self.collections, versions):
+            self.notify(collection, version)
+
+    def get_versions(self, *collections):
+        """Get the known version of each of the given watched collections, in order."""
+        with self._lock:
+            return tuple(self.versions.get(collection, 0) for collection in collections)
+
+    def start(self):
+        DocumentVersion.add_listener(self.notify)
+        self.poll()
+        self.running = True
+        return self
+
+    def stop(self):
+        self.running = False
+        DocumentVersion.remove_listener(self.notify)
+
+
+class PollingBus(InvalidationBus):
+    """Invalidation bus reading the versions of the watched collections every few seconds.
+
+    Writes made by other workers are seen after at most ``interval`` seconds.
+
+    Args:
+        collections (tuple): Names of the watched collections
+        interval (float): Seconds between two reads of the versions
+    """
+
+    def __init__(self, collections=WATCHED_COLLECTIONS, interval=1.0):
+        super().__init__(collections)
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.poll()
+            except PyMongoError as e:
+                LOGGER.exception(e)
+
+    def start(self):
+        super().start()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="sibyl-invalidation", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        super().stop()
+        self._stopped.set()
+        self._thread.join(timeout=self.interval + 1)
+
+
+class ChangeStreamBus(InvalidationBus):
+    """Invalidation bus following a change stream of the ``document_version`` collection.
+
+    Writes made by other workers are seen as soon as MongoDB reports them. Change
+    streams require a replica set, a single-node one is enough.
+
+    Args:
+        collections (tuple): Names of the watched collections
+        max_await (float): Seconds the stream waits for a change before checking whether
+            the bus was stopped
+    """
+
+    def __init__(self, collections=WATCHED_COLLECTIONS, max_await=1.0):
+        super().__init__(collections)
+        self.max_await = max_await
+        self._stopped = threading.Event()
+        self._stream = None
+        self._thread = None
+
+    def _open(self, resume_after=None):
+        pipeline = [
+            {"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}},
+        ]
+        return DocumentVersion._get_collection().watch(
+            pipeline,
+            full_document="updateLookup",
+            resume_after=resume_after,
+            max_await_time_ms=int(self.max_await * 1000),
+        )
+
+    def _run(self):
+        resume_token = None
+        while not self._stopped.is_set():
+            try:
+                while not self._stopped.is_set():
+                    change = self._stream.try_next()
+                    resume_token = self._stream.resume_token
+                    document = change and change.get("fullDocument")
+                    if document:
+                        self.notify(document["collection"], document["version"])
+            except PyMongoError as e:
+                LOGGER.exception(e)
+                if self._stopped.wait(self.max_await):
+                    break
+                try:
+                    self._stream.close()
+                    self._stream = self._open(resume_token)
+                    # changes made while the stream was broken may not be resumable
+                    self.poll()
+                except PyMongoError as e:
+                    LOGGER.exception(e)
+
+        self._stream.close()
+
+    def start(self):
+        # open the stream before reading the versions, so no change is missed in between
+        self._stream = self._open()
+        super().start()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="sibyl-invalidation", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        super().stop()
+        self._stopped.set()
+        self._thread.join(timeout=self.max_await + 1)
+
+
+def create_bus(mode="auto", interval=1.0, collections=WATCHED_COLLECTIONS):
+    """
+    Create and start an invalidation bus
+    Args:
+        mode (string): change_stream, polling, local (writes of this process only), or auto
+            (change_stream if the database supports it, else polling)
+        interval (float): Seconds between two reads of the versions when polling
+        collections (tuple): Names of the watched collections
+
+    Returns:
+        InvalidationBus: The started bus
+    """
+    if mode == "local":
+        return InvalidationBus(collections).start()
+    if mode == "polling":
+        return PollingBus(collections, interval=interval).start()
+    if mode not in ["auto", "change_stream"]:
+        raise ValueError("Unknown invalidation mode {}".format(mode))
+
+    try:
+        return ChangeStreamBus(collections).start()
+    except (OperationFailure, NotImplementedError) as e:
+        if mode == "change_stream":
+            raise
+        LOGGER.info("Change streams are not available (%s), polling versions instead", e)
+        return PollingBus(collections, interval=interval).start()
+
+
+def get_versions(*collections):
+    """
+    Get the current version of each of the given collections, in order, from the running
+    invalidation bus if it watches all of them, else from the database
+    """
+    bus = g.get("invalidation_bus")
+    if bus is not None and bus.running and set(collections) <= set(bus.collections):
+        return bus.get_versions(*collections)
+    return DocumentVersion.get_versions(*collections)
@@ -0,0 +1,128 @@
+"""Sibyl background jobs.
+
+This module contains the runner that computes long explanation requests on a
+background worker pool. Jobs accept the same request body as the endpoint they run,
+their state is stored in the ``job`` collection and their results in GridFS.
+"""
+
+import json
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import Response
+
+from sibyl.db import schema
+from sibyl.serialization import dumps
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _merge(result, chunk):
+    """Merge the response body of one chunk of a job into the full result."""
+    for key, value in chunk.items():
+        if key not in result:
+            result[key] = value
+        elif isinstance(value, dict):
+            _merge(result[key], value)
+        elif key in ("index", "data"):
+            # columnar format, columns are the same for every chunk
+            result[key] = list(result[key]) + list(value)
+    return result
+
+
+class JobRunner:
+    """Run API requests in the background.
+
+    Requests are split into chunks of ``chunk_size`` eids, which are computed one at a
+    time so the progress of the job can be reported.
+
+    Args:
+        app (Flask): App whose resources compute the jobs
+        resources (dict): {job type: Resource class computing it with ``post``}
+        workers (int): Number of jobs computed at the same time
+        chunk_size (int): Number of eids computed per chunk
+    """
+
+    def __init__(self, app, resources, workers=2, chunk_size=100):
+        self.app = app
+        self.resources = resources
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sibyl-job")
+
+    def submit(self, job_type, body):
+        """
+        Store a new job and schedule it
+        Args:
+            job_type (string): Name of the endpoint to run
+            body (dict): Request body for the endpoint
+
+        Returns:
+            Job: The job document
+        """
+        job = schema.Job.insert(job_id=uuid.uuid4().hex, type=job_type, request=body)
+        self._executor.submit(self.run, job.job_id)
+        return job
+
+    def _chunks(self, body):
+        eids = body.get("eids")
+        if not isinstance(eids, list) or len(eids) <= self.chunk_size:
+            return [body]
+
+        row_ids = body.get("row_ids")
+        pairs = isinstance(row_ids, list) and len(eids) > 1 and len(row_ids) == len(eids)
+        if not pairs:
+            return [
+                dict(body, eids=eids[i : i + self.chunk_size])
+                for i in range(0, len(eids), self.chunk_size)
+            ]
+
+        # (eid, row_id) pairs are sliced together. A chunk of one pair would be read as
+        # the rows of a single entity, so chunks hold at least two pairs
+        chunk_size = max(self.chunk_size, 2)
+        bounds = list(range(0, len(eids), chunk_size)) + [len(eids)]
+        if bounds[-1] - bounds[-2] == 1:
+            del bounds[-2]
+        return [
+            dict(body, eids=eids[start:end], row_ids=row_ids[start:end])
+            for start, end in zip(bounds, bounds[1:])
+        ]
+
+    def run(self, job_id):
+        job = schema.Job.find_one(job_id=job_id)
+        schema.Job.objects(job_id=job_id).update_one(
+            set__status="running", set__start_time=datetime.utcnow()
+        )
+        try:
+            chunks = self._chunks(job.request)
+            result = {}
+            for i, chunk in enumerate(chunks):
+                with self.app.test_request_context(method="POST", json=chunk):
+                    response = self.resources[job.type]().post()
+                    if isinstance(response, Response):
+                        # all_rows requests are streamed as one line of JSON per chunk
+                        for line in response.response:
+                            body = json.loads(line)
+                            if "message" in body:
+                                raise ValueError(body["message"])
+                            _merge(result, body)
+                    else:
+                        body, code = response
+                        if code != 200:
+                            raise ValueError(body.get("message", body))
+                        _merge(result, body)
+                schema.Job.objects(job_id=job_id).update_one(set__progress=(i + 1) / len(chunks))
+
+            job.result.put(dumps(result), content_type="application/json")
+            job.status = "done"
+            job.end_time = datetime.utcnow()
+            job.save()
+        except Exception as e:
+            LOGGER.exception(e)
+            schema.Job.objects(job_id=job_id).update_one(
+                set__status="failed", set__error=str(e), set__end_time=datetime.utcnow()
+            )
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
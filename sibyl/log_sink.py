@@ -0,0 +1,92 @@
+"""Sibyl interaction log sink.
+
+This module contains the buffered writer of the ``/logging/`` endpoints. Events are
+queued in memory by the requests and appended to the event log by one background
+thread per process, so requests do not wait on file I/O.
+"""
+
+import atexit
+import logging
+import threading
+from collections import deque
+
+LOGGER = logging.getLogger(__name__)
+
+
+class LogSink:
+    """Buffer log events in memory and append them to an event log from a background thread.
+
+    The queue is flushed when it holds ``max_events`` events or every ``interval``
+    seconds, whichever happens first. The flush thread is a real thread even when
+    the server runs on gevent, so the file writes never block the event loop.
+
+    Args:
+        log (CSVLog or ColumnarLog): Event log the queued events are appended to
+        max_events (int): Number of queued events that triggers a flush
+        interval (float): Maximum number of seconds an event stays in memory
+    """
+
+    def __init__(self, log, max_events=100, interval=1.0):
+        self.log = log
+        self.max_events = max_events
+        self.interval = interval
+
+        self._queue = deque()
+        self._wake = threading.Event()
+        self._write_lock = threading.Lock()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="sibyl-log-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, row):
+        """Queue one event ({header: value})."""
+        self._queue.append(row)
+        if len(self._queue) >= self.max_events:
+            self._wake.set()
+
+    def write_many(self, rows):
+        """Queue events ({header: value})."""
+        self._queue.extend(rows)
+        if len(self._queue) >= self.max_events:
+            self._wake.set()
+
+    def flush(self):
+        """Append all queued events to the event log.
+
+        If the batch cannot be appended, its events are appended one at a time, so only
+        the events that fail on their own are dropped.
+        """
+        with self._write_lock:
+            rows = []
+            while self._queue:
+                rows.append(self._queue.popleft())
+            if not rows:
+                return
+
+            try:
+                self.log.append(rows)
+            except Exception as e:
+                LOGGER.exception(e)
+                if len(rows) > 1:
+                    self._append_each(rows)
+
+    def _append_each(self, rows):
+        for row in rows:
+            try:
+                self.log.append([row])
+            except Exception as e:
+                LOGGER.exception("Dropping log event %s: %s", row, e)
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        """Stop the flush thread and write the remaining events."""
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout=self.interval + 1)
+        self.flush()
@@ -0,0 +1,163 @@
+"""Sibyl latency instrumentation.
+
+This module contains the histograms of request and phase latencies, the timers that
+fill them and the ``/metrics`` endpoint exposing them in the Prometheus text format.
+Timers do nothing until metrics are enabled with ``init_app``.
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import has_request_context, request
+
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = False
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    return ",".join('{}="{}"'.format(name, _escape(value)) for name, value in labels)
+
+
+class Histogram:
+    """Thread-safe histogram with labels, exposed in the Prometheus text format.
+
+    Args:
+        name (string): Name of the metric
+        documentation (string): Description of the metric
+        labelnames (list): Names of the labels of each observation
+        buckets (tuple): Upper bounds of the buckets, in increasing order
+    """
+
+    def __init__(self, name, documentation, labelnames, buckets=BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # {label values: [bucket counts..., sum, count]}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            values = self._values.get(labelvalues)
+            if values is None:
+                values = self._values[labelvalues] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    values[i] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def expose(self):
+        """Get the lines of the metric in the Prometheus text format."""
+        lines = [
+            "# HELP {} {}".format(self.name, self.documentation),
+            "# TYPE {} histogram".format(self.name),
+        ]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labelvalues, counts in values:
+            labels = list(zip(self.labelnames, labelvalues))
+            for bound, count in zip(self.buckets + ("+Inf",), counts[:-2] + [counts[-1]]):
+                lines.append(
+                    "{}_bucket{{{}}} {}".format(
+                        self.name, _format_labels(labels + [("le", bound)]), count
+                    )
+                )
+            lines.append("{}_sum{{{}}} {}".format(self.name, _format_labels(labels), counts[-2]))
+            lines.append("{}_count{{{}}} {}".format(self.name, _format_labels(labels), counts[-1]))
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "sibyl_request_seconds",
+    "Time spent answering requests",
+    ["endpoint", "method", "status"],
+)
+PHASE_SECONDS = Histogram(
+    "sibyl_phase_seconds",
+    "Time spent in each phase of the requests",
+    ["endpoint", "phase"],
+)
+HISTOGRAMS = [REQUEST_SECONDS, PHASE_SECONDS]
+
+
+def _endpoint():
+    if has_request_context() and request.endpoint is not None:
+        return request.endpoint
+    return "none"
+
+
+@contextmanager
+def timer(phase):
+    """Record the time spent in the block as one phase of the current request."""
+    if not _enabled:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_SECONDS.observe(time.perf_counter() - start, _endpoint(), phase)
+
+
+def timed(phase):
+    """Decorator recording the time spent in the function as one phase of the request."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with timer(phase):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def expose():
+    """Get all the metrics in the Prometheus text format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.expose())
+    return "\n".join(lines) + "\n"
+
+
+def _start_request():
+    request.environ["sibyl.start_time"] = time.perf_counter()
+
+
+def _record_request(response):
+    start = request.environ.get("sibyl.start_time")
+    if start is not None:
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - start, _endpoint(), request.method, response.status_code
+        )
+    return response
+
+
+def init_app(app):
+    """Enable the timers, time every request of the app and add the /metrics endpoint."""
+    global _enabled
+    _enabled = True
+
+    app.before_request(_start_request)
+    app.after_request(_record_request)
+
+    @app.route("/metrics")
+    def metrics():
+        return app.response_class(expose(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,182 @@
+"""Sibyl request profiling.
+
+This module contains the opt-in profiler of the API. A fraction of the requests is
+sampled, and when a latency threshold is set every request is profiled and kept only
+if it is slower than the threshold. Each kept profile is stored as a ``pstats`` file,
+next to a ``.meta.json`` file with the endpoint, the request body hash and the duration.
+
+cProfile profiles a whole OS thread, which every greenlet of the gevent server shares.
+The profiler therefore pauses while the profiled request's greenlet is switched out, so
+a profile only holds the work of its own request. The time spent waiting while switched
+out is not in the profile, but is included in the duration.
+"""
+
+import cProfile
+import hashlib
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+
+from flask import request
+
+try:
+    import greenlet
+except ImportError:
+    greenlet = None
+
+LOGGER = logging.getLogger(__name__)
+
+PROFILE_EXTENSION = ".prof"
+META_EXTENSION = ".meta.json"
+
+# the profiler hooks of concurrent greenlets would overwrite each other, so at most one
+# request is profiled at a time per process
+_lock = threading.Lock()
+
+
+class RequestProfiler:
+    """Profile requests of a Flask app and store the profiles on disk.
+
+    Args:
+        directory (string): Directory the profiles are written to
+        sample_rate (float): Fraction of the requests that are profiled and kept
+        slow_threshold (float): Keep the profile of any request slower than this, in
+            seconds. 0 to only keep sampled requests. When set, every request is profiled
+    """
+
+    def __init__(self, directory, sample_rate=0.0, slow_threshold=0.0):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self._profiled = None  # (greenlet, profile) of the request being profiled
+        self._previous_trace = None
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._stop)
+        app.teardown_request(self._teardown)
+        if greenlet is not None:
+            # greenlet traces are per thread, the gevent server runs in this one
+            self._previous_trace = greenlet.settrace(self._trace_switch)
+
+    def _trace_switch(self, event, args):
+        profiled = self._profiled
+        if profiled is not None and event in ("switch", "throw"):
+            origin, target = args
+            current, profile = profiled
+            if origin is current:
+                profile.disable()
+            elif target is current:
+                profile.enable()
+        if self._previous_trace is not None:
+            self._previous_trace(event, args)
+
+    def _start(self):
+        sampled = random.random() < self.sample_rate
+        if not sampled and not self.slow_threshold:
+            return
+        if not _lock.acquire(blocking=False):
+            return
+
+        profile = cProfile.Profile()
+        request.environ["sibyl.profile"] = (profile, sampled, time.perf_counter())
+        if greenlet is not None:
+            self._profiled = (greenlet.getcurrent(), profile)
+        profile.enable()
+
+    def _stop(self, response):
+        started = request.environ.pop("sibyl.profile", None)
+        if started is None:
+            return response
+
+        profile, sampled, start = started
+        self._profiled = None
+        profile.disable()
+        _lock.release()
+
+        duration = time.perf_counter() - start
+        if sampled or duration >= self.slow_threshold:
+            try:
+                self.save(profile, duration, response.status_code)
+            except Exception as e:
+                LOGGER.exception(e)
+        return response
+
+    def _teardown(self, exception):
+        # the request failed before its response was made
+        started = request.environ.pop("sibyl.profile", None)
+        if started is not None:
+            self._profiled = None
+            started[0].disable()
+            _lock.release()
+
+    def save(self, profile, duration, status):
+        """Write the profile of the current request and its metadata."""
+        os.makedirs(self.directory, exist_ok=True)
+
+        endpoint = request.endpoint or "none"
+        body_hash = hashlib.sha256(request.get_data()).hexdigest()[:12]
+        name = "{}-{}-{}".format(int(time.time() * 1000), endpoint, body_hash)
+        profile.dump_stats(os.path.join(self.directory, name + PROFILE_EXTENSION))
+
+        meta = {
+            "name": name,
+            "timestamp": time.time(),
+            "endpoint": endpoint,
+            "method": request.method,
+            "path": request.path,
+            "status": status,
+            "body_hash": body_hash,
+            "duration": duration,
+        }
+        with open(os.path.join(self.directory, name + META_EXTENSION), "w") as f:
+            json.dump(meta, f)
+
+
+def list_profiles(directory, endpoint=None):
+    """
+    Get the metadata of the stored profiles
+    Args:
+        directory (string): Directory of the profiles
+        endpoint (string): Only return profiles of this endpoint
+
+    Returns:
+        list: Metadata of each profile, sorted by time
+    """
+    if not os.path.isdir(directory):
+        return []
+
+    profiles = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(META_EXTENSION):
+            continue
+        with open(os.path.join(directory, filename)) as f:
+            meta = json.load(f)
+        if endpoint is None or meta["endpoint"] == endpoint:
+            profiles.append(meta)
+
+    profiles.sort(key=lambda meta: meta["timestamp"])
+    return profiles
+
+
+def summarize_profile(directory, name, sort="cumulative", limit=20):
+    """
+    Get the report of the slowest functions of a stored profile
+    Args:
+        directory (string): Directory of the profiles
+        name (string): Name of the profile, as returned by list_profiles
+        sort (string): pstats sort key
+        limit (int): Number of functions to report
+
+    Returns:
+        string: The pstats report
+    """
+    stream = io.StringIO()
+    stats = pstats.Stats(os.path.join(directory, name + PROFILE_EXTENSION), stream=stream)
+    stats.sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
@@ -9,6 +9,7 @@ from sibyl.resources import (
     entity,
     feature,
     group,
+    job,
     logger,
     model,
 )
@@ -22,4 +23,5 @@ __all__ = (
     "logger",
     "group",
     "context",
+    "job",
 )
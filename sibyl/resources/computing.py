@@ -2,11 +2,14 @@ import logging
 from collections import namedtuple
 
 import pandas as pd
-from flask import request
+from flask import Response, request, stream_with_context
 from flask_restful import Resource
 
-from sibyl import helpers
+from sibyl import g, helpers
+from sibyl.cache import cached_response
 from sibyl.db import schema
+from sibyl.metrics import timed, timer
+from sibyl.serialization import dumps
 
 LOGGER = logging.getLogger(__name__)
 
@@ -16,6 +19,14 @@ Attrs = namedtuple(
     defaults=[True, str, None, None],
 )
 
+# Response formats for endpoints returning tables.
+#   dict: {row_id: {column: value}}
+#   columnar: {"index": [row_id, ...], "columns": [column, ...], "data": [[value, ...], ...]}
+FORMATS = ["dict", "columnar"]
+
+# Label of each row when requesting (eid, row_id) pairs
+PAIR_ID = "{}:{}"
+
 
 def get_features_for_row(features, row_id):
     if row_id is None:
@@ -35,61 +46,119 @@ def str_convert(s):
     return str(s) if s is not None else None
 
 
-def get_and_validate_params(attr_info):
-    """
-    Get the parameters from the request body
+def _to_bool(value):
+    if isinstance(value, str):
+        if value.lower() in ("true", "1"):
+            return True
+        if value.lower() in ("false", "0"):
+            return False
+        raise ValueError("expected a boolean, got {}".format(value))
+    return bool(value)
+
+
+def _to_dict(value):
+    if not isinstance(value, dict):
+        raise ValueError("expected an object, got {}".format(type(value).__name__))
+    return value
+
+
+def _to_list(value):
+    if not isinstance(value, (list, tuple)):
+        raise ValueError("expected a list, got {}".format(type(value).__name__))
+    return list(value)
+
+
+# Converter used for each Attrs type. Other types are called on the value
+CONVERTERS = {None: None, bool: _to_bool, dict: _to_dict, list: _to_list}
+
+
+class RequestSchema:
+    """Parameters of a request body, compiled once per resource.
+
     Args:
-        attr_info (Attr named tuple):
-            ("name" (string), "required" (boolean), "type" (type), "validation" (function))
-            attr_type defaults to string
+        attr_info (list of Attrs):
+            ("name" (string), "required" (boolean), "type" (type), "validation" (function),
+            "default")
+            type defaults to string, None to keep the value as given
             required defaults to true
-            validation defaults to none
-    Returns:
-        **args
-            All parameters in attr (None if not required and not given)
+            validation defaults to none. If given, it is called with the converted value and
+            returns an error (message, code) or None
+            default is used when a parameter that is not required is not given
     """
-    body = request.json
-    results = []
-    for attr in attr_info:
-        if body is not None:
-            result = body.get(attr.name)
-        elif attr.name in request.form:
-            result = request.form[attr.name]
-        elif not attr.required:
-            result = attr.default
-        else:
-            LOGGER.exception("Missing required parameter %s", attr.name)
-            return {"message: Missing required parameter {}".format(attr.name)}, 400
 
-        if result is not None:
-            if attr.type is not None:
+    def __init__(self, attr_info):
+        self.attrs = tuple(attr_info)
+        self._fields = tuple(
+            (
+                attr.name,
+                attr.required,
+                attr.default,
+                CONVERTERS.get(attr.type, attr.type),
+                attr.validation,
+            )
+            for attr in self.attrs
+        )
+
+    def parse(self):
+        """
+        Get the parameters from the body (JSON or form) of the current request
+        Returns:
+            success (bool): True if all parameters were valid
+            payload (object): If success is True, payload is the list of parameter values, in
+                              order (default if not given)
+                              Else, payload is (error message, error code)
+        """
+        body = request.get_json() if request.is_json else request.form
+        if body is None:
+            body = {}
+
+        results = []
+        for name, required, default, converter, validation in self._fields:
+            value = body.get(name)
+            if value is None:
+                if required:
+                    LOGGER.exception("Missing required parameter %s", name)
+                    return False, ({"message": "Missing required parameter {}".format(name)}, 400)
+                results.append(default)
+                continue
+
+            if converter is not None:
                 try:
-                    result = attr.type(result)
-                except ValueError as e:
+                    value = converter(value)
+                except (TypeError, ValueError) as e:
                     LOGGER.exception(e)
-                    return {
-                        "message: Error converting attr {} ({})".format(attr.name, str(e))
-                    }, 400
-            if attr.validation is not None:
-                attr.validation(result)
-        results.append(result)
+                    return False, (
+                        {"message": "Invalid value for parameter {} ({})".format(name, e)},
+                        400,
+                    )
+            if validation is not None:
+                error = validation(value)
+                if error is not None:
+                    return False, error
+            results.append(value)
 
-    return results
+        return True, results
 
 
 def validate_changes(changes):
     """
     Helper function for validating changes to entity.
     """
+    feature_types = {
+        feature["name"]: feature.get("type")
+        for feature in schema.Feature.objects(name__in=list(changes))
+        .only("name", "type")
+        .as_pymongo()
+    }
     for feature, change in changes.items():
-        if schema.Feature.find_one(name=feature) is None:
+        if feature not in feature_types:
             LOGGER.exception(f"Invalid feature {feature}")
             return {"message": f"Invalid feature {feature}"}, 400
 
         if isinstance(change, (int, float)):
             change = float(change)
 
-        if schema.Feature.find_one(name=feature).type == "binary" and change not in [
+        if feature_types[feature] == "binary" and change not in [
             0,
             1,
         ]:
@@ -98,13 +167,44 @@ def validate_changes(changes):
 
 
 def get_entity_table(eid, row_id):
-    entity = schema.Entity.find_one(eid=eid)
-    if entity is None:
-        LOGGER.exception("Error getting entity. Entity %s does not exist.", eid)
-        return {"message": "Entity {} does not exist".format(eid)}, 400
-    return pd.DataFrame(get_features_for_row(entity.features, row_id), index=[eid])
+    success, payload = helpers.load_entity_row(eid, row_id)
+    if not success:
+        return payload
+    return pd.DataFrame(get_features_for_row(payload["features"], row_id), index=[eid])
 
 
+def get_entity_pairs_table(eids, row_ids):
+    """
+    Get the table of (eid, row_id) pairs, fetching only the requested rows of each entity
+    Args:
+        eids (list): IDs of the entities
+        row_ids (list): ID of the row for each eid, same length as eids
+
+    Returns:
+        DataFrame: One row per pair, labelled "<eid>:<row_id>" in the eid column
+    """
+    if len(eids) != len(row_ids):
+        LOGGER.exception("eids and row_ids must have the same length to select pairs")
+        return {"message": "eids and row_ids must have the same length to select pairs"}, 400
+
+    fields = ["features." + row_id for row_id in set(row_ids)]
+    features = {
+        entity["eid"]: entity.get("features", {})
+        for entity in schema.Entity.objects(eid__in=list(set(eids)))
+        .only("eid", *fields)
+        .as_pymongo()
+    }
+
+    entities = []
+    for eid, row_id in zip(eids, row_ids):
+        if row_id not in features.get(eid, {}):
+            LOGGER.exception("row_id %s does not exist for entity %s", row_id, eid)
+            return {"message": "row_id {} does not exist for entity {}".format(row_id, eid)}, 400
+        entities.append(dict(features[eid][row_id], eid=PAIR_ID.format(eid, row_id)))
+    return pd.DataFrame(entities)
+
+
+@timed("entities")
 def get_entities_table(eids, row_ids, all_rows=False):
     if not all_rows:
         if row_ids is None:
@@ -113,8 +213,7 @@ def get_entities_table(eids, row_ids, all_rows=False):
                 for entity in schema.Entity.objects(eid__in=eids)
             ]
         elif len(eids) > 1 and len(row_ids) > 1:
-            LOGGER.exception("Only one of eids and row_ids can have more than one element")
-            return {"message": "Only one of eids and row_ids can have more than one element"}, 400
+            return get_entity_pairs_table(eids, row_ids)
         elif len(eids) > 1:
             entities = [
                 dict(get_features_for_row(entity.features, row_ids[0]), **{"eid": entity.eid})
@@ -132,7 +231,98 @@ def get_entities_table(eids, row_ids, all_rows=False):
     return pd.DataFrame(entities)
 
 
+def stream_all_rows(eids, compute):
+    """
+    Compute a result on every row of one entity, in chunks of rows
+    Args:
+        eids (list): List containing the ID of the entity
+        compute (function): Called with the entities table of each chunk, returns
+            (body, code)
+
+    Returns:
+        Response: One line of JSON per chunk (application/x-ndjson), or an error
+    """
+    if eids is None or len(eids) != 1:
+        LOGGER.exception("all_rows requires exactly one eid")
+        return {"message": "all_rows requires exactly one eid"}, 400
+    # only the row_ids are read here, the features are read one chunk of rows at a time
+    entities = schema.Entity.objects(eid=eids[0])
+    entity = entities.only("row_ids").as_pymongo().first()
+    if entity is None:
+        LOGGER.exception("Error getting entity. Entity %s does not exist.", eids[0])
+        return {"message": "Entity {} does not exist".format(eids[0])}, 400
+
+    chunk_size = (g["config"].get("streaming") or {}).get("chunk_size", 1000)
+    row_ids = entity.get("row_ids", [])
+
+    def generate():
+        for start in range(0, len(row_ids), chunk_size):
+            chunk = row_ids[start : start + chunk_size]
+            fields = ["features." + row_id for row_id in chunk]
+            features = entities.only(*fields).as_pymongo().first().get("features", {})
+            # row_ids are labelled as eids, as in get_entities_table(all_rows=True)
+            entities_table = pd.DataFrame(
+                [dict(features[row_id], eid=row_id) for row_id in chunk if row_id in features]
+            )
+            body, code = compute(entities_table)
+            yield dumps(body) + b"\n"
+            if code != 200:
+                return
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+def get_single_change_predictions(eid, model_id, row_id, changes, return_proba):
+    entity_features = get_entity_table(eid, row_id)
+
+    success, payload = helpers.load_realapp(model_id)
+    if success:
+        realapp = payload[0]
+    else:
+        return payload
+
+    predictions = []
+    with timer("predict"):
+        for feature, change in changes.items():
+            modified = entity_features.copy()
+            modified[feature] = change
+            if return_proba:
+                prediction = realapp.predict_proba(modified, as_dict=False).max().tolist()[0]
+            else:
+                prediction = realapp.predict(modified, as_dict=False).tolist()[0]
+            predictions.append([feature, prediction])
+    return {"predictions": predictions}, 200
+
+
+def get_modified_prediction(eid, model_id, row_id, changes, return_proba):
+    entity_features = get_entity_table(eid, row_id)
+
+    success, payload = helpers.load_realapp(model_id)
+    if success:
+        realapp = payload[0]
+    else:
+        return payload
+
+    modified = entity_features.copy()
+    for feature, change in changes.items():
+        modified[feature] = change
+    with timer("predict"):
+        if return_proba:
+            prediction = realapp.predict_proba(modified, as_dict=False).max().tolist()[0]
+        else:
+            prediction = realapp.predict(modified, as_dict=False).tolist()[0]
+    return {"prediction": prediction}, 200
+
+
 class SingleChangePredictions(Resource):
+    request_schema = RequestSchema([
+        Attrs("eid"),
+        Attrs("model_id"),
+        Attrs("row_id", False),
+        Attrs("changes", type=dict, validation=validate_changes),
+        Attrs("return_proba", required=False, type=bool, default=False),
+    ])
+
     def post(self):
         """
         Change one feature value at a time and get the resulting model predictions.
@@ -174,37 +364,32 @@ class SingleChangePredictions(Resource):
           400:
             $ref: '#/components/responses/ErrorMessage'
         """
-        attr_info = [
-            Attrs("eid"),
-            Attrs("model_id"),
-            Attrs("row_id", False),
-            Attrs("changes", type=None, validation=validate_changes),
-            Attrs("return_proba", required=False, type=bool, default=False),
-        ]
-
-        eid, model_id, row_id, changes, return_proba = get_and_validate_params(attr_info)
-
-        entity_features = get_entity_table(eid, row_id)
-
-        success, payload = helpers.load_realapp(model_id)
-        if success:
-            realapp = payload[0]
-        else:
+        success, payload = self.request_schema.parse()
+        if not success:
             return payload
-
-        predictions = []
-        for feature, change in changes.items():
-            modified = entity_features.copy()
-            modified[feature] = change
-            if return_proba:
-                prediction = realapp.predict_proba(modified, as_dict=False).max().tolist()[0]
-            else:
-                prediction = realapp.predict(modified, as_dict=False).tolist()[0]
-            predictions.append([feature, prediction])
-        return {"predictions": predictions}, 200
+        eid, model_id, row_id, changes, return_proba = payload
+
+        return cached_response(
+            "single_change_predictions",
+            model_id,
+            lambda: get_single_change_predictions(eid, model_id, row_id, changes, return_proba),
+            eid=eid,
+            row_id=row_id,
+            # predictions are returned in the order changes are given
+            changes=list(changes.items()),
+            return_proba=return_proba,
+        )
 
 
 class ModifiedPrediction(Resource):
+    request_schema = RequestSchema([
+        Attrs("eid"),
+        Attrs("model_id"),
+        Attrs("row_id", False),
+        Attrs("changes", type=dict, validation=validate_changes),
+        Attrs("return_proba", required=False, type=bool, default=False),
+    ])
+
     def post(self):
         """
         Get the resulting model prediction after making all changes
@@ -242,35 +427,29 @@ class ModifiedPrediction(Resource):
           400:
             $ref: '#/components/responses/ErrorMessage'
         """
-        attr_info = [
-            Attrs("eid"),
-            Attrs("model_id"),
-            Attrs("row_id", False),
-            Attrs("changes", type=None, validation=validate_changes),
-            Attrs("return_proba", required=False, type=bool, default=False),
-        ]
-
-        eid, model_id, row_id, changes, return_proba = get_and_validate_params(attr_info)
-
-        entity_features = get_entity_table(eid, row_id)
-
-        success, payload = helpers.load_realapp(model_id)
-        if success:
-            realapp = payload[0]
-        else:
+        success, payload = self.request_schema.parse()
+        if not success:
             return payload
-
-        modified = entity_features.copy()
-        for feature, change in changes.items():
-            modified[feature] = change
-        if return_proba:
-            prediction = realapp.predict_proba(modified, as_dict=False).max().tolist()[0]
-        else:
-            prediction = realapp.predict(modified, as_dict=False).tolist()[0]
-        return {"prediction": prediction}, 200
+        eid, model_id, row_id, changes, return_proba = payload
+
+        return cached_response(
+            "modified_prediction",
+            model_id,
+            lambda: get_modified_prediction(eid, model_id, row_id, changes, return_proba),
+            eid=eid,
+            row_id=row_id,
+            changes=changes,
+            return_proba=return_proba,
+        )
 
 
 class FeatureContributions(Resource):
+    request_schema = RequestSchema([
+        Attrs("eid"),
+        Attrs("model_id"),
+        Attrs("row_id", False),
+    ])
+
     def post(self):
         """
         Get feature contributions
@@ -307,8 +486,10 @@ class FeatureContributions(Resource):
             $ref: '#/components/responses/ErrorMessage'
         """
 
-        attr_info = [Attrs("eid"), Attrs("model_id"), Attrs("row_id", False)]
-        eid, model_id, row_id = get_and_validate_params(attr_info)
+        success, payload = self.request_schema.parse()
+        if not success:
+            return payload
+        eid, model_id, row_id = payload
 
         entity_features = get_entity_table(eid, row_id)
 
@@ -319,13 +500,45 @@ class FeatureContributions(Resource):
         else:
             return payload
 
-        contributions = realapp.produce_feature_contributions(entity_features)[0]
+        with timer("explain"):
+            contributions = realapp.produce_feature_contributions(entity_features)[0]
         contributions_json = contributions.set_index("Feature Name").to_dict(orient="index")
         return {"result": contributions_json}, 200
 
 
-def get_contributions(realapp, entities):
+def to_columnar(data):
+    """
+    Convert a DataFrame or Series to columnar format, without building per-cell dicts
+    Args:
+        data (DataFrame or Series): Data to convert
+
+    Returns:
+        dict: {"index": [...], "columns": [...], "data": [[...], ...]} for DataFrames,
+              {"index": [...], "data": [...]} for Series
+    """
+    if isinstance(data, pd.Series):
+        return {"index": data.index.tolist(), "data": data.tolist()}
+    return {
+        "index": data.index.tolist(),
+        "columns": data.columns.tolist(),
+        "data": data.to_numpy().tolist(),
+    }
+
+
+def validate_format(response_format):
+    if response_format not in FORMATS:
+        LOGGER.exception("Invalid format %s", response_format)
+        return {
+            "message": "Invalid format {}, must be one of {}".format(response_format, FORMATS)
+        }, 400
+
+
+@timed("explain")
+def get_contributions(realapp, entities, response_format="dict"):
     contributions, values = realapp.produce_feature_contributions(entities, format_output=False)
+    if response_format == "columnar":
+        return {"contributions": to_columnar(contributions), "values": to_columnar(values)}, 200
+
     contributions_json = contributions.to_dict(orient="index")
     values_json = values.to_dict(orient="index")
 
@@ -333,10 +546,21 @@ def get_contributions(realapp, entities):
 
 
 class MultiFeatureContributions(Resource):
+    request_schema = RequestSchema([
+        Attrs("eids", type=None),
+        Attrs("model_id"),
+        Attrs("row_ids", type=None, required=False),
+        Attrs("format", required=False, default="dict", validation=validate_format),
+        Attrs("all_rows", type=bool, required=False, default=False),
+    ])
+
     def post(self):
         """
         Get feature contributions for multiple eids, or for multiple row_ids in a single entity
         ---
+        description:
+          If given multiple eids and as many row_ids, return contributions for each
+          (eid, row_id) pair, labelled "<eid>:<row_id>".
         tags:
           - computing
         requestBody:
@@ -356,6 +580,17 @@ class MultiFeatureContributions(Resource):
                     type: array
                     items:
                       type: string
+                  format:
+                    type: string
+                    enum: ['dict', 'columnar']
+                    description: >
+                      dict (default) returns {row_id: {feature: value}}. columnar returns
+                      {index: [...], columns: [...], data: [[...]]}
+                  all_rows:
+                    type: boolean
+                    description: >
+                      Compute on every row of the (single) given eid. The response is streamed
+                      as application/x-ndjson, with one line per chunk of rows
                 required: ['eids', 'model_id']
         responses:
           200:
@@ -380,24 +615,36 @@ class MultiFeatureContributions(Resource):
             $ref: '#/components/responses/ErrorMessage'
         """
 
-        attr_info = [
-            Attrs("eids", type=None),
-            Attrs("model_id"),
-            Attrs("row_ids", type=None, required=False),
-        ]
-        eids, model_id, row_ids = get_and_validate_params(attr_info)
+        success, payload = self.request_schema.parse()
+        if not success:
+            return payload
+        eids, model_id, row_ids, response_format, all_rows = payload
 
-        entities = get_entities_table(eids, row_ids)
         success, payload = helpers.load_realapp(model_id)
         if success:
             realapp = payload[0]
         else:
             return payload
 
-        return get_contributions(realapp, entities)
+        if all_rows:
+            return stream_all_rows(
+                eids, lambda entities: get_contributions(realapp, entities, response_format)
+            )
+
+        entities = get_entities_table(eids, row_ids)
+        if isinstance(entities, tuple):
+            return entities
+        return get_contributions(realapp, entities, response_format)
 
 
 class ModifiedFeatureContribution(Resource):
+    request_schema = RequestSchema([
+        Attrs("eid"),
+        Attrs("model_id"),
+        Attrs("row_id", False),
+        Attrs("changes", type=dict, validation=validate_changes),
+    ])
+
     def post(self):
         """
         Get the feature contribution of an entity modified by changes
@@ -440,14 +687,10 @@ class ModifiedFeatureContribution(Resource):
           400:
             $ref: '#/components/responses/ErrorMessage'
         """
-        attr_info = [
-            Attrs("eid"),
-            Attrs("model_id"),
-            Attrs("row_id", False),
-            Attrs("changes", type=None, validation=validate_changes),
-        ]
-
-        eid, model_id, row_id, changes = get_and_validate_params(attr_info)
+        success, payload = self.request_schema.parse()
+        if not success:
+            return payload
+        eid, model_id, row_id, changes = payload
 
         entity_features = get_entity_table(eid, row_id)
         success, payload = helpers.load_realapp(model_id)
@@ -463,6 +706,13 @@ class ModifiedFeatureContribution(Resource):
 
 
 class SimilarEntities(Resource):
+    request_schema = RequestSchema([
+        Attrs("eids", type=None),
+        Attrs("model_id"),
+        Attrs("row_id", required=False),
+        Attrs("format", required=False, default="dict", validation=validate_format),
+    ])
+
     def post(self):
         """
         Get nearest neighbors for list of eids, or for all rows in a single eid
@@ -482,6 +732,14 @@ class SimilarEntities(Resource):
                       type: string
                   model_id:
                     type: string
+                  row_id:
+                    type: string
+                  format:
+                    type: string
+                    enum: ['dict', 'columnar']
+                    description: >
+                      dict (default) returns {row_id: {feature: value}}. columnar returns
+                      {index: [...], columns: [...], data: [[...]]}
                 required: ['eids', 'model_id']
         responses:
           200:
@@ -499,12 +757,17 @@ class SimilarEntities(Resource):
             $ref: '#/components/responses/ErrorMessage'
         """
 
-        attr_info = [Attrs("eids", type=None), Attrs("model_id"), Attrs("row_id", required=False)]
-        eids, model_id, row_id = get_and_validate_params(attr_info)
+        success, payload = self.request_schema.parse()
+        if not success:
+            return payload
+        eids, model_id, row_id, response_format = payload
+
         if row_id is None:
             entities = get_entities_table(eids, row_id)
         else:
             entities = get_entities_table(eids, [row_id])
+        if isinstance(entities, tuple):
+            return entities
         success, payload = helpers.load_realapp(model_id, include_dataset=True)
         if success:
             realapp, dataset = payload
@@ -513,9 +776,16 @@ class SimilarEntities(Resource):
 
         y = dataset["y"]
         X = dataset.drop("y", axis=1)
-        similar_entities = realapp.produce_similar_examples(
-            entities, x_train_orig=X, y_train=y, standardize=True
-        )
+        with timer("explain"):
+            similar_entities = realapp.produce_similar_examples(
+                entities, x_train_orig=X, y_train=y, standardize=True
+            )
+
+        if response_format == "columnar":
+            for eid in similar_entities:
+                for key in ["X", "y", "Input"]:
+                    similar_entities[eid][key] = to_columnar(similar_entities[eid][key])
+            return {"similar_entities": similar_entities}, 200
 
         for eid in similar_entities:
             similar_entities[eid]["X"] = similar_entities[eid]["X"].to_dict(orient="index")
@@ -3,6 +3,7 @@ from logging import getLogger
 from flask import request
 from flask_restful import Resource
 
+from sibyl.cache import conditional_get
 from sibyl.db import schema
 
 LOGGER = getLogger(__name__)
@@ -24,6 +25,7 @@ def get_context_id(context_doc):
 
 
 class Context(Resource):
+    @conditional_get("context")
     def get(self, context_id):
         """
         Get a Context by ID
@@ -97,6 +99,7 @@ class Context(Resource):
 
 
 class Contexts(Resource):
+    @conditional_get("context")
     def get(self):
         """
         Get all Context ids
@@ -3,6 +3,7 @@ import logging
 from flask import request
 from flask_restful import Resource, reqparse
 
+from sibyl import helpers
 from sibyl.db import schema
 
 LOGGER = logging.getLogger(__name__)
@@ -34,13 +35,15 @@ def get_entity(entity_doc, features=True):
     return entity
 
 
-def get_entity_row(entity_doc, row_id=None, features=True):
+def get_entity_row(entity_row, row_id, features=True):
     entity = {
-        "eid": entity_doc.eid,
-        "property": entity_doc.property,
+        "eid": entity_row["eid"],
+        "property": entity_row.get("property", {}),
     }
     if features:
-        entity["features"] = entity_doc.features[row_id]
+        entity["features"] = entity_row["features"][row_id]
+    if row_id in entity_row.get("labels", {}):
+        entity["labels"] = entity_row["labels"]
     return entity
 
 
@@ -93,14 +96,19 @@ class Entity(Resource):
         """
         row_id = request.args.get("row_id", None)
 
+        if row_id is not None:
+            success, payload = helpers.load_entity_row(str(eid), row_id)
+            if not success:
+                message, error_code = payload
+                return dict(message, code=error_code), error_code
+            return get_entity_row(payload, row_id, features=True), 200
+
         entity = schema.Entity.find_one(eid=str(eid))
         if entity is None:
             LOGGER.exception("Error getting entity. Entity %s does not exist.", eid)
             return {"message": "Entity {} does not exist".format(eid), "code": 400}, 400
 
-        if row_id is None:
-            return get_entity(entity, features=True), 200
-        return get_entity_row(entity, row_id, features=True), 200
+        return get_entity(entity, features=True), 200
 
     def put(self, eid):
         """
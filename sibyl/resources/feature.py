@@ -3,6 +3,7 @@ import logging
 from flask import request
 from flask_restful import Resource
 
+from sibyl.cache import conditional_get
 from sibyl.db import schema
 
 LOGGER = logging.getLogger(__name__)
@@ -65,6 +66,7 @@ def add_category(category, category_data):
 
 
 class Feature(Resource):
+    @conditional_get("feature")
     def get(self, feature_name):
         """
         Get a feature by name
@@ -135,6 +137,7 @@ class Feature(Resource):
 
 
 class Features(Resource):
+    @conditional_get("feature")
     def get(self):
         """
         Get all features
@@ -213,6 +216,7 @@ class Features(Resource):
 
 
 class Categories(Resource):
+    @conditional_get("category")
     def get(self):
         """
         Get all feature categories
@@ -0,0 +1,148 @@
+import json
+import logging
+
+from flask import request
+from flask_restful import Resource
+
+from sibyl import g
+from sibyl.db import schema
+
+LOGGER = logging.getLogger(__name__)
+
+
+def get_job(job_doc):
+    job = {
+        "job_id": job_doc.job_id,
+        "type": job_doc.type,
+        "status": job_doc.status,
+        "progress": job_doc.progress,
+        "error": job_doc.error,
+        "start_time": str(job_doc.start_time) if job_doc.start_time else None,
+        "end_time": str(job_doc.end_time) if job_doc.end_time else None,
+    }
+    return job
+
+
+class Jobs(Resource):
+    def post(self):
+        """
+        Submit a long-running request to be computed in the background
+        ---
+        tags:
+          - job
+        requestBody:
+          required: true
+          content:
+            application/json:
+              schema:
+                type: object
+                properties:
+                  type:
+                    type: string
+                    enum: ['multi_contributions', 'multi_prediction', 'similar_entities']
+                    description: Endpoint to run
+                  body:
+                    type: object
+                    description: Request body, as it would be sent to the endpoint
+                required: ['type', 'body']
+        responses:
+          202:
+            description: The submitted job
+            content:
+              application/json:
+                schema:
+                  $ref: '#/components/schemas/Job'
+          400:
+            $ref: '#/components/responses/ErrorMessage'
+        """
+        data = request.json or {}
+        job_type = data.get("type")
+        body = data.get("body")
+
+        runner = g.get("job_runner")
+        if runner is None:
+            LOGGER.exception("Error submitting job. Jobs are not enabled.")
+            return {"message": "Jobs are not enabled"}, 400
+        if job_type not in runner.resources:
+            LOGGER.exception("Error submitting job. Invalid job type %s.", job_type)
+            return {
+                "message": "Invalid job type {}, must be one of {}".format(
+                    job_type, list(runner.resources)
+                )
+            }, 400
+        if not isinstance(body, dict):
+            LOGGER.exception("Error submitting job. Must provide body.")
+            return {"message": "Must provide request body for the job"}, 400
+
+        job = runner.submit(job_type, body)
+        return get_job(job), 202
+
+
+class Job(Resource):
+    def get(self, job_id):
+        """
+        Get the status of a job
+        ---
+        tags:
+          - job
+        parameters:
+          - name: job_id
+            in: path
+            schema:
+              type: string
+            required: true
+            description: ID of the job
+        responses:
+          200:
+            description: Status of the job
+            content:
+              application/json:
+                schema:
+                  $ref: '#/components/schemas/Job'
+          400:
+            $ref: '#/components/responses/ErrorMessage'
+        """
+        job = schema.Job.find(job_id=job_id).exclude("result").first()
+        if job is None:
+            LOGGER.exception("Error getting job. Job %s does not exist.", job_id)
+            return {"message": "Job {} does not exist".format(job_id)}, 400
+
+        return get_job(job), 200
+
+
+class JobResult(Resource):
+    def get(self, job_id):
+        """
+        Get the result of a finished job
+        ---
+        tags:
+          - job
+        parameters:
+          - name: job_id
+            in: path
+            schema:
+              type: string
+            required: true
+            description: ID of the job
+        responses:
+          200:
+            description: Response body of the endpoint the job ran
+          202:
+            description: The job has not finished yet
+            content:
+              application/json:
+                schema:
+                  $ref: '#/components/schemas/Job'
+          400:
+            $ref: '#/components/responses/ErrorMessage'
+        """
+        job = schema.Job.find_one(job_id=job_id)
+        if job is None:
+            LOGGER.exception("Error getting job. Job %s does not exist.", job_id)
+            return {"message": "Job {} does not exist".format(job_id)}, 400
+        if job.status == "failed":
+            return {"message": "Job {} failed: {}".format(job_id, job.error)}, 400
+        if job.status != "done":
+            return get_job(job), 202
+
+        return json.loads(job.result.read()), 200
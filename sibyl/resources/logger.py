@@ -4,6 +4,7 @@ from flask import request
 from flask_restful import Resource
 
 from sibyl import g
+from sibyl.event_log import ColumnarLog, end_of_day, format_row, parse_time
 
 LOGGER = logging.getLogger(__name__)
 
@@ -16,6 +17,9 @@ log_headers = [
     "event_details",
 ]
 
+# Timestamps are in seconds, larger values are likely milliseconds (year 5138 and later)
+MAX_TIMESTAMP = 10**11
+
 
 def format_message(event):
     """
@@ -23,16 +27,142 @@ def format_message(event):
     :param event: dictionary of event components
     :return: formatted string for saving
     """
-    s = ""
-    for header in log_headers:
-        s += str(event[header])
-        s += ","
+    return format_row(event, log_headers)
 
-    s += "\n"
-    return s
+
+def parse_event(body):
+    """
+    Validate a log event and convert it to a log row
+    Args:
+        body (dict): Event in the format of the logging endpoint
+
+    Returns:
+        success (bool): True if the event is valid
+        payload (object): If success is True, payload is {header: value} for each of
+                          log_headers
+                          Else, payload is (error message, error code)
+    """
+    user_id = body.get("user_id")
+    if user_id is None:
+        user_id = ""
+    try:
+        user_id = str(user_id)
+    except Exception as e:
+        LOGGER.exception(e)
+        return False, ({"message": str(e)}, 400)
+
+    eid = body.get("eid")
+    if eid is None:
+        eid = ""
+    try:
+        eid = str(eid)
+    except Exception as e:
+        LOGGER.exception(e)
+        return False, ({"message": str(e)}, 400)
+
+    timestamp = body.get("timestamp")
+    if timestamp is None:
+        LOGGER.exception("Must provide timestamp to log")
+        return False, ({"message": "Must provide timestamp to log"}, 400)
+    try:
+        timestamp = int(timestamp)
+    except Exception as e:
+        LOGGER.exception(e)
+        return False, ({"message": str(e)}, 400)
+    if not 0 <= timestamp < MAX_TIMESTAMP:
+        LOGGER.exception("Invalid timestamp %s", timestamp)
+        return False, (
+            {"message": "timestamp must be in seconds since the epoch, got {}".format(timestamp)},
+            400,
+        )
+
+    event = body.get("event")
+    if not isinstance(event, dict):
+        LOGGER.exception("Must provide event to log")
+        return False, ({"message": "Must provide event to log"}, 400)
+    if "element" not in event:
+        LOGGER.exception("Event must have element")
+        return False, ({"message": "Event must have element"}, 400)
+    if "action" not in event:
+        LOGGER.exception("Event must have action")
+        return False, ({"message": "Event must have action"}, 400)
+
+    event_element = event["element"]
+    event_action = event["action"]
+    if "details" in event:
+        event_details = event["details"]
+    else:
+        event_details = ""
+
+    full_message = {
+        "user_id": user_id,
+        "eid": eid,
+        "timestamp": timestamp,
+        "event_element": event_element,
+        "event_action": event_action,
+        "event_details": event_details,
+    }
+    return True, full_message
+
+
+def write_events(events):
+    """
+    Append log rows to the log, with a single write
+    Args:
+        events (list): Rows returned by parse_event
+
+    Returns:
+        success (bool): True if the rows were written or queued
+        payload (object): If success is False, payload is (error message, error code)
+    """
+    log_sink = g.get("log_sink")
+    if log_sink is not None:
+        log_sink.write_many(events)
+        return True, None
+
+    try:
+        g["event_log"].append(events)
+    except Exception as e:
+        LOGGER.exception(e)
+        return False, ({"message": str(e)}, 400)
+    return True, None
 
 
 class Logger(Resource):
+    def get(self):
+        """
+        @api {get} /logging/ Query the log
+        @apiName GetLogging
+        @apiGroup Logger
+        @apiVersion 1.0.0
+        @apiDescription Get the logged events matching all the given filters, sorted by
+                        timestamp. Requires the columnar log backend.
+
+        @apiParam {String} [user_id] Only return events of this user
+        @apiParam {String} [eid] Only return events about this entity
+        @apiParam {String} [start] Only return events at or after this time (seconds since
+                                   Epoch, or ISO date or datetime)
+        @apiParam {String} [end] Only return events at or before this time. An ISO date
+                                 includes the whole day
+        @apiSuccess {Object[]} events Matching events
+        """
+        event_log = g.get("event_log")
+        if not isinstance(event_log, ColumnarLog):
+            LOGGER.exception("Querying the log requires the columnar log backend")
+            return {"message": "Querying the log requires the columnar log backend"}, 400
+
+        try:
+            start = parse_time(request.args.get("start"))
+            end = end_of_day(request.args.get("end"))
+        except ValueError as e:
+            LOGGER.exception(e)
+            return {"message": "Invalid time filter ({})".format(e)}, 400
+
+        events = event_log.query(
+            user_id=request.args.get("user_id"), eid=request.args.get("eid"), start=start, end=end
+        )
+        return {"events": events}, 200
+
     def post(self):
         """
         @api {post} /logging/ Save a log message
@@ -53,71 +183,45 @@ class Logger(Resource):
         @apiParam {String} user_id Id of user using the app
         @apiParam {String} eid Id of entity involved
         """
-        body = request.json
+        success, payload = parse_event(request.json or {})
+        if not success:
+            return payload
 
-        user_id = body.get("user_id")
-        if user_id is None:
-            user_id = ""
-        try:
-            user_id = str(user_id)
-        except Exception as e:
-            LOGGER.exception(e)
-            return {"message": str(e)}, 400
+        success, payload = write_events([payload])
+        if not success:
+            return payload
 
-        eid = body.get("eid")
-        if eid is None:
-            eid = ""
-        try:
-            eid = str(eid)
-        except Exception as e:
-            LOGGER.exception(e)
-            return {"message": str(e)}, 400
+        return {"message": "log successful"}, 200
 
-        timestamp = body.get("timestamp")
-        if timestamp is None:
-            LOGGER.exception("Must provide timestamp to log")
-            return {"Must provide timestamp to log"}, 400
-        try:
-            timestamp = int(timestamp)
-        except Exception as e:
-            LOGGER.exception(e)
-            return {"message": str(e)}, 400
-
-        event = body.get("event")
-        if event is None:
-            LOGGER.exception("Must provide event to log")
-            return {"Must provide event to log"}, 400
-        if "element" not in event:
-            LOGGER.exception("Event must have element")
-            return {"Event must have element"}, 400
-        if "action" not in event:
-            LOGGER.exception("Event must have action")
-            return {"Event must have action"}, 400
-
-        event_element = event["element"]
-        event_action = event["action"]
-        if "details" in event:
-            event_details = event["details"]
-        else:
-            event_details = ""
-
-        full_message = {
-            "user_id": user_id,
-            "eid": eid,
-            "timestamp": timestamp,
-            "event_element": event_element,
-            "event_action": event_action,
-            "event_details": event_details,
-        }
-        log_file = g["config"]["log_filename"]
-        try:
-            with open(log_file, "a+") as f:
-                if f.tell() == 0:
-                    f.write(",".join(log_headers))
-                    f.write("\n")
-                f.write(format_message(full_message))
-        except Exception as e:
-            LOGGER.exception(e)
-            return {"message": str(e)}, 400
 
-        return {"message": "log successful"}, 200
+class LoggerBatch(Resource):
+    def post(self):
+        """
+        @api {post} /logging/batch/ Save multiple log messages
+        @apiName PostLoggingBatch
+        @apiGroup Logger
+        @apiVersion 1.0.0
+        @apiDescription Save a batch of events to the log, with a single write. If any event
+                        is invalid, no event is saved.
+
+        @apiParam {Object[]} events Events to log, each in the format of /logging/
+        @apiSuccess {Number} count Number of events saved
+        """
+        events = (request.json or {}).get("events")
+        if not isinstance(events, list):
+            LOGGER.exception("Must provide list of events to log")
+            return {"message": "Must provide list of events to log"}, 400
+
+        rows = []
+        for i, event in enumerate(events):
+            success, payload = parse_event(event if isinstance(event, dict) else {})
+            if not success:
+                message, error_code = payload
+                return {"message": "Event {}: {}".format(i, message["message"])}, error_code
+            rows.append(payload)
+
+        success, payload = write_events(rows)
+        if not success:
+            return payload
+
+        return {"message": "log successful", "count": len(rows)}, 200
@@ -1,14 +1,23 @@
 import base64
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pandas as pd
 from flask import request
 from flask_restful import Resource
 
-from sibyl import helpers
+from sibyl import g, helpers
+from sibyl.cache import cached_response, conditional_get
 from sibyl.db import schema
-from sibyl.resources.computing import Attrs, get_and_validate_params, get_entities_table
+from sibyl.metrics import timed, timer
+from sibyl.resources.computing import (
+    Attrs,
+    RequestSchema,
+    get_entities_table,
+    stream_all_rows,
+    validate_format,
+)
 
 LOGGER = logging.getLogger(__name__)
 
@@ -17,15 +26,115 @@ def first(dict_):
     return dict_[next(iter(dict_))]
 
 
-def get_model(model_doc, basic=True):
-    model = {"model_id": model_doc.model_id}
+def get_model(model_metadata, basic=True):
+    model = {"model_id": model_metadata["model_id"]}
     if not basic:
-        model["description"] = model_doc.description
-        model["performance"] = model_doc.performance
+        model["description"] = model_metadata["description"]
+        model["performance"] = model_metadata["performance"]
     return model
 
 
+@timed("predict")
+def predict_table(realapp, entities, return_proba):
+    """Get the prediction for each row of entities, in order."""
+    if return_proba:
+        # the probability of the predicted class is the largest in the output probabilities
+        return np.max(realapp.predict_proba(entities, as_dict=False), axis=1)
+    return realapp.predict(entities, as_dict=False)
+
+
+def get_predictions(eids, model_id, row_ids, return_proba, response_format="dict"):
+    entities = get_entities_table(eids, row_ids)
+    if isinstance(entities, tuple):
+        return entities
+    success, payload = helpers.load_realapp(model_id)
+    if success:
+        realapp = payload[0]
+    else:
+        message, error_code = payload
+        return message, error_code
+
+    return format_predictions(realapp, entities, return_proba, response_format)
+
+
+def format_predictions(realapp, entities, return_proba, response_format="dict"):
+    ids = entities["eid"].tolist()
+    predictions = predict_table(realapp, entities, return_proba)
+    if response_format == "columnar":
+        return {"predictions": {"index": ids, "data": predictions}}, 200
+    return {"predictions": dict(zip(ids, predictions))}, 200
+
+
+def get_multi_model_predictions(
+    model_ids, eids, row_ids, return_proba, parallel=False, response_format="dict"
+):
+    entities = get_entities_table(eids, row_ids)
+    if isinstance(entities, tuple):
+        return entities
+    ids = entities["eid"].tolist()
+
+    def predict(model_id):
+        success, payload = helpers.load_realapp(model_id)
+        if not success:
+            return success, payload
+        return success, predict_table(payload[0], entities, return_proba)
+
+    if parallel and len(model_ids) > 1:
+        with ThreadPoolExecutor(max_workers=len(model_ids)) as executor:
+            results = list(executor.map(predict, model_ids))
+    else:
+        results = [predict(model_id) for model_id in model_ids]
+
+    for success, payload in results:
+        if not success:
+            message, error_code = payload
+            return message, error_code
+
+    if response_format == "columnar":
+        return {
+            "predictions": {
+                "index": model_ids,
+                "columns": ids,
+                "data": [list(predictions) for _, predictions in results],
+            }
+        }, 200
+    return {
+        "predictions": {
+            model_id: dict(zip(ids, predictions))
+            for model_id, (_, predictions) in zip(model_ids, results)
+        }
+    }, 200
+
+
+def get_prediction(model_id, eid, row_id):
+    success, payload = helpers.load_entity_row(eid, row_id)
+    if not success:
+        message, error_code = payload
+        return message, error_code
+    row = first(payload["features"])
+
+    batcher = g.get("prediction_batcher")
+    if batcher is not None:
+        success, payload = batcher.predict(model_id, row)
+        if not success:
+            message, error_code = payload
+            return message, error_code
+        return {"output": payload}, 200
+
+    success, payload = helpers.load_realapp(model_id)
+    if success:
+        realapp = payload[0]
+    else:
+        message, error_code = payload
+        return message, error_code
+
+    with timer("predict"):
+        prediction = realapp.predict(pd.DataFrame(row, index=[0]))[0].tolist()
+    return {"output": prediction}, 200
+
+
 class Model(Resource):
+    @conditional_get("model")
     def get(self, model_id):
         """
         Get a Model by ID
@@ -49,7 +158,7 @@ class Model(Resource):
           400:
             $ref: '#/components/responses/ErrorMessage'
         """
-        model = schema.Model.find_one(model_id=model_id)
+        model = helpers.load_model_metadata(model_id)
         if model is None:
             LOGGER.exception("Error getting model. Model %s does not exist.", model_id)
             return {"message": "Model {} does not exist".format(model_id)}, 400
@@ -99,11 +208,12 @@ class Model(Resource):
             model.save()
         else:
             model.modify(**model_data)
-            model = model.save()
-        return get_model(model, basic=False), 200
+            model.save()
+        return get_model(helpers.load_model_metadata(model_id), basic=False), 200
 
 
 class Models(Resource):
+    @conditional_get("model")
     def get(self):
         """
         Get all Models
@@ -128,7 +238,7 @@ class Models(Resource):
           400:
             $ref: '#/components/responses/ErrorMessage'
         """
-        documents = schema.Model.find()
+        documents = schema.Model.find(only_=["model_id"]).as_pymongo()
         try:
             model = [get_model(document, basic=True) for document in documents]
         except Exception as e:
@@ -139,6 +249,7 @@ class Models(Resource):
 
 
 class Importance(Resource):
+    @conditional_get("model")
     def get(self):
         """
         Get Model feature importances
@@ -173,12 +284,12 @@ class Importance(Resource):
             $ref: '#/components/responses/ErrorMessage'
         """
         model_id = request.args.get("model_id", None)
-        model = schema.Model.find_one(model_id=model_id)
+        model = helpers.load_model_metadata(model_id)
         if model is None:
             LOGGER.exception("Error getting model. Model %s does not exist.", model_id)
             return {"message": "Model {} does not exist".format(model_id)}, 400
 
-        importances = model.importances
+        importances = model["importances"] or {}
         return {"importances": importances}, 200
 
 
@@ -224,32 +335,25 @@ class Prediction(Resource):
         eid = request.args.get("eid", None)
         row_id = request.args.get("row_id", None)
 
-        entity = schema.Entity.find_one(eid=eid)
-        if entity is None:
-            LOGGER.exception("Error getting entity. Entity %s does not exist.", eid)
-            return {"message": "Entity {} does not exist".format(eid)}, 400
-        if row_id is not None:
-            if row_id not in entity.features:
-                LOGGER.exception("row_id %s does not exist for entity %s", (row_id, eid))
-                return {
-                    "message": "row_id {} does not exist for entity {}".format(row_id, eid)
-                }, 400
-            entity_features = pd.DataFrame(entity.features[row_id], index=[0])
-        else:
-            entity_features = pd.DataFrame(first(entity.features), index=[0])
-
-        success, payload = helpers.load_realapp(model_id)
-        if success:
-            realapp = payload[0]
-        else:
-            message, error_code = payload
-            return message, error_code
-
-        prediction = realapp.predict(entity_features)[0].tolist()
-        return {"output": prediction}, 200
+        return cached_response(
+            "prediction",
+            model_id,
+            lambda: get_prediction(model_id, eid, row_id),
+            eid=eid,
+            row_id=row_id,
+        )
 
 
 class MultiPrediction(Resource):
+    request_schema = RequestSchema([
+        Attrs("eids", type=None),
+        Attrs("model_id"),
+        Attrs("row_ids", type=None, required=False),
+        Attrs("return_proba", type=bool, required=False, default=False),
+        Attrs("format", required=False, default="dict", validation=validate_format),
+        Attrs("all_rows", type=bool, required=False, default=False),
+    ])
+
     def post(self):
         """
         Get multiple model predictions.
@@ -257,7 +361,8 @@ class MultiPrediction(Resource):
         description:
           If given multiple eids, return one prediction per eid (first row).
           If given one eid, return one prediction per row_id.
-          Only one of eids and row_ids can contain more than one element.
+          If given multiple eids and as many row_ids, return one prediction per (eid, row_id)
+          pair, labelled "<eid>:<row_id>".
         tags:
           - model
         requestBody:
@@ -280,6 +385,17 @@ class MultiPrediction(Resource):
                     description: row_ids to select from the given eid
                   return_proba:
                     type: boolean
+                  format:
+                    type: string
+                    enum: ['dict', 'columnar']
+                    description: >
+                      dict (default) returns {eid: prediction}. columnar returns
+                      {index: [...], data: [...]}
+                  all_rows:
+                    type: boolean
+                    description: >
+                      Predict on every row of the (single) given eid. The response is streamed
+                      as application/x-ndjson, with one line per chunk of rows
                 required: ['eids', 'model_id']
         responses:
           200:
@@ -297,37 +413,117 @@ class MultiPrediction(Resource):
             $ref: '#/components/responses/ErrorMessage'
         """
 
-        def numpy_decoder(obj):
-            if isinstance(obj, np.integer):
-                return int(obj)
-            if isinstance(obj, np.floating):
-                return float(obj)
-            if isinstance(obj, np.ndarray):
-                return obj.tolist()
-            return obj
-
-        attr_info = [
-            Attrs("eids", type=None),
-            Attrs("model_id"),
-            Attrs("row_ids", type=None, required=False),
-            Attrs("return_proba", type=bool, required=False, default=False),
-        ]
-
-        eids, model_id, row_ids, return_proba = get_and_validate_params(attr_info)
-        entities = get_entities_table(eids, row_ids)
-        success, payload = helpers.load_realapp(model_id)
-        if success:
-            realapp = payload[0]
-        else:
-            message, error_code = payload
-            return message, error_code
-        if return_proba:
-            prediction_probs = realapp.predict_proba(entities)
-            # the probability of the predicted class is the largest in the output probabilities
-            predictions = {
-                key: numpy_decoder(np.max(prediction_probs[key])) for key in prediction_probs
-            }
-        else:
-            predictions = realapp.predict(entities)
-            predictions = {key: numpy_decoder(predictions[key]) for key in predictions}
-        return {"predictions": predictions}, 200
+        success, payload = self.request_schema.parse()
+        if not success:
+            return payload
+        eids, model_id, row_ids, return_proba, response_format, all_rows = payload
+
+        if all_rows:
+            success, payload = helpers.load_realapp(model_id)
+            if not success:
+                message, error_code = payload
+                return message, error_code
+            return stream_all_rows(
+                eids,
+                lambda entities: format_predictions(
+                    payload[0], entities, return_proba, response_format
+                ),
+            )
+
+        return cached_response(
+            "multi_prediction",
+            model_id,
+            lambda: get_predictions(eids, model_id, row_ids, return_proba, response_format),
+            eids=eids,
+            row_ids=row_ids,
+            return_proba=return_proba,
+            format=response_format,
+        )
+
+
+class MultiModelPrediction(Resource):
+    request_schema = RequestSchema([
+        Attrs("model_ids", type=list),
+        Attrs("eids", type=None),
+        Attrs("row_ids", type=None, required=False),
+        Attrs("return_proba", type=bool, required=False, default=False),
+        Attrs("parallel", type=bool, required=False, default=False),
+        Attrs("format", required=False, default="dict", validation=validate_format),
+    ])
+
+    def post(self):
+        """
+        Get predictions from multiple models on the same entities.
+        ---
+        description:
+          The entities are read once and predicted on by every model. Entities are selected
+          with eids and row_ids as in multi_prediction.
+        tags:
+          - model
+        requestBody:
+          required: true
+          content:
+            application/json:
+              schema:
+                type: object
+                properties:
+                  model_ids:
+                    type: array
+                    items:
+                      type: string
+                  eids:
+                    type: array
+                    items:
+                      type: string
+                  row_ids:
+                    type: array
+                    items:
+                      type: string
+                    description: row_ids to select from the given eid
+                  return_proba:
+                    type: boolean
+                  parallel:
+                    type: boolean
+                    description: >
+                      Predict with each model in its own thread. Only faster for models that
+                      release the GIL while predicting
+                  format:
+                    type: string
+                    enum: ['dict', 'columnar']
+                    description: >
+                      dict (default) returns {model_id: {eid: prediction}}. columnar returns
+                      {index: [model_id, ...], columns: [eid, ...], data: [[...]]}
+                required: ['model_ids', 'eids']
+        responses:
+          200:
+            description: Model predictions
+            content:
+              application/json:
+                schema:
+                  type: object
+                  properties:
+                    predictions:
+                      type: object
+                      additionalProperties:
+                        type: object
+                        additionalProperties:
+                          type: number
+          400:
+            $ref: '#/components/responses/ErrorMessage'
+        """
+        success, payload = self.request_schema.parse()
+        if not success:
+            return payload
+        model_ids, eids, row_ids, return_proba, parallel, response_format = payload
+
+        return cached_response(
+            "multi_model_prediction",
+            model_ids,
+            lambda: get_multi_model_predictions(
+                model_ids, eids, row_ids, return_proba, parallel, response_format
+            ),
+            eids=eids,
+            row_ids=row_ids,
+            return_proba=return_proba,
+            format=response_format,
+        )
@@ -1,25 +1,52 @@
 import json
 
-from flasgger import Swagger
-from flask import render_template
+from flask import Flask, render_template
 from flask_restful import Api
 
 import sibyl.resources as ctrl
+from sibyl.serialization import output_json
 from sibyl.swagger import swagger_config, swagger_tpl
 
 API_VERSION = "/api/v1/"
+SPEC_ROUTE = swagger_config["specs"][0]["route"]
 
 
-def add_routes(app, docs_filename=None):
+def _serve_static_spec(app, spec_filename):
+    """Serve a spec compiled by ``build_spec`` instead of building it from the docstrings."""
+    with open(spec_filename, "rb") as fp:
+        spec = fp.read()
+
+    @app.route(SPEC_ROUTE)
+    def apispec():
+        return app.response_class(spec, mimetype="application/json")
+
+
+def add_routes(app, docs_filename=None, spec_filename=None):
+    """
+    Add the API resources and documentation to the app
+    Args:
+        app (Flask): App to add the routes to
+        docs_filename (string): If given, write the API spec built from the docstrings here
+        spec_filename (string): If given, serve this compiled API spec. flasgger is not used,
+            so docstrings are not parsed and requests are not validated against them
+    """
+
     @app.route("/redoc")
     def redoc():
-        return render_template("redoc.html")
+        return render_template("redoc.html", spec_url=SPEC_ROUTE)
 
     # configure RESTful APIs
     api = Api(app)
+    api.representation("application/json")(output_json)
 
     # configure API documentation
-    swag = Swagger(app, config=swagger_config, template=swagger_tpl, parse=True)
+    if spec_filename:
+        swag = None
+        _serve_static_spec(app, spec_filename)
+    else:
+        from flasgger import Swagger
+
+        swag = Swagger(app, config=swagger_config, template=swagger_tpl, parse=True)
 
     # add resources
     api.add_resource(ctrl.entity.Entity, API_VERSION + "entities/<string:eid>/")
@@ -37,6 +64,7 @@ def add_routes(app, docs_filename=None):
     api.add_resource(ctrl.model.Importance, API_VERSION + "importance/")
     api.add_resource(ctrl.model.Prediction, API_VERSION + "prediction/")
     api.add_resource(ctrl.model.MultiPrediction, API_VERSION + "multi_prediction/")
+    api.add_resource(ctrl.model.MultiModelPrediction, API_VERSION + "multi_model_prediction/")
 
     api.add_resource(ctrl.context.Context, API_VERSION + "context/<string:context_id>/")
     api.add_resource(ctrl.context.Contexts, API_VERSION + "contexts/")
@@ -55,9 +83,24 @@ def add_routes(app, docs_filename=None):
     )
     api.add_resource(ctrl.computing.SimilarEntities, API_VERSION + "similar_entities/")
 
+    api.add_resource(ctrl.job.Jobs, API_VERSION + "jobs/")
+    api.add_resource(ctrl.job.Job, API_VERSION + "jobs/<string:job_id>/")
+    api.add_resource(ctrl.job.JobResult, API_VERSION + "jobs/<string:job_id>/result/")
+
     api.add_resource(ctrl.logger.Logger, API_VERSION + "logging/")
+    api.add_resource(ctrl.logger.LoggerBatch, API_VERSION + "logging/batch/")
 
-    if docs_filename:
+    if docs_filename and swag is not None:
         with open(docs_filename, "w") as fp:
             with app.app_context():
                 json.dump(swag.get_apispecs(endpoint=swagger_config["specs"][0]["endpoint"]), fp)
+
+
+def build_spec(filename):
+    """
+    Compile the API spec from the resource docstrings into a static JSON file
+    Args:
+        filename (string): Path of the file to write
+    """
+    app = Flask(__name__)
+    add_routes(app, docs_filename=filename)
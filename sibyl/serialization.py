@@ -0,0 +1,94 @@
+"""Sibyl response serialization.
+
+This module contains the JSON encoding used for all API responses. ``orjson`` is
+used when it is installed, and the standard library encoder otherwise. Both handle
+NumPy scalars and arrays, so resources can return model outputs as they are.
+"""
+
+import json
+import logging
+
+import numpy as np
+from bson import ObjectId
+from flask import make_response
+
+from sibyl.metrics import timer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _default(o):
+    if isinstance(o, np.integer):
+        return int(o)
+    if isinstance(o, np.floating):
+        return float(o)
+    if isinstance(o, np.bool_):
+        return bool(o)
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    if isinstance(o, ObjectId):
+        return str(o)
+    raise TypeError("Object of type {} is not JSON serializable".format(type(o).__name__))
+
+
+def _dumps_json(data):
+    return json.dumps(data, default=_default).encode("utf-8")
+
+
+def _dumps_orjson(data):
+    return orjson.dumps(
+        data,
+        default=_default,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+    )
+
+
+BACKENDS = {"json": _dumps_json}
+if orjson is not None:
+    BACKENDS["orjson"] = _dumps_orjson
+
+_dumps = BACKENDS.get("orjson", _dumps_json)
+
+
+def set_backend(backend):
+    """
+    Set the JSON encoder used for responses
+    Args:
+        backend (string): One of "auto", "orjson" or "json". "auto" uses orjson if it is
+                          installed
+    """
+    global _dumps
+    if backend == "auto":
+        _dumps = BACKENDS.get("orjson", _dumps_json)
+    elif backend in BACKENDS:
+        _dumps = BACKENDS[backend]
+    else:
+        LOGGER.warning("JSON backend %s is not available, using json", backend)
+        _dumps = _dumps_json
+
+
+def dumps(data):
+    """
+    Encode data as JSON
+    Args:
+        data (object): Data to encode. May contain NumPy scalars and arrays
+
+    Returns:
+        bytes: UTF-8 encoded JSON
+    """
+    return _dumps(data)
+
+
+def output_json(data, code, headers=None):
+    """Flask-RESTful representation for application/json responses."""
+    with timer("serialize"):
+        body = dumps(data)
+    response = make_response(body, code)
+    response.headers["Content-Type"] = "application/json"
+    response.headers.extend(headers or {})
+    return response
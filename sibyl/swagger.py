@@ -133,6 +133,18 @@ schemas = {
         "type": "object",
         "properties": {"config": {"type": "object"}},
     },
+    "Job": {
+        "type": "object",
+        "properties": {
+            "job_id": {"type": "string"},
+            "type": {"type": "string"},
+            "status": {"type": "string", "enum": ["pending", "running", "done", "failed"]},
+            "progress": {"type": "number", "description": "Fraction completed, 0 to 1"},
+            "error": {"type": "string"},
+            "start_time": {"type": "string"},
+            "end_time": {"type": "string"},
+        },
+    },
     "Changes": {
         "type": "object",
         "additionalProperties": {"oneOf": [{"type": "string"}, {"type": "number"}]},
@@ -166,6 +178,7 @@ tags = [
         "name": "computing",
         "description": "Computed explanations and other ML augmenting information",
     },
+    {"name": "job", "description": "Long-running requests computed in the background"},
 ]
 
 
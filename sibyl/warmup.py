@@ -0,0 +1,78 @@
+"""Sibyl server warm-up.
+
+This module contains the warm-up stage run before the server starts accepting
+requests. It opens the database connection, deserializes the models into the
+per-process caches and runs one prediction and explanation per model, so the first
+requests after a deploy do not pay for them.
+"""
+
+import logging
+import time
+
+import pandas as pd
+
+from sibyl import helpers
+from sibyl.db import schema
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _dummy_input():
+    """Get a table with the first row of one entity, or None if there are no entities."""
+    entity = schema.Entity.objects.only("eid").as_pymongo().first()
+    if entity is None:
+        return None
+
+    success, payload = helpers.load_entity_row(entity["eid"])
+    if not success:
+        return None
+    row = next(iter(payload["features"].values()))
+    return pd.DataFrame([dict(row, eid=entity["eid"])])
+
+
+def warm_up(model_ids=None, predict=True):
+    """
+    Preload models into the per-process caches
+    Args:
+        model_ids (list): IDs of the models to load. Defaults to all models
+        predict (bool): If True, run one prediction and explanation per model
+
+    Returns:
+        dict: {step: seconds} spent on each step of the warm-up
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    # the first query opens the database connection
+    step = time.perf_counter()
+    if model_ids is None:
+        model_ids = [
+            model["model_id"] for model in schema.Model.find(only_=["model_id"]).as_pymongo()
+        ]
+    else:
+        schema.Model.objects.only("model_id").as_pymongo().first()
+    timings["connect"] = time.perf_counter() - step
+
+    entities = _dummy_input() if predict else None
+    for model_id in model_ids:
+        step = time.perf_counter()
+        helpers.load_model_metadata(model_id)
+        success, payload = helpers.load_realapp(model_id)
+        if not success:
+            LOGGER.warning("Could not warm up model %s: %s", model_id, payload[0])
+            continue
+
+        if entities is not None:
+            realapp = payload[0]
+            try:
+                realapp.predict(entities)
+                realapp.produce_feature_contributions(entities)
+            except Exception as e:
+                LOGGER.warning("Could not run model %s while warming up: %s", model_id, e)
+
+        timings["model " + model_id] = time.perf_counter() - step
+        LOGGER.info("Warmed up model %s in %.3fs", model_id, timings["model " + model_id])
+
+    timings["total"] = time.perf_counter() - start
+    LOGGER.info("Warm-up finished in %.3fs", timings["total"])
+    return timings
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `sibyl.batching` module."""
+
+import threading
+
+from sibyl import g
+from sibyl.batching import PredictionBatcher
+
+
+def test_batcher_coalesces_predictions(models, entities, monkeypatch):
+    from sibyl import helpers
+
+    model_id = models[0]["model_id"]
+    load_calls = []
+    load_realapp = helpers.load_realapp
+
+    def counting_load_realapp(*args, **kwargs):
+        load_calls.append(args)
+        return load_realapp(*args, **kwargs)
+
+    monkeypatch.setattr(helpers, "load_realapp", counting_load_realapp)
+
+    batcher = PredictionBatcher(window_ms=200, max_batch_size=len(entities))
+    results = [None] * len(entities)
+
+    def predict(i):
+        results[i] = batcher.predict(model_id, entities[i]["features"]["row_a"])
+
+    threads = [threading.Thread(target=predict, args=(i,)) for i in range(len(entities))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(load_calls) == 1
+    for entity, (success, prediction) in zip(entities, results):
+        features = entity["features"]["row_a"]
+        assert success
+        assert prediction == features["A"] - features["B"]
+
+
+def test_batcher_invalid_model():
+    batcher = PredictionBatcher(window_ms=1)
+    success, payload = batcher.predict("does not exist", {"A": 1, "B": 2, "C": 3})
+    assert not success
+    assert payload[1] == 400
+
+
+def test_get_prediction_batched(client, models, entities, monkeypatch):
+    monkeypatch.setitem(g, "prediction_batcher", PredictionBatcher(window_ms=1))
+    entity = entities[0]
+    row_id = "row_b"
+    expected_output = entity["features"][row_id]["A"] - entity["features"][row_id]["B"]
+
+    response = client.get(
+        "/api/v1/prediction/?model_id="
+        + models[0]["model_id"]
+        + "&eid="
+        + entity["eid"]
+        + "&row_id="
+        + row_id
+    ).json
+    assert response["output"] == expected_output
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `sibyl.cache` module."""
+
+import time
+
+from sibyl import g
+from sibyl.cache import LRUCache, PredictionCache, make_key
+from sibyl.db import schema
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_lru_cache_ttl():
+    cache = LRUCache(maxsize=2, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_make_key_canonical_changes():
+    key_1 = make_key("modified_prediction", "model", changes={"A": 1, "B": 2})
+    key_2 = make_key("modified_prediction", "model", changes={"B": 2, "A": 1})
+    key_3 = make_key("modified_prediction", "model", changes={"A": 1, "B": 3})
+    assert key_1 == key_2
+    assert key_1 != key_3
+
+
+def test_prediction_cache_mongo_backend():
+    cache = PredictionCache(mongo=True)
+    key = cache.key("prediction", "test model", eid="ent1", row_id=None)
+    cache.set(key, {"output": 9})
+
+    # A new cache (as in another worker) reads the result from the database
+    other_cache = PredictionCache(mongo=True)
+    assert other_cache.get(key) == {"output": 9}
+    assert schema.CachedResult.objects(key=key).count() == 1
+
+
+def test_modified_prediction_cached(client, models, entities, monkeypatch):
+    from sibyl import helpers
+
+    monkeypatch.setitem(g, "prediction_cache", PredictionCache())
+    load_calls = []
+    load_realapp = helpers.load_realapp
+
+    def counting_load_realapp(*args, **kwargs):
+        load_calls.append(args)
+        return load_realapp(*args, **kwargs)
+
+    monkeypatch.setattr(helpers, "load_realapp", counting_load_realapp)
+
+    model_id = models[0]["model_id"]
+    entity = entities[0]
+    body = {"eid": entity["eid"], "model_id": model_id, "changes": {"A": 5, "C": 1}}
+    expected = 5 - entity["features"]["row_a"]["B"]
+
+    assert client.post("/api/v1/modified_prediction/", json=body).json["prediction"] == expected
+    body["changes"] = {"C": 1, "A": 5}
+    assert client.post("/api/v1/modified_prediction/", json=body).json["prediction"] == expected
+    assert len(load_calls) == 1
+
+    # Writing to the model collection invalidates cached predictions
+    client.put("/api/v1/models/" + model_id + "/", json={"description": "changed"})
+    assert client.post("/api/v1/modified_prediction/", json=body).json["prediction"] == expected
+    assert len(load_calls) == 2
+
+
+def test_features_etag(client, features):
+    response = client.get("/api/v1/features/")
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-cache"
+
+    response = client.get("/api/v1/features/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    client.put("/api/v1/features/" + features[0]["name"] + "/", json={"description": "new"})
+    response = client.get("/api/v1/features/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_importance_etag_depends_on_query(client, models):
+    response_1 = client.get("/api/v1/importance/?model_id=" + models[0]["model_id"])
+    response_2 = client.get("/api/v1/importance/?model_id=" + models[1]["model_id"])
+    assert response_1.headers["ETag"] != response_2.headers["ETag"]
+
+    response = client.get(
+        "/api/v1/importance/?model_id=" + models[0]["model_id"],
+        headers={"If-None-Match": response_1.headers["ETag"]},
+    )
+    assert response.status_code == 304
+
+
+def test_missing_model_has_no_etag(client):
+    response = client.get("/api/v1/models/does_not_exist/")
+    assert response.status_code == 400
+    assert "ETag" not in response.headers
@@ -3,9 +3,13 @@
 
 """Tests for `sibylapp` package."""
 
+import json
+
 import pandas as pd
 
+from sibyl import g
 from sibyl.db import schema
+from sibyl.resources.computing import Attrs, RequestSchema
 
 
 def contribution_helper(result, b_neg):
@@ -224,3 +228,97 @@ def test_post_similar_entities(client, models, entities, multirow_entities):
         pd.DataFrame.from_dict(similar_entities[eid]["X"], orient="index")  # Assert no error
         pd.Series(similar_entities[eid]["y"])  # Assert no error
         pd.Series(similar_entities[eid]["Input"])  # Assert no error
+
+
+def test_post_multi_contributions_columnar(client, models, entities):
+    model_id = models[0]["model_id"]
+    eids = [entity["eid"] for entity in entities]
+    expected = client.post(
+        "/api/v1/multi_contributions/", json={"eids": eids, "model_id": model_id}
+    ).json
+    response = client.post(
+        "/api/v1/multi_contributions/",
+        json={"eids": eids, "model_id": model_id, "format": "columnar"},
+    ).json
+
+    for key in ["contributions", "values"]:
+        table = response[key]
+        assert table["index"] == eids
+        assert len(table["data"]) == len(eids)
+        result = pd.DataFrame(table["data"], index=table["index"], columns=table["columns"])
+        assert result.to_dict(orient="index") == expected[key]
+
+
+def test_post_similar_entities_columnar(client, models, entities):
+    response = client.post(
+        "/api/v1/similar_entities/",
+        json={
+            "eids": [entities[0]["eid"]],
+            "model_id": models[0]["model_id"],
+            "format": "columnar",
+        },
+    ).json
+    similar = response["similar_entities"][entities[0]["eid"]]
+    assert similar["X"]["data"][0] == list(entities[0]["features"]["row_a"].values())
+    assert similar["X"]["columns"] == list(entities[0]["features"]["row_a"].keys())
+    assert len(similar["y"]["index"]) == len(similar["y"]["data"])
+
+
+def test_invalid_format(client, models, entities):
+    response = client.post(
+        "/api/v1/multi_contributions/",
+        json={"eids": [entities[0]["eid"]], "model_id": models[0]["model_id"], "format": "xml"},
+    )
+    assert response.status_code == 400
+
+
+def test_post_multi_contributions_all_rows(client, models, multirow_entities, monkeypatch):
+    monkeypatch.setitem(g["config"], "streaming", {"chunk_size": 1})
+    entity = multirow_entities[0]
+    body = {"eids": [entity["eid"]], "model_id": models[0]["model_id"]}
+    expected = client.post(
+        "/api/v1/multi_contributions/", json=dict(body, row_ids=entity["row_ids"])
+    ).json
+
+    response = client.post("/api/v1/multi_contributions/", json=dict(body, all_rows=True))
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.data.splitlines()]
+    assert len(lines) == len(entity["row_ids"])
+
+    contributions = {}
+    for line in lines:
+        contributions.update(line["contributions"])
+    assert contributions == expected["contributions"]
+
+
+def test_missing_parameter(client, models):
+    response = client.post("/api/v1/multi_contributions/", json={"model_id": "test model"})
+    assert response.status_code == 400
+    assert response.json["message"] == "Missing required parameter eids"
+
+
+def test_invalid_parameters(client, models, entities):
+    body = {"eid": entities[0]["eid"], "model_id": models[0]["model_id"]}
+    invalid = [
+        ("/api/v1/modified_prediction/", dict(body, changes={"does not exist": 1})),
+        ("/api/v1/modified_prediction/", dict(body, changes=[1, 2])),
+        ("/api/v1/modified_prediction/", dict(body, changes={"A": 1}, return_proba="maybe")),
+        (
+            "/api/v1/multi_contributions/",
+            {"eids": ["ent1"], "model_id": "test model", "format": "x"},
+        ),
+    ]
+    for route, request_body in invalid:
+        response = client.post(route, json=request_body)
+        assert response.status_code == 400
+        assert "message" in response.json
+
+
+def test_form_parameters(client):
+    request_schema = RequestSchema([
+        Attrs("eid"),
+        Attrs("row_id", required=False),
+        Attrs("return_proba", type=bool, required=False, default=False),
+    ])
+    with g["app"].test_request_context(method="POST", data={"eid": "1", "return_proba": "true"}):
+        assert request_schema.parse() == (True, ["1", None, True])
@@ -44,6 +44,12 @@ def test_get_entity_with_row(client, entities):
     assert response["eid"] == entity["eid"]
     assert response["features"] == entity["features"][row_id]
     assert response["property"] == entity["property"]
+    assert response["labels"] == {row_id: entity["labels"][row_id]}
+
+
+def test_get_entity_with_invalid_row(client, entities):
+    response = client.get("/api/v1/entities/" + entities[0]["eid"] + "/?row_id=does_not_exist")
+    assert response.status_code == 400
 
 
 def test_get_groups(client, groups):
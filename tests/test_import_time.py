@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Import time budgets of the `sibyl` command line interface and server."""
+
+import subprocess
+import sys
+
+# Cumulative import time of sibyl.cli, in seconds. Loading the CLI should only cost
+# argument parsing and config reading; each subcommand imports its own dependencies.
+CLI_IMPORT_BUDGET = 0.5
+
+HEAVY_MODULES = ["pandas", "numpy", "pyreal", "sklearn", "flask", "mongoengine", "tqdm"]
+
+# Cumulative import time of sibyl.core, in seconds. The server needs pandas, flask and
+# mongoengine, but not the modules used to prepare a database.
+SERVER_IMPORT_BUDGET = 1.5
+
+PREPARATION_MODULES = ["tqdm", "yaml", "sibyl.db.preprocessing", "sibyl.db.explorer"]
+
+
+def get_import_times(module):
+    """Import a module in a new interpreter, returning {module: cumulative seconds}."""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+    imported = {}
+    for line in output.splitlines():
+        if line.startswith("import time:") and "cumulative" not in line:
+            _, cumulative, name = line[len("import time:") :].split("|")
+            imported[name.strip()] = int(cumulative) / 1e6
+    return imported
+
+
+def test_cli_import_time():
+    imported = get_import_times("sibyl.cli")
+
+    for module in HEAVY_MODULES:
+        assert module not in imported, "sibyl.cli imports {}".format(module)
+    assert imported["sibyl.cli"] < CLI_IMPORT_BUDGET
+
+
+def test_server_import_time():
+    imported = get_import_times("sibyl.core")
+
+    for module in PREPARATION_MODULES:
+        assert module not in imported, "sibyl.core imports {}".format(module)
+    assert imported["sibyl.core"] < SERVER_IMPORT_BUDGET
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `sibyl.invalidation` module."""
+
+import time
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from sibyl import g, helpers
+from sibyl.cache import PredictionCache
+from sibyl.db import schema
+from sibyl.invalidation import InvalidationBus, PollingBus, create_bus, get_versions
+
+
+def _other_worker_write(collection):
+    # bumps the version without going through this process's listeners
+    schema.DocumentVersion.objects(collection=collection).update_one(inc__version=1, upsert=True)
+
+
+def test_local_write_notifies_subscribers():
+    bus = InvalidationBus().start()
+    evicted = []
+    bus.subscribe(evicted.append, "feature", "category")
+    try:
+        schema.Category.insert(name="invalidation_category")
+        schema.Context.insert(context_id="invalidation_context", config={})
+
+        assert evicted == ["category"]
+        assert bus.get_versions("category") == schema.DocumentVersion.get_versions("category")
+    finally:
+        bus.stop()
+
+    schema.Category.insert(name="invalidation_category_2")
+    assert evicted == ["category"]
+
+
+def test_poll_sees_other_workers():
+    bus = InvalidationBus().start()
+    evicted = []
+    bus.subscribe(evicted.append)
+    try:
+        _other_worker_write("entity")
+        assert evicted == []
+
+        bus.poll()
+        assert evicted == ["entity"]
+        assert bus.get_versions("entity") == schema.DocumentVersion.get_versions("entity")
+    finally:
+        bus.stop()
+
+
+def test_polling_bus_thread():
+    bus = PollingBus(interval=0.01).start()
+    evicted = []
+    bus.subscribe(evicted.append, "training_set")
+    try:
+        _other_worker_write("training_set")
+        for _ in range(100):
+            if evicted:
+                break
+            time.sleep(0.01)
+        assert evicted == ["training_set"]
+    finally:
+        bus.stop()
+
+
+def test_get_versions_from_running_bus(monkeypatch):
+    bus = InvalidationBus().start()
+    monkeypatch.setitem(g, "invalidation_bus", bus)
+    try:
+        version = get_versions("model")
+        _other_worker_write("model")
+        assert get_versions("model") == version
+        # collections not watched by the bus are read from the database
+        assert get_versions("event") == schema.DocumentVersion.get_versions("event")
+
+        bus.poll()
+        assert get_versions("model") == schema.DocumentVersion.get_versions("model")
+    finally:
+        bus.stop()
+    _other_worker_write("model")
+    assert get_versions("model") == schema.DocumentVersion.get_versions("model")
+
+
+def test_model_caches_evicted():
+    bus = InvalidationBus().start()
+    cache = PredictionCache()
+    bus.subscribe(helpers.clear_model_caches, "model")
+    bus.subscribe(cache.clear, "model", "entity")
+    try:
+        helpers._realapps.set("invalidation_model", object())
+        cache.set("key", {"output": 1})
+        _other_worker_write("model")
+        bus.poll()
+
+        assert helpers._realapps.get("invalidation_model") is None
+        assert cache.get("key") is None
+    finally:
+        bus.stop()
+
+
+def test_create_bus_change_stream():
+    try:
+        bus = create_bus("change_stream")
+    except (OperationFailure, NotImplementedError):
+        pytest.skip("Change streams require a replica set")
+
+    evicted = []
+    bus.subscribe(evicted.append, "context")
+    try:
+        _other_worker_write("context")
+        for _ in range(100):
+            if evicted:
+                break
+            time.sleep(0.05)
+        assert evicted == ["context"]
+    finally:
+        bus.stop()
+
+
+def test_create_bus_invalid_mode():
+    with pytest.raises(ValueError):
+        create_bus("invalid")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `sibylapp` package."""
+
+import time
+
+from sibyl import g
+
+
+def wait_for_job(client, job_id, timeout=30):
+    start = time.time()
+    while time.time() - start < timeout:
+        job = client.get("/api/v1/jobs/" + job_id + "/").json
+        if job["status"] in ["done", "failed"]:
+            return job
+        time.sleep(0.05)
+    raise TimeoutError("Job {} did not finish".format(job_id))
+
+
+def test_multi_contributions_job(client, models, entities, monkeypatch):
+    monkeypatch.setattr(g["job_runner"], "chunk_size", 2)
+    body = {"eids": [entity["eid"] for entity in entities], "model_id": models[0]["model_id"]}
+    expected = client.post("/api/v1/multi_contributions/", json=body).json
+
+    response = client.post("/api/v1/jobs/", json={"type": "multi_contributions", "body": body})
+    assert response.status_code == 202
+    job_id = response.json["job_id"]
+
+    job = wait_for_job(client, job_id)
+    assert job["status"] == "done"
+    assert job["progress"] == 1
+
+    result = client.get("/api/v1/jobs/" + job_id + "/result/")
+    assert result.status_code == 200
+    assert result.json == expected
+
+
+def test_columnar_job(client, models, entities, monkeypatch):
+    monkeypatch.setattr(g["job_runner"], "chunk_size", 2)
+    body = {
+        "eids": [entity["eid"] for entity in entities],
+        "model_id": models[0]["model_id"],
+        "format": "columnar",
+    }
+    job_id = client.post("/api/v1/jobs/", json={"type": "multi_prediction", "body": body}).json[
+        "job_id"
+    ]
+    wait_for_job(client, job_id)
+
+    predictions = client.get("/api/v1/jobs/" + job_id + "/result/").json["predictions"]
+    assert predictions["index"] == body["eids"]
+    assert len(predictions["data"]) == len(entities)
+
+
+def test_failed_job(client, entities):
+    body = {"eids": [entities[0]["eid"]], "model_id": "does not exist"}
+    job_id = client.post("/api/v1/jobs/", json={"type": "multi_contributions", "body": body}).json[
+        "job_id"
+    ]
+
+    job = wait_for_job(client, job_id)
+    assert job["status"] == "failed"
+    assert client.get("/api/v1/jobs/" + job_id + "/result/").status_code == 400
+
+
+def test_invalid_job(client):
+    response = client.post("/api/v1/jobs/", json={"type": "something", "body": {}})
+    assert response.status_code == 400
+    assert client.get("/api/v1/jobs/does_not_exist/").status_code == 400
+
+
+def test_all_rows_job(client, models, multirow_entities):
+    entity = multirow_entities[0]
+    body = {"eids": [entity["eid"]], "model_id": models[0]["model_id"], "all_rows": True}
+    job_id = client.post("/api/v1/jobs/", json={"type": "multi_prediction", "body": body}).json[
+        "job_id"
+    ]
+    assert wait_for_job(client, job_id)["status"] == "done"
+
+    predictions = client.get("/api/v1/jobs/" + job_id + "/result/").json["predictions"]
+    assert list(predictions) == entity["row_ids"]
+
+
+def test_pairs_job(client, models, multirow_entities, monkeypatch):
+    monkeypatch.setattr(g["job_runner"], "chunk_size", 1)
+    body = {
+        "eids": [entity["eid"] for entity in multirow_entities],
+        "row_ids": [entity["row_ids"][-1] for entity in multirow_entities],
+        "model_id": models[0]["model_id"],
+    }
+    expected = client.post("/api/v1/multi_prediction/", json=body).json
+
+    job_id = client.post("/api/v1/jobs/", json={"type": "multi_prediction", "body": body}).json[
+        "job_id"
+    ]
+    assert wait_for_job(client, job_id)["status"] == "done"
+    assert client.get("/api/v1/jobs/" + job_id + "/result/").json == expected
+
+
+def test_pairs_chunks():
+    from sibyl.jobs import JobRunner
+
+    runner = JobRunner(None, {}, workers=1, chunk_size=2)
+    body = {"eids": ["1", "2", "3", "4", "5"], "row_ids": ["a", "b", "c", "d", "e"]}
+    chunks = runner._chunks(body)
+    runner.shutdown()
+
+    assert [chunk["eids"] for chunk in chunks] == [["1", "2"], ["3", "4", "5"]]
+    assert [chunk["row_ids"] for chunk in chunks] == [["a", "b"], ["c", "d", "e"]]
+
+
+def test_job_result_write_fails(client, models, entities, monkeypatch):
+    def failing_dumps(value):
+        raise ValueError("document too large")
+
+    monkeypatch.setattr("sibyl.jobs.dumps", failing_dumps)
+    body = {"eids": [entities[0]["eid"]], "model_id": models[0]["model_id"]}
+    job_id = client.post("/api/v1/jobs/", json={"type": "multi_prediction", "body": body}).json[
+        "job_id"
+    ]
+
+    job = wait_for_job(client, job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == "document too large"
@@ -1,5 +1,11 @@
 import os
 
+from sibyl import g
+from sibyl.core import Sibyl
+from sibyl.event_log import ColumnarLog, CSVLog, worker_filename
+from sibyl.log_sink import LogSink
+from sibyl.resources.logger import log_headers
+
 
 def test_post_logging(client):
     event = {"element": "something", "action": "click", "details": "done"}
@@ -32,3 +38,182 @@ def test_post_logging(client):
             + ","
         )
     os.remove("test.csv")
+
+
+def test_buffered_logging(client, tmp_path, monkeypatch):
+    filename = str(tmp_path / "log.csv")
+    log_sink = LogSink(CSVLog(filename, log_headers, per_worker=True), max_events=2, interval=60)
+    monkeypatch.setitem(g, "log_sink", log_sink)
+
+    event = {"element": "something", "action": "click"}
+    for timestamp in ["1000", "1001", "1002"]:
+        response = client.post(
+            "/api/v1/logging/", json={"eid": "eid_1", "timestamp": timestamp, "event": event}
+        )
+        assert response.json["message"] == "log successful"
+    log_sink.close()
+
+    with open(worker_filename(filename)) as log_file:
+        lines = log_file.read().splitlines()
+    assert lines[0] == ",".join(log_headers)
+    assert [line.split(",")[0] for line in lines[1:]] == ["1000", "1001", "1002"]
+
+
+def test_log_rotation(tmp_path):
+    filename = str(tmp_path / "log.csv")
+    event_log = CSVLog(filename, ["a", "b"], max_bytes=5)
+    event_log.append([{"a": 1, "b": 2}])
+    event_log.append([{"a": 3, "b": "x,y"}])
+
+    with open(str(tmp_path / "log.1.csv")) as log_file:
+        assert log_file.read() == "a,b\n1,2,\n"
+    with open(filename) as log_file:
+        assert log_file.read() == 'a,b\n3,"x,y",\n'
+
+
+def test_post_logging_batch(client):
+    events = [
+        {
+            "eid": "eid_1",
+            "user_id": "user_1",
+            "timestamp": 1000 + i,
+            "event": {"element": "e", "action": "click"},
+        }
+        for i in range(3)
+    ]
+    response = client.post("/api/v1/logging/batch/", json={"events": events}).json
+    assert response["count"] == 3
+
+    with open("test.csv") as log_file:
+        lines = log_file.read().splitlines()
+    os.remove("test.csv")
+    assert len(lines) == 4
+    assert [line.split(",")[0] for line in lines[1:]] == ["1000", "1001", "1002"]
+
+
+def test_post_logging_batch_invalid(client):
+    events = [
+        {"timestamp": 1000, "event": {"element": "e", "action": "click"}},
+        {"timestamp": 1001, "event": {"element": "e"}},
+    ]
+    response = client.post("/api/v1/logging/batch/", json={"events": events})
+    assert response.status_code == 400
+    assert response.json["message"] == "Event 1: Event must have action"
+    assert not os.path.exists("test.csv")
+
+
+def test_columnar_log(tmp_path):
+    event_log = ColumnarLog(str(tmp_path), log_headers)
+    day = 24 * 60 * 60
+    rows = [
+        {
+            "timestamp": timestamp,
+            "user_id": user_id,
+            "eid": "eid_1",
+            "event_element": "e",
+            "event_action": "click",
+            "event_details": "a, b",
+        }
+        for timestamp, user_id in [(10, "user_1"), (day + 10, "user_2"), (2 * day + 10, "user_1")]
+    ]
+    event_log.append(rows[:2])
+    event_log.append(rows[2:])
+    assert sorted(os.listdir(str(tmp_path))) == ["1970-01-01", "1970-01-02", "1970-01-03"]
+
+    assert event_log.query() == rows
+    assert event_log.query(user_id="user_1") == [rows[0], rows[2]]
+    assert event_log.query(start=day, end=2 * day) == [rows[1]]
+    assert event_log.query(eid="eid_2") == []
+
+
+def test_get_logging(client, tmp_path, monkeypatch):
+    assert client.get("/api/v1/logging/").status_code == 400
+
+    monkeypatch.setitem(g, "event_log", ColumnarLog(str(tmp_path), log_headers))
+    event = {"element": "something", "action": "filter", "details": "x, y"}
+    for eid in ["eid_1", "eid_2"]:
+        client.post("/api/v1/logging/", json={"eid": eid, "timestamp": 1000, "event": event})
+
+    events = client.get("/api/v1/logging/?eid=eid_2&start=1970-01-01&end=1970-01-01").json[
+        "events"
+    ]
+    assert len(events) == 1
+    assert events[0]["eid"] == "eid_2"
+    assert events[0]["event_details"] == "x, y"
+
+
+def test_post_logging_millisecond_timestamp(client):
+    event = {"element": "e", "action": "click"}
+    response = client.post(
+        "/api/v1/logging/", json={"eid": "eid_1", "timestamp": 1700000000000, "event": event}
+    )
+    assert response.status_code == 400
+    assert response.json["message"].startswith("timestamp must be in seconds")
+    assert not os.path.exists("test.csv")
+
+
+def test_log_sink_keeps_valid_events(tmp_path):
+    event_log = ColumnarLog(str(tmp_path), log_headers)
+    log_sink = LogSink(event_log, max_events=100, interval=60)
+    row = {
+        "user_id": "user_1",
+        "eid": "eid_1",
+        "event_element": "e",
+        "event_action": "click",
+        "event_details": "",
+    }
+    log_sink.write_many([
+        dict(row, timestamp=1000),
+        dict(row, timestamp=1700000000000),
+        dict(row, timestamp=1001),
+    ])
+    log_sink.close()
+
+    assert [event["timestamp"] for event in event_log.query()] == [1000, 1001]
+
+
+def test_columnar_log_is_buffered(tmp_path, monkeypatch):
+    for key in list(g):
+        monkeypatch.setitem(g, key, g[key])
+    config = {
+        "mongodb": {
+            "db": "sibylapp_test",
+            "host": "localhost",
+            "port": 27017,
+            "username": None,
+            "password": None,
+        },
+        "log_backend": "columnar",
+        "log_directory": str(tmp_path),
+        "flask": {},
+    }
+    Sibyl(config, docker=False)._init_flask_app("test")
+    assert g["log_sink"] is not None
+    assert g["log_sink"].log is g["event_log"]
+    g["log_sink"].close()
+
+
+def test_columnar_log_compaction(tmp_path):
+    event_log = ColumnarLog(str(tmp_path), log_headers, max_segments=3, segment_rows=4)
+    rows = [
+        {
+            "timestamp": timestamp,
+            "user_id": "user_{}".format(timestamp % 2),
+            "eid": "eid_1",
+            "event_element": "e",
+            "event_action": "click",
+            "event_details": "",
+        }
+        for timestamp in range(10, 17)
+    ]
+    for row in rows:
+        event_log.append([row])
+
+    # the first 4 segments were merged into one of 4 rows, which is not merged again,
+    # then the next 3 were merged once there were 4 segments
+    day_directory = str(tmp_path / "1970-01-01")
+    assert sorted(meta["rows"] for meta in event_log._segments(day_directory).values()) == [3, 4]
+    assert len(os.listdir(day_directory)) == 4
+    assert event_log.query() == rows
+    assert event_log.query(user_id="user_1") == rows[1::2]
+    assert event_log.compact("1970-01-01") == 0
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `sibyl.metrics` module."""
+
+import pytest
+from flask import Flask
+
+from sibyl import metrics
+from sibyl.routes import add_routes
+
+
+@pytest.fixture
+def metrics_client(monkeypatch):
+    monkeypatch.setattr(metrics, "_enabled", False)
+    app = Flask(__name__)
+    add_routes(app)
+    metrics.init_app(app)
+    yield app.test_client()
+    for histogram in metrics.HISTOGRAMS:
+        histogram.clear()
+
+
+def test_histogram_expose():
+    histogram = metrics.Histogram("test_seconds", "Test", ["endpoint"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, "a")
+    histogram.observe(0.5, "a")
+
+    assert histogram.expose() == [
+        "# HELP test_seconds Test",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{endpoint="a",le="0.1"} 1',
+        'test_seconds_bucket{endpoint="a",le="1.0"} 2',
+        'test_seconds_bucket{endpoint="a",le="+Inf"} 2',
+        'test_seconds_sum{endpoint="a"} 0.55',
+        'test_seconds_count{endpoint="a"} 2',
+    ]
+
+
+def test_timer_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, "_enabled", False)
+    with metrics.timer("predict"):
+        pass
+    assert metrics.PHASE_SECONDS.expose()[2:] == []
+
+
+def test_metrics_endpoint(client, metrics_client, models, entities):
+    response = metrics_client.post(
+        "/api/v1/multi_contributions/",
+        json={"eids": [entity["eid"] for entity in entities], "model_id": models[0]["model_id"]},
+    )
+    assert response.status_code == 200
+
+    response = metrics_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+
+    lines = response.get_data(as_text=True).splitlines()
+    for phase in ["load_realapp", "entities", "explain", "serialize"]:
+        assert (
+            'sibyl_phase_seconds_count{{endpoint="multifeaturecontributions",phase="{}"}} 1'
+            .format(phase)
+            in lines
+        )
+    assert (
+        'sibyl_request_seconds_count{endpoint="multifeaturecontributions",method="POST",'
+        'status="200"} 1'
+        in lines
+    )
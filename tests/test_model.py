@@ -4,7 +4,9 @@
 """Tests for `sibylapp` package."""
 
 import base64
+import json
 
+from sibyl import g
 from sibyl.db import schema
 
 
@@ -37,6 +39,16 @@ def test_get_importance(client, models):
     assert response["importances"] == models[0]["importances"]
 
 
+def test_get_importance_after_update(client, models):
+    model_id = models[0]["model_id"]
+    client.get("/api/v1/importance/?model_id=" + model_id)
+
+    importances = {"A": 1, "B": 2}
+    schema.Model.find_one(model_id=model_id).modify(importances=importances)
+    response = client.get("/api/v1/importance/?model_id=" + model_id).json
+    assert response["importances"] == importances
+
+
 def test_get_prediction(client, models, entities):
     model_id = str(schema.Model.find_one(model_id=models[0]["model_id"]).model_id)
     entity = entities[1]
@@ -135,3 +147,107 @@ def test_add_model(client, models):
             assert model[key] == models[0]["realapp"]
         else:
             assert model[key] == changes[key]
+
+
+def test_multi_prediction_columnar(client, models, entities):
+    response = client.post(
+        "/api/v1/multi_prediction/",
+        json={
+            "eids": [entity["eid"] for entity in entities],
+            "model_id": models[0]["model_id"],
+            "format": "columnar",
+        },
+    ).json
+
+    predictions = response["predictions"]
+    assert predictions["index"] == [entity["eid"] for entity in entities]
+    for entity, prediction in zip(entities, predictions["data"]):
+        features = next(iter(entity["features"].values()))
+        assert prediction == features["A"] - features["B"]
+
+
+def test_multi_model_prediction(client, models, entities):
+    model_ids = [model["model_id"] for model in models]
+    eids = [entity["eid"] for entity in entities]
+
+    for parallel in [False, True]:
+        response = client.post(
+            "/api/v1/multi_model_prediction/",
+            json={"model_ids": model_ids, "eids": eids, "parallel": parallel},
+        ).json
+        for model_id in model_ids:
+            for entity in entities:
+                features = next(iter(entity["features"].values()))
+                expected = features["A"] - features["B"]
+                assert response["predictions"][model_id][entity["eid"]] == expected
+
+    response = client.post(
+        "/api/v1/multi_model_prediction/",
+        json={"model_ids": model_ids, "eids": eids, "format": "columnar"},
+    ).json
+    assert response["predictions"]["index"] == model_ids
+    assert response["predictions"]["columns"] == eids
+    assert len(response["predictions"]["data"]) == len(model_ids)
+
+
+def test_multi_model_prediction_invalid_model(client, models, entities):
+    response = client.post(
+        "/api/v1/multi_model_prediction/",
+        json={"model_ids": [models[0]["model_id"], "does not exist"], "eids": ["ent1"]},
+    )
+    assert response.status_code == 400
+
+
+def test_multi_prediction_all_rows(client, models, multirow_entities, monkeypatch):
+    monkeypatch.setitem(g["config"], "streaming", {"chunk_size": 1})
+    entity = multirow_entities[0]
+    response = client.post(
+        "/api/v1/multi_prediction/",
+        json={"eids": [entity["eid"]], "model_id": models[0]["model_id"], "all_rows": True},
+    )
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+
+    lines = [json.loads(line) for line in response.data.splitlines()]
+    assert len(lines) == len(entity["row_ids"])
+    for line, row_id in zip(lines, entity["row_ids"]):
+        features = entity["features"][row_id]
+        assert line["predictions"] == {row_id: features["A"] - features["B"]}
+
+
+def test_multi_prediction_all_rows_multiple_eids(client, models, entities):
+    response = client.post(
+        "/api/v1/multi_prediction/",
+        json={
+            "eids": [entity["eid"] for entity in entities],
+            "model_id": models[0]["model_id"],
+            "all_rows": True,
+        },
+    )
+    assert response.status_code == 400
+
+
+def test_multi_prediction_pairs(client, models, multirow_entities):
+    eids = [entity["eid"] for entity in multirow_entities]
+    row_ids = [entity["row_ids"][-1] for entity in multirow_entities]
+    response = client.post(
+        "/api/v1/multi_prediction/",
+        json={"eids": eids, "row_ids": row_ids, "model_id": models[0]["model_id"]},
+    ).json
+
+    assert len(response["predictions"]) == len(eids)
+    for entity, row_id in zip(multirow_entities, row_ids):
+        features = entity["features"][row_id]
+        expected = features["A"] - features["B"]
+        assert response["predictions"][entity["eid"] + ":" + row_id] == expected
+
+
+def test_multi_prediction_pairs_invalid(client, models, multirow_entities):
+    eids = [entity["eid"] for entity in multirow_entities]
+    body = {"eids": eids, "row_ids": ["does not exist"] * len(eids), "model_id": "test model"}
+    response = client.post("/api/v1/multi_prediction/", json=body)
+    assert response.status_code == 400
+
+    body["row_ids"] = body["row_ids"] + ["row_a"]
+    response = client.post("/api/v1/multi_prediction/", json=body)
+    assert response.status_code == 400
@@ -473,3 +473,144 @@ class TestInsertModelFromObject:
         real_app = pickle.loads(models[0]["realapp"])
         with pytest.raises(ValueError):
             preprocessing.insert_model_from_object(real_app, model_id="model", fit_explainers=True)
+
+
+class TestPrepareDatabaseResume:
+    features_df = pd.DataFrame({"name": ["A", "B"], "type": ["numeric", "categorical"]})
+    entities_df = pd.DataFrame({
+        "eid": ["1", "2", "3"],
+        "A": [1, 2, 3],
+        "B": ["x", "y", "x"],
+        "label": [0, 1, 0],
+    })
+
+    def _prepare(self, entities_df, resume):
+        return preprocessing.prepare_database(
+            test_database_name,
+            features_df=self.features_df,
+            entities_df=entities_df,
+            realapp="realapp",
+            resume=resume,
+        )
+
+    #  Resume after the model insertion failed, then after the entities changed.
+    def test_resume(self, monkeypatch):
+        calls = []
+
+        def fail(realapp, **kwargs):
+            raise RuntimeError("model insertion failed")
+
+        def insert_model(realapp, **kwargs):
+            calls.append(("model", kwargs["training_set"].id))
+
+        insert_entities = preprocessing.insert_entities_from_dataframe
+
+        def spy_insert_entities(entity_df, **kwargs):
+            calls.append(("entities", len(entity_df)))
+            return insert_entities(entity_df, **kwargs)
+
+        monkeypatch.setattr(preprocessing, "insert_entities_from_dataframe", spy_insert_entities)
+        monkeypatch.setattr(preprocessing, "insert_model_from_object", fail)
+        with pytest.raises(RuntimeError):
+            self._prepare(self.entities_df.copy(), resume=False)
+        assert calls == [("entities", 3)]
+
+        monkeypatch.setattr(preprocessing, "insert_model_from_object", insert_model)
+        self._prepare(self.entities_df.copy(), resume=True)
+        training_set = schema.TrainingSet.find_one()
+        assert calls[1:] == [("model", training_set.id)]
+        assert schema.Feature.find_one(name="B").values == ["x", "y"]
+
+        calls.clear()
+        self._prepare(self.entities_df.copy(), resume=True)
+        assert calls == []
+
+        calls.clear()
+        self._prepare(self.entities_df.iloc[:2].copy(), resume=True)
+        assert calls[0] == ("entities", 2)
+        assert calls[1][0] == "model"
+        assert len(schema.Entity.objects) == 2
+        assert len(schema.TrainingSet.objects) == 1
+        assert schema.Feature.find_one(name="B").values == ["x", "y"]
+
+    def test_resume_drop_old(self):
+        with pytest.raises(ValueError):
+            preprocessing.prepare_database(test_database_name, drop_old=True, resume=True)
+
+
+class TestSyncEntitiesFromDataframe:
+    entity_df = pd.DataFrame({
+        "eid": ["1", "1", "2"],
+        "row_id": ["a", "b", "a"],
+        "feature1": [1, 2, 3],
+        "label": [0, 1, 0],
+    })
+
+    #  Sync the same entities twice, nothing is written the second time.
+    def test_sync_unchanged(self):
+        result = preprocessing.sync_entities_from_dataframe(self.entity_df.copy())
+        assert result == {
+            "entities": {"inserted": 2, "updated": 0, "unchanged": 0},
+            "rows": {"inserted": 3, "updated": 0, "unchanged": 0},
+        }
+
+        version = schema.Entity.get_version()
+        result = preprocessing.sync_entities_from_dataframe(self.entity_df.copy())
+        assert result["entities"] == {"inserted": 0, "updated": 0, "unchanged": 2}
+        assert result["rows"] == {"inserted": 0, "updated": 0, "unchanged": 3}
+        assert schema.Entity.get_version() == version
+
+    #  Sync changed rows, new rows and new entities into existing entities.
+    def test_sync_changes(self):
+        preprocessing.insert_entities_from_dataframe(self.entity_df.copy())
+        changed_df = pd.DataFrame({
+            "eid": ["1", "1", "2", "2", "3"],
+            "row_id": ["a", "b", "a", "b", "a"],
+            "feature1": [1, 5, 3, 4, 6],
+            "label": [0, 1, 0, 1, 1],
+        })
+        result = preprocessing.sync_entities_from_dataframe(changed_df, batch_size=2)
+        assert result == {
+            "entities": {"inserted": 1, "updated": 2, "unchanged": 0},
+            "rows": {"inserted": 2, "updated": 1, "unchanged": 2},
+        }
+
+        entity_1 = schema.Entity.find_one(eid="1")
+        assert entity_1.features == {"a": {"feature1": 1}, "b": {"feature1": 5}}
+        entity_2 = schema.Entity.find_one(eid="2")
+        assert entity_2.row_ids == ["a", "b"]
+        assert entity_2.features["b"] == {"feature1": 4}
+        assert entity_2.labels == {"a": 0, "b": 1}
+        assert schema.Entity.find_one(eid="3").features == {"a": {"feature1": 6}}
+
+    #  Sync into entities stored without row hashes.
+    def test_sync_without_stored_hashes(self, monkeypatch):
+        schema.Entity.insert_many([{
+            "eid": "1",
+            "row_ids": ["a", "b"],
+            "features": {"a": {"feature1": 1}, "b": {"feature1": 2}},
+            "labels": {"a": 0, "b": 1},
+        }])
+        stored_row_hashes = preprocessing._stored_row_hashes
+        calls = []
+
+        def counting_stored_row_hashes(*args):
+            calls.append(args)
+            return stored_row_hashes(*args)
+
+        monkeypatch.setattr(preprocessing, "_stored_row_hashes", counting_stored_row_hashes)
+        entity_df = pd.DataFrame({
+            "eid": ["1", "1"],
+            "row_id": ["a", "b"],
+            "feature1": [1, 5],
+            "label": [0, 1],
+        })
+        result = preprocessing.sync_entities_from_dataframe(entity_df.copy())
+        assert result["rows"] == {"inserted": 0, "updated": 1, "unchanged": 1}
+        assert len(calls) == 1
+        assert set(schema.Entity.find_one(eid="1").row_hashes) == {"a", "b"}
+
+        # the hashes of all rows were stored, the next sync does not recompute them
+        result = preprocessing.sync_entities_from_dataframe(entity_df.copy())
+        assert result["rows"] == {"inserted": 0, "updated": 0, "unchanged": 2}
+        assert len(calls) == 1
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `sibyl.profiling` module."""
+
+import hashlib
+import time
+
+from flask import Flask, request
+
+from sibyl.profiling import RequestProfiler, list_profiles, summarize_profile
+
+
+def _app(directory, **kwargs):
+    app = Flask(__name__)
+
+    @app.route("/fast", methods=["POST"])
+    def fast():
+        return "ok"
+
+    @app.route("/slow", methods=["POST"])
+    def slow():
+        time.sleep(0.05)
+        return request.get_data()
+
+    RequestProfiler(directory, **kwargs).init_app(app)
+    return app.test_client()
+
+
+def test_slow_threshold(tmp_path):
+    directory = str(tmp_path)
+    client = _app(directory, slow_threshold=0.04)
+    client.post("/fast", data=b"a")
+    client.post("/slow", data=b"b")
+
+    profiles = list_profiles(directory)
+    assert len(profiles) == 1
+    assert profiles[0]["endpoint"] == "slow"
+    assert profiles[0]["status"] == 200
+    assert profiles[0]["duration"] >= 0.05
+    assert profiles[0]["body_hash"] == hashlib.sha256(b"b").hexdigest()[:12]
+
+    summary = summarize_profile(directory, profiles[0]["name"])
+    assert "sleep" in summary
+
+
+def test_sample_rate(tmp_path):
+    directory = str(tmp_path)
+    client = _app(directory, sample_rate=1.0)
+    client.post("/fast", data=b"a")
+    client.post("/fast", data=b"b")
+
+    assert len(list_profiles(directory, endpoint="fast")) == 2
+    assert list_profiles(directory, endpoint="slow") == []
+
+    client = _app(str(tmp_path / "none"))
+    client.post("/slow", data=b"a")
+    assert list_profiles(str(tmp_path / "none")) == []
+
+
+def _other_request():
+    return sum(range(1000))
+
+
+def test_other_greenlets_excluded(tmp_path):
+    import greenlet
+
+    directory = str(tmp_path)
+    app = Flask(__name__)
+
+    @app.route("/switch", methods=["POST"])
+    def switch():
+        # another request runs while this one waits
+        greenlet.greenlet(_other_request).switch()
+        return "ok"
+
+    RequestProfiler(directory, sample_rate=1.0).init_app(app)
+    try:
+        app.test_client().post("/switch", data=b"a")
+    finally:
+        greenlet.settrace(None)
+
+    summary = summarize_profile(directory, list_profiles(directory)[0]["name"], limit=None)
+    assert "switch" in summary
+    assert "_other_request" not in summary
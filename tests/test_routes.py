@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `sibyl.routes` module."""
+
+import json
+
+from flask import Flask
+
+from sibyl.routes import SPEC_ROUTE, add_routes, build_spec
+
+
+def test_build_spec(tmp_path):
+    filename = str(tmp_path / "apispec.json")
+    build_spec(filename)
+    with open(filename) as fp:
+        spec = json.load(fp)
+    assert "/api/v1/multi_contributions/" in spec["paths"]
+    assert "/api/v1/jobs/{job_id}/" in spec["paths"]
+
+
+def test_static_spec(client, tmp_path, categories):
+    filename = str(tmp_path / "apispec.json")
+    build_spec(filename)
+
+    app = Flask(__name__)
+    add_routes(app, spec_filename=filename)
+    static_client = app.test_client()
+
+    with open(filename) as fp:
+        assert static_client.get(SPEC_ROUTE).json == json.load(fp)
+    assert static_client.get(SPEC_ROUTE).json == client.get(SPEC_ROUTE).json
+
+    response = static_client.get("/api/v1/categories/")
+    assert response.status_code == 200
+    assert len(response.json["categories"]) == len(categories)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `sibyl.serialization` and `sibyl.compression` modules."""
+
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+from sibyl import g, serialization
+
+
+@pytest.mark.parametrize("backend", list(serialization.BACKENDS))
+def test_dumps_numpy(backend):
+    data = {
+        "int": np.int64(3),
+        "float": np.float32(0.5),
+        "bool": np.bool_(True),
+        "array": np.array([[1, 2], [3, 4]]),
+    }
+    result = json.loads(serialization.BACKENDS[backend](data))
+    assert result == {"int": 3, "float": 0.5, "bool": True, "array": [[1, 2], [3, 4]]}
+
+
+def test_multi_contributions_gzip(client, models, entities, monkeypatch):
+    monkeypatch.setitem(g["config"], "compression", {"min_size": 100})
+    body = {"eids": [entity["eid"] for entity in entities], "model_id": models[0]["model_id"]}
+
+    plain = client.post("/api/v1/multi_contributions/", json=body)
+    assert "Content-Encoding" not in plain.headers
+    assert plain.headers["Vary"] == "Accept-Encoding"
+
+    compressed = client.post(
+        "/api/v1/multi_contributions/", json=body, headers={"Accept-Encoding": "gzip"}
+    )
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(compressed.data)) == plain.json
+
+
+def test_small_response_not_compressed(client):
+    response = client.get("/api/v1/categories/", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `sibyl.db.stages` module."""
+
+import time
+
+from sibyl.db.stages import StageProfiler, profile_stage
+
+
+def test_stage_profiler():
+    profiler = StageProfiler(interval=0.01)
+    for _ in range(2):
+        with profiler.stage("entities") as stage:
+            data = bytearray(2**20)
+            time.sleep(0.02)
+            stage["rows"] = 100
+    with profile_stage(profiler, "serialization") as stage:
+        stage["bytes"] = len(data)
+
+    report = profiler.report()
+    assert [stage["stage"] for stage in report["stages"]] == ["entities", "serialization"]
+
+    entities = report["stages"][0]
+    assert entities["runs"] == 2
+    assert entities["rows"] == 200
+    assert entities["seconds"] >= 0.04
+    assert entities["rows_per_second"] == entities["rows"] / entities["seconds"]
+    assert entities["peak_rss_mb"] > 0
+
+    assert report["stages"][1]["bytes"] == 2**20
+    assert "rows_per_second" not in report["stages"][1]
+    assert report["seconds"] >= entities["seconds"]
+    assert profiler.report()["stages"] == report["stages"]
+
+
+def test_profile_stage_without_profiler():
+    with profile_stage(None, "entities") as stage:
+        stage["rows"] = 1
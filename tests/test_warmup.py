@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `sibyl.warmup` module."""
+
+from sibyl import helpers
+from sibyl.warmup import warm_up
+
+
+def test_warm_up(client, models, monkeypatch):
+    timings = warm_up()
+    for model in models:
+        assert "model " + model["model_id"] in timings
+    assert timings["total"] > 0
+
+    def fail(*args, **kwargs):
+        raise AssertionError("realapp should already be loaded")
+
+    monkeypatch.setattr(helpers.pickle, "loads", fail)
+    success, _ = helpers.load_realapp(models[0]["model_id"])
+    assert success
+
+
+def test_warm_up_invalid_model(client):
+    timings = warm_up(model_ids=["does not exist"], predict=False)
+    assert "model does not exist" not in timings